@@ -0,0 +1,10 @@
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TenantX.settings')
+
+# Workers: celery -A TenantX worker -Q interactive,bulk (or one worker per lane)
+app = Celery('TenantX')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks(['worker'])
@@ -10,7 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 
-from pathlib import Path
+import json
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -54,7 +54,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
+    'core.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -62,7 +65,9 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.RateLimitHeadersMiddleware',
     'core.middleware.TenantMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
 ]
 
 # CORS Configuration
@@ -99,6 +104,13 @@ CORS_ALLOW_METHODS = [
     'PUT',
 ]
 
+# Let browser clients read their remaining quota (core.throttling)
+CORS_EXPOSE_HEADERS = [
+    'retry-after',
+    'x-ratelimit-limit',
+    'x-ratelimit-remaining',
+]
+
 ROOT_URLCONF = 'TenantX.urls'
 
 TEMPLATES = [
@@ -127,9 +139,43 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Concurrent writers wait for the lock instead of failing with
+        # "database is locked" when a read transaction tries to upgrade
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+        # A file rather than shared memory, so tests can write from threads
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+def _database_alias(alias, default_name, **extra):
+    # Extra connections reuse the default's settings, overriding NAME/HOST
+    # with DB_<ALIAS>_NAME / DB_<ALIAS>_HOST
+    return {
+        **DATABASES['default'],
+        'NAME': os.getenv(f"DB_{alias.upper()}_NAME", default_name),
+        'HOST': os.getenv(f"DB_{alias.upper()}_HOST", DATABASES['default'].get('HOST', '')),
+        **extra,
+    }
+
+# Read replicas of the primary: DB_REPLICAS=replica1,replica2
+DATABASE_REPLICAS = [alias.strip() for alias in os.getenv("DB_REPLICAS", "").split(",") if alias.strip()]
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = _database_alias(_alias, DATABASES['default']['NAME'], TEST={'MIRROR': 'default'})
+
+# Tenant shards: DB_SHARDS=shard1,shard2. "default" is always a shard and
+# the control database for global tables (users, organizations, ...).
+DATABASE_SHARDS = ['default'] + [alias.strip() for alias in os.getenv("DB_SHARDS", "").split(",") if alias.strip()]
+for _alias in DATABASE_SHARDS[1:]:
+    DATABASES[_alias] = _database_alias(
+        _alias, BASE_DIR / f"db_{_alias}.sqlite3", TEST={'NAME': BASE_DIR / f"test_db_{_alias}.sqlite3"}
+    )
+
+DATABASE_ROUTERS = ['core.routers.TenantShardRouter', 'core.routers.PrimaryReplicaRouter']
+
+# Seconds a tenant/user reads from the primary after writing
+DATABASE_REPLICA_STICKY_SECONDS = int(os.getenv("DB_REPLICA_STICKY_SECONDS", 5))
+DATABASE_STICKY_CACHE_ALIAS = os.getenv("DB_STICKY_CACHE_ALIAS", "default")
+
 AUTH_USER_MODEL = 'accounts.User'
 
 REST_FRAMEWORK = {
@@ -139,8 +185,48 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'core.renderers.FastJSONRenderer',  # orjson when installed
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'core.throttling.TenantRateThrottle',  # per organization, by plan
+    ),
 }
 
+# Tenant data exports (core.export)
+EXPORT_ROOT = os.getenv("EXPORT_ROOT", BASE_DIR / "exports")
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+# Bulk project/member imports (projects.importer)
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_ROWS = int(os.getenv("IMPORT_MAX_ROWS", 100000))
+
+# Organization deletion (core.deletion): rows per transaction
+DELETION_BATCH_SIZE = int(os.getenv("DELETION_BATCH_SIZE", 1000))
+
+# Request metrics (core.metrics, served at /metrics): requests running more
+# queries than the budget are logged with their SQL; 0 disables the check.
+# Scrapers send METRICS_TOKEN as a bearer token; without one, /metrics only
+# answers under DEBUG or to INTERNAL_IPS. Organization labels add a series
+# per tenant, so they are opt-in.
+REQUEST_QUERY_BUDGET = int(os.getenv("REQUEST_QUERY_BUDGET", 50))
+METRICS_TAG_ORGANIZATION = os.getenv("METRICS_TAG_ORGANIZATION", "0") == "1"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+INTERNAL_IPS = [ip.strip() for ip in os.getenv("INTERNAL_IPS", "").split(",") if ip.strip()]
+
+# Sampled request profiling (core.profiling, listed at /api/tenant/profiles/ for
+# staff): cProfile a fraction of requests and stack-sample slow ones
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_SLOW_THRESHOLD_MS = int(os.getenv("PROFILE_SLOW_THRESHOLD_MS", 0))
+PROFILE_STACK_INTERVAL = float(os.getenv("PROFILE_STACK_INTERVAL", 0.01))
+PROFILE_DIR = os.getenv("PROFILE_DIR", BASE_DIR / "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 200))
+PROFILE_MAX_AGE = int(os.getenv("PROFILE_MAX_AGE", 7 * 24 * 3600))
+
+# Responses at least this big are brotli/gzip compressed (core.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", 1024))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -177,6 +263,18 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# OpenAPI document served at /swagger.json and /swagger.yaml, written by
+# `manage.py generate_openapi_schema` (and checked in CI with --check).
+# Generated once per process when the file is missing.
+OPENAPI_SCHEMA_PATH = os.getenv("OPENAPI_SCHEMA_PATH", BASE_DIR / "openapi.json")
+OPENAPI_SCHEMA_MAX_AGE = int(os.getenv("OPENAPI_SCHEMA_MAX_AGE", 300))
+SWAGGER_SETTINGS = {
+    "SPEC_URL": ("schema-json", {"format": ".json"}),
+}
+REDOC_SETTINGS = {
+    "SPEC_URL": ("schema-json", {"format": ".json"}),
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -192,14 +290,108 @@ FRONTEND_URL = os.getenv('FRONTEND_URL')
 
 REDIS_URL = os.getenv('REDIS_URL')
 
+# Shared cache for tenant/role caches, resource versions and DB pinning.
+# Local memory is per process: set CACHE_URL (or REDIS_URL) when running
+# more than one web process.
+CACHE_URL = os.getenv("CACHE_URL", REDIS_URL)
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+
+RESOURCE_VERSION_CACHE_ALIAS = os.getenv("RESOURCE_VERSION_CACHE_ALIAS", "default")
+
+# Read endpoint response cache (core.response_cache)
+RESPONSE_CACHE_ALIAS = os.getenv("RESPONSE_CACHE_ALIAS", "default")
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 30))
+RESPONSE_CACHE_STALE_TTL = int(os.getenv("RESPONSE_CACHE_STALE_TTL", 30))
+RESPONSE_CACHE_LOCK_TIMEOUT = int(os.getenv("RESPONSE_CACHE_LOCK_TIMEOUT", 10))
+RESPONSE_CACHE_LOCK_WAIT = float(os.getenv("RESPONSE_CACHE_LOCK_WAIT", 2))
+
 CELERY_BROKER_URL = REDIS_URL
 CELERY_RESULT_BACKEND = REDIS_URL
+CELERY_TASK_ALWAYS_EAGER = os.getenv("CELERY_TASK_ALWAYS_EAGER", "0") == "1"
+CELERY_TASK_DEFAULT_QUEUE = "bulk"
+# Tenant-fair scheduling (worker.scheduling) relies on workers not hoarding messages
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+
+# Concurrent tasks per organization (worker.scheduling): plan -> {lane: cap}.
+# "interactive" is for user-facing work (single invites), "bulk" for batches,
+# exports and deletions. A missing cap means unlimited.
+TENANT_PLAN_TASK_CONCURRENCY = json.loads(os.getenv("TENANT_PLAN_TASK_CONCURRENCY", "null")) or {
+    "free": {"interactive": 2, "bulk": 1},
+    "pro": {"interactive": 4, "bulk": 2},
+    "enterprise": {"interactive": 8, "bulk": 4},
+}
+TASK_SLOT_CACHE_ALIAS = os.getenv("TASK_SLOT_CACHE_ALIAS", "default")  # must be shared by all workers
+TASK_SLOT_TTL = int(os.getenv("TASK_SLOT_TTL", 3600))  # seconds; bounds slots leaked by killed workers
+# A capped tenant's message is requeued with a countdown backing off to
+# TASK_DEFER_MAX_DELAY seconds; every TASK_DEFER_WARN_EVERY deferrals are logged
+TASK_DEFER_MAX_DELAY = float(os.getenv("TASK_DEFER_MAX_DELAY", 5))
+TASK_DEFER_WARN_EVERY = int(os.getenv("TASK_DEFER_WARN_EVERY", 100))
 
 # settings.py
 
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# Use the console/filebased backends locally, e.g.
+# EMAIL_BACKEND=django.core.mail.backends.filebased.EmailBackend EMAIL_FILE_PATH=/tmp/mail
+EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.smtp.EmailBackend")
+EMAIL_FILE_PATH = os.getenv("EMAIL_FILE_PATH", BASE_DIR / "sent_emails")
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER")  
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD")  
+
+# Batched invite delivery (worker.tasks.send_invite_emails)
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))  # messages per SMTP session
+EMAIL_DOMAIN_RATE_LIMIT = float(os.getenv("EMAIL_DOMAIN_RATE_LIMIT", 0))  # per recipient domain, msgs/s; 0 = off
+EMAIL_MAX_RETRIES = int(os.getenv("EMAIL_MAX_RETRIES", 3))
+EMAIL_RETRY_BACKOFF = int(os.getenv("EMAIL_RETRY_BACKOFF", 30))  # seconds, doubled per attempt
+
+# Tenant resolution cache (core.tenancy)
+TENANT_CACHE_MAXSIZE = int(os.getenv("TENANT_CACHE_MAXSIZE", 1024))
+TENANT_CACHE_TTL = int(os.getenv("TENANT_CACHE_TTL", 300))
+TENANT_CACHE_NEGATIVE_TTL = int(os.getenv("TENANT_CACHE_NEGATIVE_TTL", 30))
+TENANT_CACHE_ALIAS = os.getenv("TENANT_CACHE_ALIAS")  # e.g. "default" to share across processes
+# Organization saves bump a generation in this cache; every process checks it
+# at most every TENANT_CACHE_CHECK_INTERVAL seconds and drops its LRU on change
+TENANT_CACHE_GENERATION_ALIAS = os.getenv("TENANT_CACHE_GENERATION_ALIAS", "default")
+TENANT_CACHE_CHECK_INTERVAL = float(os.getenv("TENANT_CACHE_CHECK_INTERVAL", 1))
+# Writes to an organization that move_tenant_shard is moving get a 503 with this Retry-After
+TENANT_MOVE_RETRY_AFTER = int(os.getenv("TENANT_MOVE_RETRY_AFTER", 60))
+# Deletion (core.deletion) waits this long after marking an organization,
+# so no process still resolves it from its tenant cache when rows are purged
+DELETION_DRAIN_SECONDS = int(os.getenv("DELETION_DRAIN_SECONDS", TENANT_CACHE_TTL))
+
+# (user, org) role cache (core.tenancy.get_membership_role). Invalidation
+# only reaches other processes through a shared cache (CACHE_URL); with
+# local memory, roles are cached for MEMBERSHIP_LOCAL_CACHE_TTL at most.
+MEMBERSHIP_CACHE_ALIAS = os.getenv("MEMBERSHIP_CACHE_ALIAS", "default")
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", 60))
+MEMBERSHIP_LOCAL_CACHE_TTL = int(os.getenv("MEMBERSHIP_LOCAL_CACHE_TTL", 2))
+
+# Per-tenant request rates (core.throttling): plan -> {scope: rate}. "default"
+# applies to every request of the organization; writes to views with a
+# throttle_scope also draw from that scope's bucket. No rate means unlimited.
+TENANT_PLAN_RATES = json.loads(os.getenv("TENANT_PLAN_RATES", "null")) or {
+    "free": {"default": "1200/min", "projects": "120/min", "invites": "60/min"},
+    "pro": {"default": "6000/min", "projects": "600/min", "invites": "300/min"},
+    "enterprise": {"default": "30000/min"},
+}
+# Requests that don't belong to a member of the resolved organization never
+# spend its quota: they're limited per user, or per client IP when anonymous
+TENANT_USER_RATE = os.getenv("TENANT_USER_RATE", "600/min")
+TENANT_ANON_RATE = os.getenv("TENANT_ANON_RATE", "120/min")
+TENANT_THROTTLE_CACHE_ALIAS = os.getenv("TENANT_THROTTLE_CACHE_ALIAS", "default")  # must be shared across processes
+TENANT_THROTTLE_LEASE = int(os.getenv("TENANT_THROTTLE_LEASE", 10))  # tokens each process takes per cache round trip
+
+# Put org id/slug/role claims on access tokens (core.tokens)
+TENANT_SCOPED_TOKENS = os.getenv("TENANT_SCOPED_TOKENS", "1") == "1"
+
+# Bulk invites (accounts.invitations)
+INVITE_BULK_MAX_ROWS = int(os.getenv("INVITE_BULK_MAX_ROWS", 5000))
+INVITE_BATCH_SIZE = int(os.getenv("INVITE_BATCH_SIZE", 500))
+INVITE_EMAIL_CHUNK_SIZE = int(os.getenv("INVITE_EMAIL_CHUNK_SIZE", 100))
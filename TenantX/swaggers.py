@@ -1,14 +1,80 @@
-from drf_yasg.views import get_schema_view
+import hashlib
+import json
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import etag, require_safe
+from drf_yasg.codecs import OpenAPICodecJson, yaml_sane_dump
+from drf_yasg.generators import OpenAPISchemaGenerator
 from drf_yasg import openapi
-from rest_framework import permissions
-
-schema_view = get_schema_view(
-    openapi.Info(
-        title="My API",
-        default_version='v1',
-        description="API documentation for my Django project",
-        contact=openapi.Contact(email="contact@myapi.local"),
-    ),
-    public=True,
-    permission_classes=(permissions.AllowAny,),
-)
\ No newline at end of file
+
+api_info = openapi.Info(
+    title="My API",
+    default_version='v1',
+    description="API documentation for my Django project",
+    contact=openapi.Contact(email="contact@myapi.local"),
+)
+
+
+def generate_schema():
+    """The OpenAPI document for the current code, as pretty-printed JSON bytes."""
+    # No request: the document doesn't depend on who asks or on the Host header
+    schema = OpenAPISchemaGenerator(api_info).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[], pretty=True).encode(schema)
+
+
+_documents = None
+_documents_lock = threading.Lock()
+
+
+def get_schema_documents():
+    """
+    {"json": bytes, "yaml": bytes, "etag": str}, built once per process from
+    OPENAPI_SCHEMA_PATH (written by `manage.py generate_openapi_schema`),
+    or generated on first use when that file doesn't exist.
+    """
+    global _documents
+    if _documents is None:
+        with _documents_lock:
+            if _documents is None:
+                path = getattr(settings, "OPENAPI_SCHEMA_PATH", "")
+                try:
+                    with open(path, "rb") as fh:
+                        content = fh.read()
+                except (FileNotFoundError, TypeError):
+                    content = generate_schema()
+                data = json.loads(content)
+                _documents = {
+                    "json": content,
+                    "yaml": yaml_sane_dump(data, binary=True),
+                    "etag": hashlib.sha256(content).hexdigest()[:32],
+                }
+    return _documents
+
+
+@require_safe
+@etag(lambda request, format: get_schema_documents()["etag"] + format)  # one per representation
+def schema_document_view(request, format):
+    """The precomputed OpenAPI document as /swagger.json or /swagger.yaml."""
+    documents = get_schema_documents()
+    if format == ".yaml":
+        response = HttpResponse(documents["yaml"], content_type="application/yaml; charset=utf-8")
+    else:
+        response = HttpResponse(documents["json"], content_type="application/json; charset=utf-8")
+    # Changes only on deploy; clients revalidate with the ETag after max-age
+    patch_cache_control(response, public=True, max_age=getattr(settings, "OPENAPI_SCHEMA_MAX_AGE", 300))
+    return response
+
+
+def schema_ui_view(renderer_class):
+    """A swagger-ui or ReDoc page (drf_yasg.renderers) that never generates the schema."""
+    @require_safe
+    def view(request):
+        # The page only needs the title and version: it fetches the document
+        # itself from schema_document_view (SWAGGER_SETTINGS["SPEC_URL"])
+        document = openapi.Swagger(info=api_info, _prefix="/", paths=openapi.Paths(paths={}))
+        content = renderer_class().render(document, renderer_context={"request": request})
+        return HttpResponse(content, content_type="text/html; charset=utf-8")
+    return view
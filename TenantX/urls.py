@@ -17,16 +17,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.urls import path, re_path
-from .swaggers import schema_view
+from core.metrics import metrics_view
+from drf_yasg.renderers import ReDocRenderer, SwaggerUIRenderer
+from .swaggers import schema_document_view, schema_ui_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("api/accounts/", include("accounts.urls")),
     path('api/projects/', include('projects.urls')),
+    path('api/tenant/', include('core.urls')),
+    path('metrics', metrics_view, name='metrics'),
     re_path(r'^swagger(?P<format>\.json|\.yaml)$',
-            schema_view.without_ui(cache_timeout=0), name='schema-json'),
+            schema_document_view, name='schema-json'),
     path('swagger/',
-         schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+         schema_ui_view(SwaggerUIRenderer), name='schema-swagger-ui'),
     path('redoc/',
-         schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+         schema_ui_view(ReDocRenderer), name='schema-redoc'),
 ]
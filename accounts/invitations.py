@@ -0,0 +1,107 @@
+import csv
+import io
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.tokens import default_token_generator
+from django.db import transaction
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from core.tenancy import bump_membership_versions
+from core.versioning import bump_versions
+from worker.tasks import send_invite_emails
+from .models import Membership
+from .serializers import InviteMemberSerializer
+
+User = get_user_model()
+
+INVITE_BATCH_SIZE = getattr(settings, "INVITE_BATCH_SIZE", 500)
+INVITE_EMAIL_CHUNK_SIZE = getattr(settings, "INVITE_EMAIL_CHUNK_SIZE", 100)
+
+
+def build_reset_url(user):
+    token = default_token_generator.make_token(user)
+    uid = urlsafe_base64_encode(force_bytes(user.pk))
+    return f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
+
+
+def parse_invite_csv(upload):
+    """
+    Rows of an uploaded CSV with `email` and `role` columns. Raises
+    ValueError when the file isn't UTF-8 text CSV.
+    """
+    text = io.TextIOWrapper(upload.file, encoding="utf-8-sig", newline="")
+    try:
+        return [
+            {"email": (row.get("email") or "").strip(), "role": (row.get("role") or "").strip()}
+            for row in csv.DictReader(text)
+        ]
+    except (UnicodeDecodeError, csv.Error) as exc:
+        raise ValueError(f"Invalid CSV file: {exc}") from exc
+
+
+def bulk_invite(org, rows):
+    """
+    Invite many (email, role) rows into `org` with set-based queries:
+    existing users are resolved with one IN query, new users and memberships
+    are bulk-created in batches in one transaction, and invite emails go out
+    in chunked tasks once it commits. Returns one result dict per input row.
+    """
+    results = [None] * len(rows)
+    invites = {}  # email -> (row index, role)
+    for i, row in enumerate(rows):
+        serializer = InviteMemberSerializer(data=row)
+        if not serializer.is_valid():
+            results[i] = {"row": i, "email": row.get("email"), "status": "invalid", "errors": serializer.errors}
+            continue
+        email = serializer.validated_data["email"]
+        if email in invites:
+            results[i] = {"row": i, "email": email, "status": "duplicate"}
+            continue
+        invites[email] = (i, serializer.validated_data["role"])
+
+    emails = list(invites)
+    with transaction.atomic():
+        # Users: one IN query, then bulk-create whoever is missing
+        existing = set(User.objects.filter(username__in=emails).values_list("username", flat=True))
+        new_users = []
+        for email in emails:
+            if email not in existing:
+                user = User(username=email, email=email)
+                user.set_unusable_password()  # set through the reset link
+                new_users.append(user)
+        User.objects.bulk_create(new_users, batch_size=INVITE_BATCH_SIZE, ignore_conflicts=True)
+        users = {u.username: u for u in User.objects.filter(username__in=emails)}
+
+        # Memberships: skip users already in the org
+        members = set(
+            Membership.objects.filter(organization=org, user__in=users.values())
+            .values_list("user_id", flat=True)
+        )
+        memberships = []
+        for email, (i, role) in invites.items():
+            user = users[email]
+            if user.pk in members:
+                results[i] = {"row": i, "email": email, "status": "already_member"}
+                continue
+            memberships.append(Membership(user=user, organization=org, role=role))
+            results[i] = {"row": i, "email": email, "role": role, "status": "invited"}
+        Membership.objects.bulk_create(memberships, batch_size=INVITE_BATCH_SIZE, ignore_conflicts=True)
+
+        # bulk_create skips signals, so invalidate cached roles and versions here
+        bump_membership_versions(*[m.user_id for m in memberships])
+        bump_versions(
+            ("memberships", f"org:{org.pk}"),
+            *[("memberships", f"user:{m.user_id}") for m in memberships],
+        )
+
+        to_email = [(m.user.email, build_reset_url(m.user)) for m in memberships]
+        transaction.on_commit(lambda: _enqueue_invite_emails(to_email, org))
+
+    return results
+
+
+def _enqueue_invite_emails(invites, org):
+    for start in range(0, len(invites), INVITE_EMAIL_CHUNK_SIZE):
+        send_invite_emails.delay(invites[start:start + INVITE_EMAIL_CHUNK_SIZE], org.name, org_id=org.pk)
@@ -18,4 +18,8 @@ class Membership(models.Model):
     joined_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
-        unique_together = ("user", "organization")
\ No newline at end of file
+        unique_together = ("user", "organization")
+        indexes = [
+            # org member listing: keyset pagination on (joined_at, id)
+            models.Index(fields=["organization", "joined_at", "id"], name="membership_org_joined_idx"),
+        ]
\ No newline at end of file
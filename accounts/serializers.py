@@ -1,6 +1,13 @@
+import itertools
+import random
+
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
 from core.models import Organization
+from core.tokens import TenantRefreshToken
 from .models import Membership
 from django.utils.text import slugify
 
@@ -22,6 +29,27 @@ class InviteMemberSerializer(serializers.Serializer):
     email = serializers.EmailField()
     role = serializers.ChoiceField(choices=Membership.ROLE_CHOICES)
 
+ORG_SLUG_ATTEMPTS = 6
+
+
+def allocate_org_slug(base, skip=0):
+    """
+    `base`, or `base-N` with the lowest free N, from one query over the taken
+    slugs; `skip` passes over that many free candidates. Concurrent signups
+    can still pick the same one: the caller inserts inside a savepoint and
+    retries on IntegrityError.
+    """
+    max_length = Organization._meta.get_field("slug").max_length
+    base = base[:max_length]
+    root = base[:max_length - 7]  # room for "-999999"
+    taken = set(
+        Organization.objects.filter(Q(slug=base) | Q(slug__startswith=f"{root}-")).values_list("slug", flat=True)
+    )
+    candidates = itertools.chain([base], (f"{root}-{n}" for n in itertools.count(1)))
+    free = (slug for slug in candidates if slug not in taken)
+    return next(itertools.islice(free, skip, None))
+
+
 class SignupSerializer(serializers.Serializer):
     org_name = serializers.CharField(max_length=150)
     org_slug = serializers.SlugField(required=False)  # optional, can auto-generate
@@ -35,36 +63,49 @@ class SignupSerializer(serializers.Serializer):
         return value
 
     def create(self, validated_data):
-        # Auto-generate slug if not provided
-        slug = validated_data.get("org_slug") or slugify(validated_data["org_name"])
-        # Ensure uniqueness
-        original_slug = slug
-        counter = 1
-        while Organization.objects.filter(slug=slug).exists():
-            slug = f"{original_slug}-{counter}"
-            counter += 1
-
-        # Create organization
-        org = Organization.objects.create(
-            name=validated_data["org_name"],
-            slug=slug
-        )
-
-        # Create user
-        user = User.objects.create_user(
-            username=validated_data["username"],
-            email=validated_data["email"],
-            password=validated_data["password"]
-        )
-
-        # Create membership (admin)
-        Membership.objects.create(user=user, organization=org, role="admin")
+        # Organization, user and admin membership are created together or not at all
+        with transaction.atomic():
+            org = self._create_organization(validated_data)
+
+            try:
+                with transaction.atomic():
+                    user = User.objects.create_user(
+                        username=validated_data["username"],
+                        email=validated_data["email"],
+                        password=validated_data["password"]
+                    )
+            except IntegrityError:
+                raise serializers.ValidationError({"username": ["A user with that username already exists."]})
+
+            Membership.objects.create(user=user, organization=org, role="admin")
 
         return user, org  # return both user and org
+
+    def _create_organization(self, validated_data):
+        name = validated_data["org_name"]
+        requested = validated_data.get("org_slug")
+        for attempt in range(ORG_SLUG_ATTEMPTS):
+            # Auto-generate slug if not provided; after losing a race, spread
+            # out over the next free ones so racing signups stop colliding
+            slug = requested or allocate_org_slug(slugify(name) or "org", skip=random.randrange(2 ** attempt))
+            try:
+                with transaction.atomic():
+                    return Organization.objects.create(name=name, slug=slug)
+            except IntegrityError:
+                # Lost a race for the slug (or the name) to a concurrent signup
+                if Organization.objects.filter(name=name).exists():
+                    raise serializers.ValidationError({"org_name": ["An organization with this name already exists."]})
+                if requested:
+                    raise serializers.ValidationError({"org_slug": ["This organization slug is already taken."]})
+        raise serializers.ValidationError({"org_slug": ["Could not allocate a slug; please choose one."]})
     
     class OrganizationMemberSerializer(serializers.ModelSerializer):
         user = UserSerializer(read_only=True)
         class Meta:
             model = Membership
             fields = ['id', 'user', 'organization', 'role', 'joined_at']
-            read_only_fields = ['id', 'joined_at']
\ No newline at end of file
+            read_only_fields = ['id', 'joined_at']
+
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    # Re-reads the role from the membership instead of copying the refresh token's claims
+    token_class = TenantRefreshToken
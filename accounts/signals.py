@@ -0,0 +1,26 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.tenancy import bump_membership_versions
+from core.versioning import bump_versions
+from .models import Membership, User
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def invalidate_membership_cache(sender, instance, using, **kwargs):
+    bump_membership_versions(instance.user_id, using=using)
+    bump_versions(
+        ("memberships", f"org:{instance.organization_id}"),
+        ("memberships", f"user:{instance.user_id}"),
+        using=using,
+    )
+
+
+@receiver(post_save, sender=User)
+def bump_member_listing_versions(sender, instance, created, using, update_fields=None, **kwargs):
+    # Member listings show username/email; logins only touch last_login
+    if created or (update_fields and set(update_fields) <= {"last_login"}):
+        return
+    org_ids = Membership.objects.filter(user=instance).values_list("organization_id", flat=True)
+    bump_versions(*[("memberships", f"org:{org_id}") for org_id in org_ids], using=using)
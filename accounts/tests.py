@@ -1,3 +1,292 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from core.models import Organization
+from core.serializers import FastReadSerializer
+from core.tenancy import get_membership_role
+from core.tokens import ORG_ID_CLAIM, ROLE_CLAIM, tenant_token_for
+from .models import Membership, User
+from .serializers import OrganizationSerializer, SignupSerializer, UserSerializer, allocate_org_slug
+
+
+class FastReadSerializerParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.orgs = [
+            Organization.objects.create(name="Acme", slug="acme"),
+            Organization.objects.create(name="Ünïcode Org", slug="unicode-org"),
+        ]
+        cls.users = [
+            User.objects.create_user("bob", "bob@example.com", "pw", first_name="Bob"),
+            User.objects.create_user("ålice", "", "pw", last_name="Ø"),
+        ]
+        for org in cls.orgs:
+            for user in cls.users:
+                Membership.objects.create(user=user, organization=org, role="employee")
+
+    def test_organization_serializer(self):
+        queryset = Organization.objects.order_by("id")
+        self.assertEqual(
+            FastReadSerializer(OrganizationSerializer).serialize(queryset),
+            [dict(row) for row in OrganizationSerializer(queryset, many=True).data],
+        )
+
+    def test_user_serializer(self):
+        queryset = User.objects.order_by("id")
+        self.assertEqual(
+            FastReadSerializer(UserSerializer).serialize(queryset),
+            [dict(row) for row in UserSerializer(queryset, many=True).data],
+        )
+
+    def test_nested_through_relation(self):
+        fast = FastReadSerializer(OrganizationSerializer, prefix="organization__")
+        memberships = Membership.objects.order_by("id")
+        rows = memberships.values(*fast.columns)
+        self.assertEqual(
+            [fast.to_representation(row) for row in rows],
+            [dict(OrganizationSerializer(m.organization).data) for m in memberships],
+        )
+
+    def test_my_memberships_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        response = client.get("/api/accounts/me/memberships/")
+        self.assertEqual(
+            [row["organization"] for row in response.json()],
+            [dict(OrganizationSerializer(org).data) for org in self.orgs],
+        )
+
+
+def _signup(org_name, username, **extra):
+    return APIClient().post("/api/accounts/signup/", {
+        "org_name": org_name, "username": username, "email": f"{username}@example.com", "password": "pw", **extra,
+    }, format="json")
+
+
+class SignupSlugTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for slug in ["acme", "acme-1", "acme-3", "acme-corp", "acme-1b"]:
+            Organization.objects.create(name=slug, slug=slug)
+
+    def test_lowest_free_suffix_in_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(allocate_org_slug("acme"), "acme-2")
+        self.assertEqual(allocate_org_slug("acme", skip=1), "acme-4")
+        self.assertEqual(allocate_org_slug("globex"), "globex")
+
+    def test_retries_when_a_concurrent_signup_takes_the_slug(self):
+        with mock.patch("accounts.serializers.allocate_org_slug", side_effect=["acme-1", "acme-2"]) as allocate:
+            response = _signup("Acme!", "wile")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["organization"]["slug"], "acme-2")
+        self.assertEqual(allocate.call_count, 2)
+
+    def test_conflicts_are_validation_errors_and_roll_back(self):
+        User.objects.create_user("taken", "taken@example.com", "pw")
+        response = _signup("Initech", "taken")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("username", response.json())
+        self.assertFalse(Organization.objects.filter(name="Initech").exists())
+
+        response = _signup("acme", "roadrunner")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("org_name", response.json())
+
+
+class ConcurrentSignupTests(TransactionTestCase):
+    def test_concurrent_signups_get_distinct_slugs(self):
+        # Distinct organization names that all slugify to "acme-inc"
+        names = ["Acme Inc", "Acme, Inc.", "ACME inc", "Acme Inc.", "Acme-Inc", "acme inc!", "Acme  Inc", "Acme (Inc)"]
+        barrier = threading.Barrier(len(names))
+        errors = []
+
+        def signup(i, name):
+            try:
+                serializer = SignupSerializer(data={
+                    "org_name": name, "username": f"user{i}", "email": f"user{i}@example.com", "password": "pw",
+                })
+                serializer.is_valid(raise_exception=True)
+                barrier.wait()
+                serializer.save()
+            except Exception as exc:  # reported below
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=signup, args=(i, name)) for i, name in enumerate(names)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        slugs = list(Organization.objects.values_list("slug", flat=True))
+        self.assertEqual(len(set(slugs)), len(names))
+        self.assertIn("acme-inc", slugs)
+        self.assertTrue(all(slug == "acme-inc" or slug.removeprefix("acme-inc-").isdigit() for slug in slugs))
+        self.assertEqual(Membership.objects.filter(role="admin").count(), len(names))
+
+
+class BulkInviteTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.admin = User.objects.create_user("admin", "admin@example.com", "pw")
+        Membership.objects.create(user=cls.admin, organization=cls.org, role="admin")
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def upload(self, content):
+        upload = SimpleUploadedFile("invites.csv", content, content_type="text/csv")
+        return self.client.post("/api/accounts/organizations/invite/bulk/", {"file": upload}, HTTP_X_ORG="acme")
+
+    def test_csv_upload(self):
+        with mock.patch("accounts.invitations.send_invite_emails.delay") as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.upload(b"email,role\r\nann@example.com,manager\r\nbad,employee\r\n")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["summary"], {"invited": 1, "invalid": 1})
+        self.assertEqual(send.call_count, 1)
+
+    def test_rejects_non_utf8_csv(self):
+        response = self.upload("email,role\r\nzoë@example.com,employee\r\n".encode("latin-1"))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Invalid CSV", response.json()["error"])
+
+    def test_cached_roles_invalidated_once_committed(self):
+        user = User.objects.create_user("ann@example.com", "ann@example.com", "pw")
+        self.assertIsNone(get_membership_role(user, self.org))  # cached as a non-member
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                "/api/accounts/organizations/invite/bulk/",
+                {"invites": [{"email": "ann@example.com", "role": "manager"}]},
+                format="json", HTTP_X_ORG="acme",
+            )
+        self.assertEqual(response.json()["summary"], {"invited": 1})
+        self.assertIsNone(get_membership_role(user, self.org))
+        with mock.patch("accounts.invitations.send_invite_emails.delay"):
+            for callback in callbacks:
+                callback()
+        self.assertEqual(get_membership_role(user, self.org), "manager")
+
+
+class TokenRefreshTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Refreshing", slug="refreshing")
+        cls.user = User.objects.create_user("rita", "rita@example.com", "pw")
+        cls.membership = Membership.objects.create(organization=cls.org, user=cls.user, role="admin")
+
+    def refresh(self, token):
+        return APIClient().post("/api/accounts/token/refresh/", {"refresh": str(token)})
+
+    def test_first_access_token_uses_the_known_role(self):
+        refresh = tenant_token_for(self.user, self.org, "admin")
+        with self.assertNumQueries(0):
+            access = refresh.access_token
+        self.assertEqual(access[ROLE_CLAIM], "admin")
+        self.assertNotIn(ROLE_CLAIM, refresh.payload)
+
+    def test_refresh_after_demotion_gets_the_new_role(self):
+        refresh = tenant_token_for(self.user, self.org, "admin")
+        self.membership.role = "employee"
+        self.membership.save()
+
+        response = self.refresh(refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-store", response["Cache-Control"])
+        access = AccessToken(response.data["access"])
+        self.assertEqual((access[ORG_ID_CLAIM], access[ROLE_CLAIM]), (self.org.pk, "employee"))
+
+        # The rotated refresh token doesn't carry a role either
+        rotated = RefreshToken(response.data["refresh"])
+        self.assertNotIn(ROLE_CLAIM, rotated.payload)
+        self.membership.role = "manager"
+        self.membership.save()
+        response = self.refresh(rotated)
+        self.assertEqual(AccessToken(response.data["access"])[ROLE_CLAIM], "manager")
+
+    def test_refresh_after_removal_is_rejected(self):
+        refresh = tenant_token_for(self.user, self.org, "admin")
+        self.membership.delete()
+        self.assertEqual(self.refresh(refresh).status_code, 401)
+
+    def test_stale_role_claims_on_old_refresh_tokens_are_ignored(self):
+        refresh = tenant_token_for(self.user, self.org, "admin")
+        refresh[ROLE_CLAIM] = "admin"
+        self.membership.role = "employee"
+        self.membership.save()
+        response = self.refresh(refresh)
+        self.assertEqual(AccessToken(response.data["access"])[ROLE_CLAIM], "employee")
+
+    def test_refresh_without_an_organization(self):
+        response = self.refresh(tenant_token_for(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(ROLE_CLAIM, AccessToken(response.data["access"]).payload)
+
+
+class OrganizationMemberListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Members", slug="members")
+        cls.admin = User.objects.create_user("ada", "ada@example.com", "pw")
+        Membership.objects.create(organization=cls.org, user=cls.admin, role="admin")
+        for i in range(4):
+            user = User.objects.create_user(f"member{i}", f"member{i}@example.com", "pw")
+            Membership.objects.create(organization=cls.org, user=user, role="manager" if i % 2 else "employee")
+
+    def setUp(self):
+        caches["default"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def get(self, **params):
+        return self.client.get("/api/accounts/orgmembers/", params, HTTP_X_ORG="members")
+
+    def test_pages_across_boundaries(self):
+        usernames, cursor = [], None
+        for _ in range(3):
+            response = self.get(limit=2, **({"cursor": cursor} if cursor else {}))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(set(response.data), {"results", "next"})
+            usernames += [m["username"] for m in response.data["results"]]
+            cursor = response.data["next"]
+        self.assertIsNone(cursor)
+        self.assertEqual(usernames, ["ada", "member0", "member1", "member2", "member3"])
+        self.assertEqual(self.get(cursor="garbage").status_code, 400)
+
+    def test_role_filter(self):
+        response = self.get(role="manager")
+        self.assertEqual([m["username"] for m in response.data["results"]], ["member1", "member3"])
+        self.assertEqual({m["role"] for m in response.data["results"]}, {"manager"})
+
+    def test_query_count_does_not_grow_with_members(self):
+        def queries():
+            caches["default"].clear()  # no cached responses or roles
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(self.get(limit=100).status_code, 200)
+            return len(captured)
+
+        few = queries()
+        for i in range(20):
+            user = User.objects.create_user(f"extra{i}", f"extra{i}@example.com", "pw")
+            Membership.objects.create(organization=self.org, user=user, role="employee")
+        self.assertEqual(queries(), few)
+
+    def test_requires_membership(self):
+        self.assertEqual(APIClient().get("/api/accounts/orgmembers/", HTTP_X_ORG="members").status_code, 401)
+        outsider = APIClient()
+        outsider.force_authenticate(User.objects.create_user("otto", "otto@example.com", "pw"))
+        self.assertEqual(outsider.get("/api/accounts/orgmembers/", HTTP_X_ORG="members").status_code, 403)
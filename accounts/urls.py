@@ -2,21 +2,30 @@ from django.urls import path
 from .views import (
     SignupView,
     LoginView,
+    TokenRefreshView,
     InviteMemberView,
+    BulkInviteMemberView,
     MyMembershipsView,
     SwitchOrganizationView,
     ResetPasswordConfirmView,
     CurrentUserView,
-    GetOrganizationMemberView
+    GetOrganizationMemberView,
+    AsyncCurrentUserView,
+    AsyncMyMembershipsView,
 )
 
 urlpatterns = [
     path("signup/", SignupView.as_view(), name="signup"),
     path("login/", LoginView.as_view(), name="login"),
+    path("token/refresh/", TokenRefreshView.as_view(), name="token-refresh"),
     path("me/", CurrentUserView.as_view(), name="current-user"),
     path("orgmembers/", GetOrganizationMemberView.as_view(), name="org-members"),
     path("organizations/invite/", InviteMemberView.as_view(), name="invite-member"),
+    path("organizations/invite/bulk/", BulkInviteMemberView.as_view(), name="bulk-invite-member"),
     path("reset-password/<uidb64>/<token>/", ResetPasswordConfirmView.as_view(), name="reset-password-confirm"),
     path("me/memberships/", MyMembershipsView.as_view(), name="my-memberships"),
     path("switch-org/", SwitchOrganizationView.as_view(), name="switch-org"),
+    # Native async variants for ASGI deployments
+    path("async/me/", AsyncCurrentUserView.as_view(), name="current-user-async"),
+    path("async/me/memberships/", AsyncMyMembershipsView.as_view(), name="my-memberships-async"),
 ]
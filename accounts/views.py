@@ -1,29 +1,40 @@
 from django.contrib.auth import authenticate, get_user_model
 from rest_framework.views import APIView
 from rest_framework.response import Response
+from rest_framework_simplejwt.views import TokenRefreshView as BaseTokenRefreshView
 from rest_framework import status, permissions
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.utils.crypto import get_random_string
 from django.contrib.auth.tokens import default_token_generator
 from django.core.mail import send_mail
 from django.urls import reverse
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
+from django.utils.cache import add_never_cache_headers
 
 from django.conf import settings
 
 
 from .models import Organization, Membership, User
 from .serializers import InviteMemberSerializer
+from core.async_views import AsyncAPIView
 from core.models import Organization
+from core.permissions import IsMember
+from core.pagination import InvalidCursor, get_page_size, keyset_paginate
+from core.tenancy import RESOLVABLE_STATUSES, get_membership_role
+from core.tokens import tenant_token_for
+from core.response_cache import cached_response
+from core.serializers import FastReadSerializer
+from core.versioning import conditional_get
 from .models import Membership
 from .serializers import (
     UserSerializer,
     InviteMemberSerializer,
     SignupSerializer,
     OrganizationSerializer,
+    TenantTokenRefreshSerializer,
 )
 from worker.tasks import send_invite_email
+from .invitations import build_reset_url, bulk_invite, parse_invite_csv
 
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -31,18 +42,40 @@ from drf_yasg import openapi
 User = get_user_model()
 
 
+def _organization_versions(request):
+    return request.organization and [("organizations", "all")]
+
+
+def _my_membership_versions(request):
+    return [("memberships", f"user:{request.user.pk}"), ("organizations", "all")]
+
+
+def _org_member_versions(request):
+    return request.organization and [("memberships", f"org:{request.organization.pk}")]
+
+
 # ---------------------------
 # Get Current User Profile
 # ---------------------------
 class CurrentUserView(APIView):
     permission_classes = [permissions.AllowAny]
 
+    @cached_response(_organization_versions)
     def get(self, request):
         # return Response(UserSerializer(request.user).data)
         org=request.organization.name if request.organization else None
         return Response({"organization": org}, status=status.HTTP_200_OK)
 
 
+class AsyncCurrentUserView(AsyncAPIView):
+    permission_classes = [permissions.AllowAny]
+
+    @cached_response(_organization_versions)
+    async def get(self, request):
+        org = request.organization.name if request.organization else None
+        return Response({"organization": org}, status=status.HTTP_200_OK)
+
+
 # ---------------------------
 # Signup (User + Org + Admin Membership)
 # ---------------------------
@@ -55,14 +88,16 @@ class SignupView(APIView):
             user, org = serializer.save()  # returns both user and org
 
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = tenant_token_for(user, org, "admin")
 
-            return Response({
+            response = Response({
                 "user": UserSerializer(user).data,
                 "organization": OrganizationSerializer(org).data,
                 "access": str(refresh.access_token),
                 "refresh": str(refresh)
             }, status=status.HTTP_201_CREATED)
+            add_never_cache_headers(response)  # carries tokens: never cached or compressed
+            return response
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -80,17 +115,18 @@ class LoginView(APIView):
             username = request.data.get("username")
             password = request.data.get("password")
             user = authenticate(username=username, password=password)
-            print(user.email)
-            membership = Membership.objects.filter(user=user, organization=org).first() if user else None
+            role = get_membership_role(user, org, request) if user else None
             if user:
-                if membership:
-                    refresh = RefreshToken.for_user(user)
-                    return Response({
+                if role:
+                    refresh = tenant_token_for(user, org, role)
+                    response = Response({
                         "access": str(refresh.access_token),
                         "refresh": str(refresh),
                         "org_id": org.id,
-                        "role": membership.role,
+                        "role": role,
                     }, status=status.HTTP_200_OK)
+                    add_never_cache_headers(response)
+                    return response
                 else:
                     return Response({"error": "User is not a member of this organization"}, status=status.HTTP_403_FORBIDDEN)
             else:
@@ -103,6 +139,7 @@ class LoginView(APIView):
 # ---------------------------
 class InviteMemberView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "invites"
 
     def post(self, request):
         # 1. Check org exists
@@ -112,7 +149,7 @@ class InviteMemberView(APIView):
             return Response({"error": "Organization not found"}, status=404)
 
         # 2. Only admin can invite
-        if not Membership.objects.filter(user=request.user, organization=org, role="admin").exists():
+        if get_membership_role(request.user, org, request) != "admin":
             return Response({"error": "Not allowed"}, status=403)
 
         # 3. Validate request body
@@ -135,15 +172,11 @@ class InviteMemberView(APIView):
             user.set_password(temp_password)
             user.save()
 
-        # 5. Generate token + uid
-        token = default_token_generator.make_token(user)
-        uid = urlsafe_base64_encode(force_bytes(user.pk))
-
-        # Example: if frontend reset page is at /reset-password/
-        reset_url = f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/"
+        # 5. Generate reset link (token + uid)
+        reset_url = build_reset_url(user)
 
         # 6. Send email
-        send_invite_email.delay(email, reset_url, org.name) 
+        send_invite_email.delay(email, reset_url, org.name, org_id=org.pk)
 
         # 7. Add membership
         Membership.objects.get_or_create(user=user, organization=org, role=role)
@@ -153,6 +186,43 @@ class InviteMemberView(APIView):
             status=status.HTTP_201_CREATED
         )
 
+# ---------------------------
+# Bulk Invite Members (JSON list or CSV upload)
+# ---------------------------
+class BulkInviteMemberView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "invites"
+
+    def post(self, request):
+        org = request.organization
+        if not org:
+            return Response({"error": "Organization not found"}, status=404)
+
+        if get_membership_role(request.user, org, request) != "admin":
+            return Response({"error": "Not allowed"}, status=403)
+
+        # Either a CSV file (email,role columns) or {"invites": [{"email", "role"}, ...]}
+        if "file" in request.FILES:
+            try:
+                rows = parse_invite_csv(request.FILES["file"])
+            except ValueError as exc:
+                return Response({"error": str(exc)}, status=400)
+        else:
+            rows = request.data.get("invites") if isinstance(request.data, dict) else request.data
+        if not isinstance(rows, list) or not rows:
+            return Response({"error": "Provide a non-empty 'invites' list or a CSV 'file'"}, status=400)
+        if len(rows) > settings.INVITE_BULK_MAX_ROWS:
+            return Response({"error": f"At most {settings.INVITE_BULK_MAX_ROWS} invites per request"}, status=400)
+        if not all(isinstance(row, dict) for row in rows):
+            return Response({"error": "Each invite must be an object with 'email' and 'role'"}, status=400)
+
+        results = bulk_invite(org, rows)
+        summary = {}
+        for result in results:
+            summary[result["status"]] = summary.get(result["status"], 0) + 1
+        return Response({"summary": summary, "results": results}, status=status.HTTP_200_OK)
+
+
 class ResetPasswordConfirmView(APIView):
     permission_classes = [permissions.AllowAny]
     def post(self, request, uidb64, token):
@@ -176,21 +246,51 @@ class ResetPasswordConfirmView(APIView):
 # ---------------------------
 # My Memberships
 # ---------------------------
+def _my_memberships_query(user):
+    organization = FastReadSerializer.for_serializer(OrganizationSerializer, prefix="organization__")
+    memberships = Membership.objects.filter(user=user).values(*organization.columns, "role", "joined_at")
+    return organization, memberships
+
+
+def _my_memberships_data(organization, memberships):
+    return [
+        {
+            "organization": org_data,
+            "role": m["role"],
+            "joined_at": m["joined_at"],
+        }
+        for m, org_data in zip(memberships, organization.serialize_rows(memberships))
+    ]
+
+
 class MyMembershipsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_get(_my_membership_versions)
+    @cached_response(_my_membership_versions)
     def get(self, request):
-        memberships = Membership.objects.filter(user=request.user).select_related("organization")
-        data = [
-            {
-                "organization": OrganizationSerializer(m.organization).data,
-                "role": m.role,
-                "joined_at": m.joined_at,
-            }
-            for m in memberships
-        ]
-        return Response(data)
+        organization, memberships = _my_memberships_query(request.user)
+        return Response(_my_memberships_data(organization, list(memberships)))
+
+
+class AsyncMyMembershipsView(AsyncAPIView):
+    @conditional_get(_my_membership_versions)
+    @cached_response(_my_membership_versions)
+    async def get(self, request):
+        organization, memberships = _my_memberships_query(request.user)
+        return Response(_my_memberships_data(organization, [m async for m in memberships]))
+
 
+# ---------------------------
+# Refresh (JWT)
+# ---------------------------
+class TokenRefreshView(BaseTokenRefreshView):
+    serializer_class = TenantTokenRefreshSerializer
+
+    def post(self, request, *args, **kwargs):
+        response = super().post(request, *args, **kwargs)
+        add_never_cache_headers(response)
+        return response
 
 # ---------------------------
 # Switch Organization
@@ -200,38 +300,56 @@ class SwitchOrganizationView(APIView):
 
     def post(self, request):
         org_id = request.data.get("org_id")
-        if not Membership.objects.filter(user=request.user, organization_id=org_id).exists():
+        org = Organization.objects.filter(id=org_id, status__in=RESOLVABLE_STATUSES).first() if str(org_id).isdigit() else None
+        role = get_membership_role(request.user, org, request)
+        if not role:
             return Response({"error": "Not part of this organization"}, status=403)
 
-        request.session["current_org_id"] = org_id
-        return Response({"message": "Organization switched"})
+        # Reissue the token scoped to the new organization
+        refresh = tenant_token_for(request.user, org, role)
+        response = Response({
+            "message": "Organization switched",
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+            "org_id": org.id,
+            "role": role,
+        })
+        add_never_cache_headers(response)
+        return response
 
 class GetOrganizationMemberView(APIView):
-    permission_classes = [permissions.AllowAny]  # or IsAuthenticated if you want auth
+    # Member names and emails: only for the organization's own members
+    permission_classes = [IsMember]
 
+    @conditional_get(_org_member_versions)
+    @cached_response(_org_member_versions)
     def get(self, request):
-        # You can pass organization ID via query params: ?organization_id=1
-        org=request.organization
-        if not org:
-            return Response({"detail": "organization_id is required."}, status=400)
-
-        try:
-            org = Organization.objects.get(id=org.id)
-        except Organization.DoesNotExist:
-            return Response({"detail": "Organization not found."}, status=404)
+        org = request.organization
 
-        # Get all memberships for this organization
+        # One joined query per page, keyset-paginated on (joined_at, id)
         members = Membership.objects.filter(organization=org)
-        result = []
-
-        for m in members:
-            member = {
-                "user_id": m.user.id,
-                "username": m.user.username,
-                "email": m.user.email,
-                "role": m.role,
-                "organization": m.organization.name
-            }
-            result.append(member)  # append member dict to result list
+        role = request.query_params.get("role")
+        if role:
+            members = members.filter(role=role)
+        members = members.values("id", "joined_at", "role", "user_id", "user__username", "user__email")
 
-        return Response(result, status=200)
\ No newline at end of file
+        try:
+            rows, next_cursor = keyset_paginate(
+                members, ("joined_at", "id"),
+                cursor=request.query_params.get("cursor"),
+                limit=get_page_size(request),
+            )
+        except InvalidCursor:
+            return Response({"detail": "Invalid cursor."}, status=400)
+
+        result = [
+            {
+                "user_id": m["user_id"],
+                "username": m["user__username"],
+                "email": m["user__email"],
+                "role": m["role"],
+                "organization": org.name,
+            }
+            for m in rows
+        ]
+        return Response({"results": result, "next": next_cursor}, status=200)
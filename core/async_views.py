@@ -0,0 +1,124 @@
+import time
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import HttpResponse
+from django.utils.translation import gettext_lazy as _
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.response import Response
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .metrics import add_serialization_time
+from .renderers import dumps
+
+
+class AsyncAPIView(View):
+    """
+    Async counterpart of APIView for read endpoints served under ASGI, where
+    DRF views would run in a worker thread. Authenticates bearer JWTs like
+    JWTAuthentication (the user is loaded with the async ORM), exposes
+    request.query_params, applies DRF's default permissions and throttles,
+    and renders the DRF Response a handler returns as JSON, so
+    conditional_get and cached_response work unchanged.
+    """
+    http_method_names = ["get", "head", "options"]
+    permission_classes = drf_settings.DEFAULT_PERMISSION_CLASSES
+    throttle_classes = drf_settings.DEFAULT_THROTTLE_CLASSES
+
+    async def authenticate(self, request):
+        """(user, error Response or None) for the request's bearer token."""
+        authentication = JWTAuthentication()
+        header = authentication.get_header(request)
+        try:
+            raw_token = authentication.get_raw_token(header) if header else None
+            if raw_token is None:
+                return AnonymousUser(), None
+            token = authentication.get_validated_token(raw_token)
+            return await self.get_user(token), None
+        except (InvalidToken, AuthenticationFailed) as exc:
+            detail = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail, "code": exc.detail.code}
+            return AnonymousUser(), Response(detail, status=status.HTTP_401_UNAUTHORIZED)
+
+    @staticmethod
+    async def get_user(token):
+        """JWTAuthentication.get_user() with the async ORM."""
+        try:
+            user_id = token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        user = await get_user_model().objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+        if user is None:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+        return user
+
+    async def check_permissions(self, request):
+        """401/403 Response when a permission refuses the request, else None."""
+        for permission in [cls() for cls in self.permission_classes]:
+            if hasattr(permission, "ahas_permission"):
+                allowed = await permission.ahas_permission(request, self)
+            else:
+                allowed = await sync_to_async(permission.has_permission)(request, self)
+            if allowed:
+                continue
+            if not request.user.is_authenticated:
+                return Response(
+                    {"detail": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED
+                )
+            message = getattr(permission, "message", None) or "You do not have permission to perform this action."
+            return Response({"detail": message}, status=status.HTTP_403_FORBIDDEN)
+        return None
+
+    async def check_throttles(self, request):
+        """429 Response when any throttle refuses the request, else None."""
+        waits = []
+        for throttle in [cls() for cls in self.throttle_classes]:
+            if hasattr(throttle, "aallow_request"):
+                allowed = await throttle.aallow_request(request, self)
+            else:
+                allowed = await sync_to_async(throttle.allow_request)(request, self)
+            if not allowed:
+                waits.append(throttle.wait())
+        if not waits:
+            return None
+        wait = max((w for w in waits if w is not None), default=None)
+        detail = "Request was throttled."
+        if wait is not None:
+            detail += f" Expected available in {int(wait)} seconds."
+        response = Response({"detail": detail}, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        if wait is not None:
+            response["Retry-After"] = str(int(wait))
+        return response
+
+    async def dispatch(self, request, *args, **kwargs):
+        request.query_params = request.GET
+        request.user, error = await self.authenticate(request)
+        if error is None:
+            error = await self.check_permissions(request)
+        if error is None:
+            error = await self.check_throttles(request)
+        response = error or await super().dispatch(request, *args, **kwargs)
+        return self.finalize(request, response)
+
+    def finalize(self, request, response):
+        if not isinstance(response, Response):
+            return response
+        start = time.perf_counter()
+        content = dumps(response.data) if response.data is not None else b""
+        add_serialization_time(request, time.perf_counter() - start)
+        rendered = HttpResponse(content, status=response.status_code, content_type="application/json")
+        for header, value in response.items():
+            if header.lower() != "content-type":  # unrendered Responses carry a default one
+                rendered[header] = value
+        return rendered
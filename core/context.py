@@ -0,0 +1,20 @@
+from contextvars import ContextVar
+
+# Active organization for the current request/task. UNSET outside of a
+# request (management commands, workers), so tenant managers don't scope.
+UNSET = object()
+
+_current_organization = ContextVar("current_organization", default=UNSET)
+
+
+def get_current_organization():
+    return _current_organization.get()
+
+
+def set_current_organization(org):
+    """Set the active organization; returns a token for reset_current_organization()."""
+    return _current_organization.set(org)
+
+
+def reset_current_organization(token):
+    _current_organization.reset(token)
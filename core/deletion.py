@@ -0,0 +1,130 @@
+import shutil
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from accounts.models import Membership
+from .export import export_dir
+from .models import DeletionProgress, Organization, tenant_models
+from .tenancy import bump_membership_versions
+from .versioning import bump_versions
+
+DELETION_BATCH_SIZE = getattr(settings, "DELETION_BATCH_SIZE", 1000)
+
+
+# Progress lives in the database, not a cache: the worker doing the purge
+# and the web process reporting it rarely share a LocMem cache
+def get_deletion_progress(org_id):
+    record = DeletionProgress.objects.filter(organization_id=org_id).first()
+    return record.as_dict() if record else None
+
+
+def _save_progress(org_id, progress):
+    DeletionProgress.objects.update_or_create(
+        organization_id=org_id,
+        defaults={
+            "state": progress["state"],
+            "requested_by": progress.get("requested_by"),
+            "deleted": progress["deleted"],
+        },
+    )
+
+
+def mark_for_deletion(org, requested_by=None):
+    """
+    Flag `org` as deleting so tenancy stops resolving it; the rows are
+    removed later by purge_organization().
+    """
+    org.status = "deleting"
+    org.save(update_fields=["status"])  # signals evict it from the tenant cache
+    progress = get_deletion_progress(org.pk) or {"deleted": {}}
+    progress.update(state="pending", requested_by=requested_by)
+    _save_progress(org.pk, progress)
+
+
+def drain_remaining(org_id):
+    """
+    Seconds until no process can still resolve a pending deletion's
+    organization from its tenant cache (DELETION_DRAIN_SECONDS, default
+    TENANT_CACHE_TTL, after mark_for_deletion). Rows written before then
+    could land after the purge and be orphaned on their shard.
+    """
+    record = DeletionProgress.objects.filter(organization_id=org_id, state="pending").first()
+    if record is None:
+        return 0
+    drain = getattr(settings, "DELETION_DRAIN_SECONDS", None)
+    if drain is None:
+        drain = getattr(settings, "TENANT_CACHE_TTL", 300)
+    elapsed = (timezone.now() - record.updated_at).total_seconds()
+    return max(0, drain - elapsed)
+
+
+def _deletion_tables(org):
+    # Children before parents, so no batch trips a foreign key
+    for model in reversed(tenant_models()):
+        yield model, org.shard
+    yield Membership, DEFAULT_DB_ALIAS
+
+
+def _delete_batch(model, db, org, batch_size):
+    """Delete up to `batch_size` of `org`'s rows from `model`, lowest pk first."""
+    queryset = model._base_manager.using(db)
+    user_field = "user_id" if model is Membership else "pk"
+    with transaction.atomic(using=db):
+        rows = list(
+            queryset.filter(organization=org).order_by("pk").values_list("pk", user_field)[:batch_size]
+        )
+        if rows:
+            # Plain DELETE: the collector and per-row signals are what made
+            # cascading deletes slow; caches are invalidated here instead
+            connection = connections[db]
+            table = connection.ops.quote_name(model._meta.db_table)
+            pk_column = connection.ops.quote_name(model._meta.pk.column)
+            placeholders = ", ".join(["%s"] * len(rows))
+            with connection.cursor() as cursor:
+                cursor.execute(f"DELETE FROM {table} WHERE {pk_column} IN ({placeholders})", [pk for pk, _ in rows])
+
+    if model is Membership and rows:
+        user_ids = {user_id for _, user_id in rows}
+        bump_membership_versions(*user_ids)
+        bump_versions(*[("memberships", f"user:{user_id}") for user_id in user_ids])
+    return len(rows)
+
+
+def purge_organization(org_id, batch_size=DELETION_BATCH_SIZE):
+    """
+    Delete an organization flagged by mark_for_deletion() in short, bounded
+    transactions: each tenant table (children first), then memberships,
+    then the organization row. Safe to re-run after an interruption; it
+    simply carries on with whatever rows remain. Nothing is deleted until
+    drain_remaining() is 0: until then the progress is returned unchanged,
+    still "pending", for the caller to try again later.
+    """
+    org = Organization.objects.filter(pk=org_id, status="deleting").first()
+    if org is None or drain_remaining(org_id):
+        return get_deletion_progress(org_id)
+
+    progress = get_deletion_progress(org_id) or {"deleted": {}}
+    progress["state"] = "running"
+    _save_progress(org_id, progress)
+    for model, db in _deletion_tables(org):
+        label = model._meta.label_lower
+        while True:
+            deleted = _delete_batch(model, db, org, batch_size)
+            if not deleted:
+                break
+            progress["deleted"][label] = progress["deleted"].get(label, 0) + deleted
+            _save_progress(org_id, progress)
+
+    bump_versions(
+        ("projects", f"org:{org_id}"),
+        ("project-members", f"org:{org_id}"),
+        ("memberships", f"org:{org_id}"),
+    )
+    # Nothing left to cascade to but its TenantExport records
+    org.delete()
+    shutil.rmtree(export_dir(org_id), ignore_errors=True)
+    progress["state"] = "done"
+    _save_progress(org_id, progress)
+    return get_deletion_progress(org_id)
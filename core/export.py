@@ -0,0 +1,129 @@
+import csv
+import gzip
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from accounts.models import Membership
+from .models import TenantExport, tenant_models
+from .renderers import dumps
+
+EXPORT_CHUNK_SIZE = getattr(settings, "EXPORT_CHUNK_SIZE", 2000)
+EXPORT_FORMATS = ("ndjson", "csv")
+
+# Never export credentials
+USER_EXPORT_FIELDS = ["id", "username", "email", "first_name", "last_name", "is_active", "date_joined"]
+
+
+def export_tables(org):
+    """
+    (table label, column names, row iterator) for every table holding `org`'s
+    data: each BaseTenantModel on the tenant's shard, plus its memberships
+    and member users from the control database. Rows are value tuples read
+    through server-side cursors.
+    """
+    tables = []
+    for model in tenant_models():
+        columns = [f.attname for f in model._meta.concrete_fields]
+        queryset = model.all_objects.using(org.shard).filter(organization=org)
+        tables.append((model._meta.label_lower, columns, queryset))
+
+    columns = [f.attname for f in Membership._meta.concrete_fields]
+    tables.append((
+        Membership._meta.label_lower, columns,
+        Membership.objects.using(DEFAULT_DB_ALIAS).filter(organization=org),
+    ))
+
+    User = get_user_model()
+    tables.append((
+        User._meta.label_lower, USER_EXPORT_FIELDS,
+        User.objects.using(DEFAULT_DB_ALIAS).filter(memberships__organization=org),
+    ))
+
+    for label, columns, queryset in tables:
+        rows = queryset.order_by("pk").values_list(*columns).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        yield label, columns, rows
+
+
+def iter_ndjson(org):
+    """One JSON object per line, tagged with its table as "_table"."""
+    for label, columns, rows in export_tables(org):
+        lines = []
+        for row in rows:
+            lines.append(dumps({"_table": label, **dict(zip(columns, row))}))
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield b"\n".join(lines) + b"\n"
+                lines = []
+        if lines:
+            yield b"\n".join(lines) + b"\n"
+
+
+class _Echo:
+    # csv.writer target that hands back each formatted line
+    def write(self, value):
+        return value
+
+
+def iter_csv(org):
+    """CSV with a leading "_table" column; each table starts with its own header row."""
+    writer = csv.writer(_Echo())
+    for label, columns, rows in export_tables(org):
+        lines = [writer.writerow(["_table", *columns])]
+        for row in rows:
+            lines.append(writer.writerow([label, *row]))
+            if len(lines) >= EXPORT_CHUNK_SIZE:
+                yield "".join(lines).encode()
+                lines = []
+        if lines:
+            yield "".join(lines).encode()
+
+
+def iter_export(org, export_format="ndjson"):
+    if export_format == "csv":
+        return iter_csv(org)
+    return iter_ndjson(org)
+
+
+def export_dir(org_id):
+    """Where an organization's export files go; removed with the organization."""
+    return Path(settings.EXPORT_ROOT) / str(org_id)
+
+
+def write_export(org, export_format="ndjson", path=None):
+    """Write a gzip-compressed export file (default: under export_dir()); returns its path."""
+    if path is None:
+        root = export_dir(org.pk)
+        root.mkdir(parents=True, exist_ok=True)
+        path = root / f"{org.slug}-{timezone.now():%Y%m%d%H%M%S}.{export_format}.gz"
+    # Written aside and renamed, so a file at `path` is always complete
+    partial = f"{path}.part"
+    try:
+        with gzip.open(partial, "wb") as fh:
+            for chunk in iter_export(org, export_format):
+                fh.write(chunk)
+        os.replace(partial, path)
+    except BaseException:
+        if os.path.exists(partial):
+            os.remove(partial)
+        raise
+    return str(path)
+
+
+def run_export(export_id):
+    """Write a queued TenantExport's file, recording its state; returns the path."""
+    export = TenantExport.objects.select_related("organization").get(pk=export_id)
+    org = export.organization
+    TenantExport.objects.filter(pk=export.pk).update(state="running", updated_at=timezone.now())
+    root = export_dir(org.pk)
+    root.mkdir(parents=True, exist_ok=True)
+    try:
+        path = write_export(org, export.format, root / f"{export.pk}.{export.format}.gz")
+    except Exception:
+        TenantExport.objects.filter(pk=export.pk).update(state="failed", updated_at=timezone.now())
+        raise
+    TenantExport.objects.filter(pk=export.pk).update(state="done", path=path, updated_at=timezone.now())
+    return path
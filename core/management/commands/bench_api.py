@@ -0,0 +1,294 @@
+import asyncio
+import itertools
+import json
+import statistics
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+
+from asgiref.sync import ThreadSensitiveContext, sync_to_async
+from celery import current_app
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.db.models import Count
+from django.test import AsyncClient, Client, override_settings
+
+from accounts.models import Membership
+from core.metrics import QueryRecorder
+from core.models import Organization
+from .generate_tenant_data import DEFAULT_PASSWORD
+
+SCENARIOS = ("tenant_resolution", "login", "project_list", "project_create", "member_list", "memberships", "invite")
+READ_SCENARIOS = ("tenant_resolution", "project_list", "member_list", "memberships")
+
+
+def _private_caches():
+    """A private local-memory cache in place of every configured alias, for in-process runs."""
+    return {
+        alias: {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": f"bench-api-{alias}"}
+        for alias in settings.CACHES
+    }
+
+
+def _watch_queries(recorder):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(recorder))
+    return stack
+
+
+class InProcessClient:
+    """Drives the real URL conf through django.test.Client, counting queries."""
+
+    def __init__(self):
+        self.client = Client(HTTP_HOST="localhost", raise_request_exception=False)
+
+    def request(self, method, path, headers, body=None):
+        recorder = QueryRecorder(keep_sql=0)
+        token = recorder.activate()
+        try:
+            with _watch_queries(recorder):
+                response = self.client.generic(
+                    method, path, json.dumps(body) if body is not None else "",
+                    content_type="application/json", **{f"HTTP_{k.upper().replace('-', '_')}": v for k, v in headers.items()},
+                )
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                content = response.content if not response.streaming else b""
+        finally:
+            recorder.deactivate(token)
+        return response.status_code, content, recorder.count
+
+
+class AsgiClient:
+    """
+    Drives the URL conf through the ASGI handler (django.test.AsyncClient),
+    one thread-sensitive context per request as ASGIHandler gives them, so
+    requests run concurrently on the event loop.
+    """
+
+    def __init__(self):
+        self.client = AsyncClient(raise_request_exception=False)
+
+    async def arequest(self, method, path, headers, body=None):
+        recorder = QueryRecorder(keep_sql=0)
+        async with ThreadSensitiveContext():
+            token = recorder.activate()
+            stack = await sync_to_async(_watch_queries)(recorder)
+            try:
+                response = await self.client.generic(
+                    method, path, json.dumps(body) if body is not None else "",
+                    content_type="application/json", headers=headers,
+                )
+            finally:
+                stack.close()
+                recorder.deactivate(token)
+        return response.status_code, response.content, recorder.count
+
+    def request(self, method, path, headers, body=None):
+        return asyncio.run(self.arequest(method, path, headers, body))
+
+
+class RemoteClient:
+    """Same interface against a running server; query counts aren't visible."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip("/")
+
+    def request(self, method, path, headers, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(
+            self.base_url + path, data=data, method=method,
+            headers={"Content-Type": "application/json", **headers},
+        )
+        try:
+            with urllib.request.urlopen(req, timeout=30) as response:
+                return response.status, response.read(), None
+        except urllib.error.HTTPError as exc:
+            return exc.code, exc.read(), None
+
+
+def _summary(latencies, errors, queries, wall):
+    if not latencies:
+        return {"requests": 0, "errors": errors}
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive") if len(latencies) > 1 else latencies * 99
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "queries_per_request": round(statistics.fmean(queries), 2) if queries else None,
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the main API paths and print latency percentiles, throughput "
+        "and queries per request as JSON. Runs in-process against the real URL "
+        "conf (inside a transaction that is rolled back, with eager tasks, the "
+        "locmem email backend, private local-memory caches and rate limits "
+        "off) or, with --base-url, against a running server."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--org", help="organization slug (default: the one with most members)")
+        parser.add_argument("--username", help="an admin of --org (default: its first admin)")
+        parser.add_argument("--password", default=DEFAULT_PASSWORD)
+        parser.add_argument("--requests", type=int, default=200, help="measured requests per scenario")
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--scenarios", help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+        parser.add_argument("--base-url", help="e.g. http://localhost:8000")
+        parser.add_argument("--asgi", action="store_true",
+                            help="in-process through the ASGI handler, concurrently; read scenarios only")
+        parser.add_argument("--async-views", action="store_true",
+                            help="use the native async endpoints where they exist")
+        parser.add_argument("--concurrency", type=int, default=1,
+                            help="client threads with --base-url, in-flight requests with --asgi")
+        parser.add_argument("--output", help="also write the JSON report to this file")
+
+    def handle(self, **options):
+        default = READ_SCENARIOS if options["asgi"] else SCENARIOS
+        scenarios = [name for name in (options["scenarios"] or ",".join(default)).split(",") if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+        if options["asgi"] and set(scenarios) - set(READ_SCENARIOS):
+            # No surrounding transaction to roll back: requests run on their own threads
+            raise CommandError(f"--asgi runs read scenarios only: {', '.join(READ_SCENARIOS)}")
+        org, username = self.target(options["org"], options["username"])
+
+        if options["base_url"]:
+            client = RemoteClient(options["base_url"])
+            report = self.run(client, org, username, scenarios, options)
+        elif options["asgi"]:
+            # AsyncClient always sends Host: testserver
+            with override_settings(
+                ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], TENANT_PLAN_RATES={},
+                TENANT_USER_RATE=None, TENANT_ANON_RATE=None, CACHES=_private_caches(),
+            ):
+                report = self.run(AsgiClient(), org, username, scenarios, options)
+        else:
+            if options["concurrency"] != 1:
+                raise CommandError("--concurrency needs --base-url or --asgi; WSGI in-process runs are sequential")
+            eager = current_app.conf.task_always_eager
+            current_app.conf.task_always_eager = True
+            try:
+                with override_settings(
+                    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend", TENANT_PLAN_RATES={},
+                    TENANT_USER_RATE=None, TENANT_ANON_RATE=None,
+                    # Rolled-back rows must not leave versions, roles or responses in the real cache
+                    CACHES=_private_caches(),
+                ):
+                    with transaction.atomic():
+                        report = self.run(InProcessClient(), org, username, scenarios, options)
+                        transaction.set_rollback(True)
+            finally:
+                current_app.conf.task_always_eager = eager
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as fh:
+                fh.write(output + "\n")
+        self.stdout.write(output)
+
+    def target(self, slug, username):
+        orgs = Organization.objects.filter(status="active")
+        if slug:
+            org = orgs.filter(slug=slug).first()
+        else:
+            org = orgs.annotate(members=Count("memberships")).order_by("-members", "id").first()
+        if org is None:
+            raise CommandError("No organization to benchmark; run generate_tenant_data first")
+        if not username:
+            username = (
+                Membership.objects.filter(organization=org, role="admin")
+                .order_by("id").values_list("user__username", flat=True).first()
+            )
+            if not username:
+                raise CommandError(f"{org.slug} has no admin; pass --username")
+        return org, username
+
+    def run(self, client, org, username, scenarios, options):
+        members = Membership.objects.filter(organization=org).count()
+        headers = {"X-Org": org.slug}
+        status, body, _ = client.request(
+            "POST", "/api/accounts/login/", headers, {"username": username, "password": options["password"]}
+        )
+        if status != 200:
+            raise CommandError(f"Login as {username} failed ({status}): {body[:200]!r}")
+        auth = {**headers, "Authorization": f"Bearer {json.loads(body)['access']}"}
+
+        counter = itertools.count()
+        prefix = "async/" if options["async_views"] else ""
+        requests = {
+            "tenant_resolution": lambda: ("GET", f"/api/accounts/{prefix}me/", auth, None),
+            "login": lambda: (
+                "POST", "/api/accounts/login/", headers, {"username": username, "password": options["password"]}
+            ),
+            "project_list": lambda: ("GET", f"/api/projects/{prefix}organizations/{org.id}/projects/", auth, None),
+            "project_create": lambda: (
+                "POST", f"/api/projects/organizations/{org.id}/projects/", auth,
+                {"name": f"bench project {next(counter)}", "organization": org.id},
+            ),
+            "member_list": lambda: ("GET", "/api/accounts/orgmembers/", auth, None),
+            "memberships": lambda: ("GET", f"/api/accounts/{prefix}me/memberships/", auth, None),
+            "invite": lambda: (
+                "POST", "/api/accounts/organizations/invite/", auth,
+                {"email": f"bench-{uuid.uuid4().hex[:12]}@example.com", "role": "employee"},
+            ),
+        }
+
+        results = {}
+        for name in scenarios:
+            for _ in range(options["warmup"]):
+                client.request(*requests[name]())
+            results[name] = self.measure(client, requests[name], options["requests"], options["concurrency"])
+        return {
+            "mode": "remote" if options["base_url"] else "asgi" if options["asgi"] else "wsgi",
+            "target": options["base_url"] or "urlconf",
+            "async_views": options["async_views"],
+            "organization": org.slug,
+            "members": members,
+            "concurrency": options["concurrency"],
+            "scenarios": results,
+        }
+
+    def measure(self, client, make_request, count, concurrency):
+        def one(_):
+            method, path, headers, body = make_request()
+            start = time.perf_counter()
+            status, _, queries = client.request(method, path, headers, body)
+            return time.perf_counter() - start, status, queries
+
+        start = time.perf_counter()
+        if isinstance(client, AsgiClient):
+            samples = asyncio.run(self.ameasure(client, make_request, count, concurrency))
+        elif concurrency > 1:
+            with ThreadPoolExecutor(concurrency) as pool:
+                samples = list(pool.map(one, range(count)))
+        else:
+            samples = [one(i) for i in range(count)]
+        wall = time.perf_counter() - start
+
+        errors = sum(1 for _, status, _ in samples if status >= 400)
+        queries = [q for _, _, q in samples if q is not None]
+        return _summary([latency for latency, _, _ in samples], errors, queries, wall)
+
+    async def ameasure(self, client, make_request, count, concurrency):
+        slots = asyncio.Semaphore(concurrency)
+
+        async def one():
+            method, path, headers, body = make_request()
+            async with slots:
+                start = time.perf_counter()
+                status, _, queries = await client.arequest(method, path, headers, body)
+                return time.perf_counter() - start, status, queries
+
+        return await asyncio.gather(*[one() for _ in range(count)])
@@ -0,0 +1,49 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import Organization
+from core.serializers import FastReadSerializer
+from projects.models import Project
+from projects.serializers import ProjectSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare ProjectSerializer with FastReadSerializer on N generated "
+        "projects. Rows are created in a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def best_of(self, repeat, fn):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+        return min(timings)
+
+    def handle(self, rows, repeat, **options):
+        with transaction.atomic():
+            org = Organization.objects.create(name="bench-serializers", slug="bench-serializers")
+            Project.all_objects.bulk_create(
+                [Project(organization=org, name=f"project {i}") for i in range(rows)], batch_size=1000
+            )
+            queryset = Project.all_objects.filter(organization=org).order_by("id")
+            fast = FastReadSerializer(ProjectSerializer)
+
+            model_serializer = self.best_of(repeat, lambda: ProjectSerializer(queryset, many=True).data)
+            fast_serializer = self.best_of(repeat, lambda: fast.serialize(queryset))
+            transaction.set_rollback(True)
+
+        self.stdout.write(json.dumps({
+            "rows": rows,
+            "model_serializer_s": round(model_serializer, 4),
+            "fast_serializer_s": round(fast_serializer, 4),
+            "speedup": round(model_serializer / fast_serializer, 2),
+        }))
@@ -0,0 +1,44 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.deletion import DELETION_BATCH_SIZE, drain_remaining, mark_for_deletion, purge_organization
+from core.models import Organization
+from worker.tasks import delete_organization
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete organizations in bounded batches. With no slugs, resume every "
+        "organization already marked as deleting."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("slugs", nargs="*")
+        parser.add_argument("--sync", action="store_true", help="run here instead of queueing a worker job")
+        parser.add_argument("--batch-size", type=int, default=DELETION_BATCH_SIZE)
+
+    def handle(self, slugs, sync, batch_size, **options):
+        if slugs:
+            orgs = list(Organization.objects.filter(slug__in=slugs))
+            missing = set(slugs) - {org.slug for org in orgs}
+            if missing:
+                raise CommandError(f"No organization with slug {', '.join(sorted(missing))}")
+            for org in orgs:
+                if org.status != "deleting":
+                    mark_for_deletion(org)
+        else:
+            orgs = list(Organization.objects.filter(status="deleting"))
+
+        for org in orgs:
+            if sync:
+                remaining = drain_remaining(org.id)
+                if remaining:
+                    self.stderr.write(f"Waiting {remaining:.0f}s for cached lookups of {org.slug} to expire")
+                    time.sleep(remaining)
+                progress = purge_organization(org.id, batch_size=batch_size)
+                self.stdout.write(f"{org.slug}: {json.dumps(progress)}")
+            else:
+                result = delete_organization.delay(org.id)
+                self.stderr.write(f"{org.slug}: queued deletion task {result.id}")
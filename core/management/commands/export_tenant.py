@@ -0,0 +1,35 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.export import EXPORT_FORMATS, iter_export, write_export
+from core.models import Organization, TenantExport
+from worker.tasks import export_tenant_data
+
+
+class Command(BaseCommand):
+    help = "Export one organization's data as NDJSON or CSV, streamed with bounded memory."
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("--format", dest="export_format", choices=EXPORT_FORMATS, default="ndjson")
+        parser.add_argument("--output", help="gzip file to write (default: stdout, uncompressed)")
+        parser.add_argument("--async", dest="run_async", action="store_true",
+                            help="queue a worker job that writes a gzip file, served by the export endpoints")
+
+    def handle(self, slug, export_format, output, run_async, **options):
+        try:
+            org = Organization.objects.get(slug=slug)
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization with slug {slug!r}")
+
+        if run_async:
+            export = TenantExport.objects.create(organization=org, format=export_format)
+            result = export_tenant_data.delay(org.id, export_format, export_id=str(export.pk))
+            self.stderr.write(f"Queued export {export.pk} (task {result.id})")
+        elif output:
+            self.stderr.write(f"Wrote {write_export(org, export_format, output)}")
+        else:
+            for chunk in iter_export(org, export_format):
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.flush()
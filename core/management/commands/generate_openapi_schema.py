@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from TenantX.swaggers import generate_schema
+
+
+class Command(BaseCommand):
+    help = (
+        "Write the OpenAPI document served at /swagger.json to OPENAPI_SCHEMA_PATH. "
+        "With --check, write nothing and fail when that file is out of date."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="default: settings.OPENAPI_SCHEMA_PATH")
+        parser.add_argument("--check", action="store_true", help="exit non-zero if the file differs from the code")
+
+    def handle(self, output, check, **options):
+        path = output or settings.OPENAPI_SCHEMA_PATH
+        if not path:
+            raise CommandError("No output path; set OPENAPI_SCHEMA_PATH or pass --output")
+        schema = generate_schema()
+
+        if check:
+            try:
+                with open(path, "rb") as fh:
+                    current = fh.read()
+            except FileNotFoundError:
+                raise CommandError(f"{path} does not exist; run manage.py generate_openapi_schema")
+            if current != schema:
+                raise CommandError(f"{path} is out of date; run manage.py generate_openapi_schema")
+            self.stderr.write(f"{path} is up to date")
+            return
+
+        with open(path, "wb") as fh:
+            fh.write(schema)
+        self.stderr.write(f"Wrote {path}")
@@ -0,0 +1,137 @@
+import json
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.models import Membership, User
+from core.models import Organization
+from projects.models import Project, ProjectMember
+
+DEFAULT_PASSWORD = "bench-password"
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate synthetic tenants with bulk inserts: organizations, users "
+        "sharing one password, Zipf-skewed memberships and projects (a few "
+        "huge tenants, a long tail of small ones). Deterministic for a given --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--orgs", type=int, default=100)
+        parser.add_argument("--users", type=int, default=2000)
+        parser.add_argument("--projects", type=int, default=10000)
+        parser.add_argument("--project-members", type=int, default=2, help="members assigned per project")
+        parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for tenant sizes")
+        parser.add_argument("--max-memberships", type=int, default=3, help="organizations per user, at most")
+        parser.add_argument("--prefix", default="gen")
+        parser.add_argument("--password", default=DEFAULT_PASSWORD)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, **options):
+        if options["orgs"] < 1 or options["users"] < options["orgs"]:
+            raise CommandError("Need at least one organization and one user per organization")
+        prefix = options["prefix"]
+        if Organization.objects.filter(slug__startswith=f"{prefix}-org-").exists():
+            raise CommandError(f"Data with prefix {prefix!r} already exists; pick another --prefix")
+
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        started = time.perf_counter()
+
+        orgs = self.create_orgs(prefix, options["orgs"])
+        user_ids = self.create_users(prefix, options["users"], options["password"])
+        weights = [1 / (rank + 1) ** options["skew"] for rank in range(len(orgs))]
+        members = self.create_memberships(orgs, user_ids, weights, options["max_memberships"])
+        projects, project_members = self.create_projects(
+            orgs, members, weights, options["projects"], options["project_members"]
+        )
+
+        largest = orgs[0]
+        admin = User.objects.filter(pk=members[largest.pk][0]).values_list("username", flat=True).first()
+        self.stdout.write(json.dumps({
+            "organizations": len(orgs),
+            "users": len(user_ids),
+            "memberships": sum(len(ids) for ids in members.values()),
+            "projects": projects,
+            "project_members": project_members,
+            "largest_org": {"slug": largest.slug, "members": len(members[largest.pk]), "admin": admin},
+            "seconds": round(time.perf_counter() - started, 2),
+        }))
+
+    def bulk(self, model, objs):
+        model._base_manager.bulk_create(objs, batch_size=self.batch_size)
+
+    def create_orgs(self, prefix, count):
+        self.bulk(Organization, [
+            Organization(name=f"{prefix} org {i}", slug=f"{prefix}-org-{i}") for i in range(count)
+        ])
+        # Ordered by size rank: org 0 gets the largest share
+        return list(Organization.objects.filter(slug__startswith=f"{prefix}-org-").order_by("id"))
+
+    def create_users(self, prefix, count, password):
+        # Hashing is the slow part of creating users; every user shares one hash
+        password_hash = make_password(password)
+        for start in range(0, count, self.batch_size):
+            self.bulk(User, [
+                User(username=f"{prefix}-user-{i}", email=f"{prefix}-user-{i}@example.com", password=password_hash)
+                for i in range(start, min(start + self.batch_size, count))
+            ])
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}-user-").order_by("id").values_list("id", flat=True)
+        )
+
+    def create_memberships(self, orgs, user_ids, weights, max_memberships):
+        """org pk -> member user ids; the first one is the org's admin."""
+        members = {org.pk: [user_ids[i]] for i, org in enumerate(orgs)}
+        for user_id in user_ids[len(orgs):]:
+            count = self.rng.randint(1, max_memberships)
+            for index in set(self.rng.choices(range(len(orgs)), weights=weights, k=count)):
+                members[orgs[index].pk].append(user_id)
+
+        batch = []
+        for org_id, ids in members.items():
+            for position, user_id in enumerate(ids):
+                role = "admin" if position == 0 else self.rng.choices(("manager", "employee"), (1, 9))[0]
+                batch.append(Membership(organization_id=org_id, user_id=user_id, role=role))
+                if len(batch) >= self.batch_size:
+                    self.bulk(Membership, batch)
+                    batch = []
+        if batch:
+            self.bulk(Membership, batch)
+        return members
+
+    def create_projects(self, orgs, members, weights, total, per_project):
+        total_weight = sum(weights)
+        counts = [int(total * w / total_weight) for w in weights]
+        counts[0] += total - sum(counts)
+
+        created = assigned = 0
+        batch = []
+        for org, count in zip(orgs, counts):
+            for i in range(count):
+                batch.append(Project(organization=org, name=f"{org.slug} project {i}"))
+                if len(batch) >= self.batch_size:
+                    assigned += self.flush_projects(batch, members, per_project)
+                    created += len(batch)
+                    batch = []
+        if batch:
+            assigned += self.flush_projects(batch, members, per_project)
+            created += len(batch)
+        return created, assigned
+
+    def flush_projects(self, projects, members, per_project):
+        self.bulk(Project, projects)  # primary keys are set on the instances
+        project_members = []
+        for project in projects:
+            candidates = members[project.organization_id]
+            for user_id in self.rng.sample(candidates, min(per_project, len(candidates))):
+                project_members.append(ProjectMember(
+                    organization_id=project.organization_id, project_id=project.pk, user_id=user_id,
+                    role=self.rng.choice(("owner", "developer", "viewer")),
+                ))
+        self.bulk(ProjectMember, project_members)
+        return len(project_members)
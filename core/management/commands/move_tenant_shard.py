@@ -0,0 +1,133 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import IntegrityError, connections, transaction
+
+from core.models import Organization, tenant_models
+from core.routers import shard_aliases
+
+
+class Command(BaseCommand):
+    help = (
+        "Move one organization's tenant rows to another shard in batches, then "
+        "point the organization at it. The organization is marked as moving "
+        "first: it stays readable from the source shard, but writes are refused "
+        "until the move is done. Rows keep their primary keys: the move aborts, leaving "
+        "the source untouched, if any of them is taken on the target by "
+        "another tenant. An interrupted move can be re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("target", help="database alias of the destination shard")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--drain-seconds", type=float,
+            help="wait after blocking writes, and again after switching shards, for other "
+                 "processes' cached lookups of the organization to go (default: TENANT_CACHE_TTL)",
+        )
+
+    def handle(self, slug, target, batch_size, drain_seconds, **options):
+        try:
+            org = Organization.objects.get(slug=slug)
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization with slug {slug!r}")
+        if target not in shard_aliases():
+            raise CommandError(f"{target!r} is not in DATABASE_SHARDS")
+        if org.status not in ("active", "moving"):
+            raise CommandError(f"{slug} is {org.status}")
+        source = org.shard
+        if source == target:
+            raise CommandError(f"{slug} is already on {target}")
+
+        try:
+            models = tenant_models()
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        if drain_seconds is None:
+            drain_seconds = getattr(settings, "TENANT_CACHE_TTL", 300)
+
+        # 1) Block writes: TenantMiddleware refuses them for moving organizations
+        if org.status != "moving":
+            org.status = "moving"
+            org.save(update_fields=["status"])
+            self.drain(slug, drain_seconds)
+
+        # 2) Copy, parents first, keyset-ordered by pk
+        copied = {}
+        try:
+            for model in models:
+                copied[model] = self.copy(model, org, source, target, batch_size)
+                self.stdout.write(f"{model._meta.label}: copied {len(copied[model])} rows to {target}")
+        except CommandError:
+            # The source is still authoritative: drop every copy on the target
+            for model in reversed(models):
+                model.all_objects.using(target).filter(organization=org)._raw_delete(target)
+            org.status = "active"
+            org.save(update_fields=["status"])
+            raise
+
+        # Explicit pks were inserted, so bring the target's sequences forward
+        with connections[target].cursor() as cursor:
+            for sql in connections[target].ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+        # 3) Flip the tenant to the new shard, still read-only, and wait until
+        # no process reads it from the old one before unblocking writes
+        org.shard = target
+        org.save(update_fields=["shard"])
+        self.drain(slug, drain_seconds)
+        org.status = "active"
+        org.save(update_fields=["status"])
+
+        # 4) Delete the copied rows from the old shard, children first. Here
+        # and above, without delete signals: the rows live on elsewhere, so
+        # they must not leave tombstones (projects.DeletedProject)
+        for model in reversed(models):
+            pks = copied[model]
+            for start in range(0, len(pks), batch_size):
+                with transaction.atomic(using=source):
+                    model.all_objects.using(source).filter(pk__in=pks[start:start + batch_size])._raw_delete(source)
+            self.stdout.write(f"{model._meta.label}: deleted {len(pks)} rows from {source}")
+
+        self.stdout.write(self.style.SUCCESS(f"Moved {slug} from {source} to {target}"))
+
+    def drain(self, slug, seconds):
+        # Saves bump the tenant cache generation, so processes sharing its
+        # cache catch up within TENANT_CACHE_CHECK_INTERVAL; the rest only
+        # once their entries expire
+        if seconds:
+            self.stderr.write(f"Waiting {seconds:g}s for cached lookups of {slug} to expire")
+            time.sleep(seconds)
+
+    def copy(self, model, org, source, target, batch_size):
+        """Copy the org's `model` rows to `target`; returns the copied pks."""
+        copied = []
+        last_pk = 0
+        while True:
+            batch = list(
+                model.all_objects.using(source)
+                .filter(organization=org, pk__gt=last_pk)
+                .order_by("pk")[:batch_size]
+            )
+            if not batch:
+                return copied
+            pks = [row.pk for row in batch]
+            owners = dict(
+                model.all_objects.using(target).filter(pk__in=pks).values_list("pk", "organization_id")
+            )
+            taken = sorted(pk for pk, owner in owners.items() if owner != org.pk)
+            if taken:
+                raise CommandError(f"Aborted: {model._meta.label} pks {taken[:10]} are taken on {target}")
+            # Rows already there are this tenant's, from an interrupted run
+            missing = [row for row in batch if row.pk not in owners]
+            try:
+                with transaction.atomic(using=target):
+                    model.all_objects.using(target).bulk_create(missing)
+            except IntegrityError as exc:
+                raise CommandError(f"Aborted: {model._meta.label} rows could not be inserted on {target}: {exc}")
+            copied.extend(pks)
+            last_pk = pks[-1]
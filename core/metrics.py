@@ -0,0 +1,146 @@
+import hmac
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+# Prometheus text exposition, kept per process: scrape every web worker
+# (or run one worker per pod) rather than aggregating here.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 200, 500)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a fixed tuple of label values."""
+
+    def __init__(self, name, documentation, labelnames, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            counts = series[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(labels, list(counts), total, count) for labels, (counts, total, count) in self._series.items()]
+        for labels, counts, total, count in sorted(series):
+            label_str = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, labels))
+            prefix = label_str + "," if label_str else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{_format_value(bound)}"}} {cumulative}')
+            lines.append(f"{self.name}_sum{{{label_str}}} {total!r}")
+            lines.append(f"{self.name}_count{{{label_str}}} {count}")
+        return lines
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+REQUEST_LABELS = ("view", "method", "organization", "status")
+
+REQUEST_DURATION = Histogram(
+    "tenantx_request_duration_seconds", "Wall time spent handling a request.", REQUEST_LABELS
+)
+REQUEST_DB_DURATION = Histogram(
+    "tenantx_request_db_duration_seconds", "Time spent in database queries per request.", REQUEST_LABELS
+)
+REQUEST_DB_QUERIES = Histogram(
+    "tenantx_request_db_queries", "Database queries executed per request.", REQUEST_LABELS, QUERY_BUCKETS
+)
+REQUEST_SERIALIZATION_DURATION = Histogram(
+    "tenantx_request_serialization_seconds", "Time spent rendering response bodies per request.", REQUEST_LABELS
+)
+
+REGISTRY = [REQUEST_DURATION, REQUEST_DB_DURATION, REQUEST_DB_QUERIES, REQUEST_SERIALIZATION_DURATION]
+
+
+def add_serialization_time(request, seconds):
+    """Attribute rendering time to `request` (a DRF Request or HttpRequest)."""
+    if request is None:
+        return
+    request = getattr(request, "_request", request)
+    request._serialization_seconds = getattr(request, "_serialization_seconds", 0.0) + seconds
+
+
+# Recorders active in the current context (a request, plus any enclosing
+# ones); sync_to_async copies it to the ORM thread, so concurrent async
+# requests sharing a thread don't count each other's queries
+_active_recorders = ContextVar("query_recorders", default=())
+
+
+class QueryRecorder:
+    """connection.execute_wrapper() hook counting queries and their duration."""
+
+    def __init__(self, keep_sql=200):
+        self.count = 0
+        self.duration = 0.0
+        self.statements = []
+        self.keep_sql = keep_sql
+
+    def activate(self):
+        """Only count queries made in this context from now on; returns a reset token."""
+        return _active_recorders.set(_active_recorders.get() + (self,))
+
+    def deactivate(self, token):
+        _active_recorders.reset(token)
+
+    def __call__(self, execute, sql, params, many, context):
+        active = _active_recorders.get()
+        if active and self not in active:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.count += 1
+            self.duration += elapsed
+            if len(self.statements) < self.keep_sql:
+                self.statements.append((context["connection"].alias, elapsed, sql))
+
+
+def metrics_view(request):
+    """
+    Prometheus scrape endpoint, for requests bearing METRICS_TOKEN. Without
+    a token it only answers under DEBUG or to INTERNAL_IPS.
+    """
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token:
+        supplied = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        if not hmac.compare_digest(supplied.encode(), token.encode()):
+            return HttpResponseForbidden()
+    elif not (settings.DEBUG or request.META.get("REMOTE_ADDR") in getattr(settings, "INTERNAL_IPS", ())):
+        return HttpResponseForbidden()
+    lines = []
+    for histogram in REGISTRY:
+        lines.extend(histogram.collect())
+    return HttpResponse("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
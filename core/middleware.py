@@ -1,9 +1,433 @@
-from .tenancy import get_org_from_request
+import logging
+import re
+import secrets
+import threading
+import time
+import zlib
+from contextlib import ExitStack
+from gzip import GzipFile
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.text import StreamingBuffer, compress_sequence, compress_string
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.settings import api_settings
+
+from . import metrics, profiling
+from .context import reset_current_organization, set_current_organization
+from .routers import begin_routing, end_routing
+from .tenancy import aget_org_from_request, get_org_from_request
+from .tokens import get_token_claims
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+_accepts_gzip = re.compile(r"\bgzip\b")
+_accepts_br = re.compile(r"\bbr\b")
+
+
+class DualModeMiddleware:
+    """
+    Base for middleware that runs natively under WSGI and ASGI: subclasses
+    implement __call__ and __acall__ and start __call__ with
+    `if self.async_mode: return self.__acall__(request)`, so an async
+    stack never has to hop to a thread for them.
+    """
+    sync_capable = True
+    async_capable = True
 
-class TenantMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
 
+def _refuse_write(request):
+    """Organizations being moved between shards are read-only until the move finishes."""
+    org = request.organization
+    if org is not None and org.status == "moving" and request.method not in SAFE_METHODS:
+        response = JsonResponse({"error": "Organization is being moved; try again shortly"}, status=503)
+        response["Retry-After"] = str(getattr(settings, "TENANT_MOVE_RETRY_AFTER", 60))
+        return response
+    return None
+
+
+class TenantMiddleware(DualModeMiddleware):
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
         request.organization = get_org_from_request(request)
-        return self.get_response(request)
\ No newline at end of file
+        refused = _refuse_write(request)
+        if refused is not None:
+            return refused
+        token = set_current_organization(request.organization)
+        try:
+            return self.get_response(request)
+        finally:
+            reset_current_organization(token)
+
+    async def __acall__(self, request):
+        request.organization = await aget_org_from_request(request)
+        refused = _refuse_write(request)
+        if refused is not None:
+            return refused
+        token = set_current_organization(request.organization)
+        try:
+            return await self.get_response(request)
+        finally:
+            reset_current_organization(token)
+
+
+class RateLimitHeadersMiddleware(DualModeMiddleware):
+    """Reports the quota core.throttling measured for the request as X-RateLimit-* headers."""
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._add_headers(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._add_headers(request, await self.get_response(request))
+
+    @staticmethod
+    def _add_headers(request, response):
+        quota = getattr(request, "_rate_limit", None)
+        if quota is not None:
+            response["X-RateLimit-Limit"] = str(quota["limit"])
+            response["X-RateLimit-Remaining"] = str(quota["remaining"])
+            if quota["retry_after"] and not response.has_header("Retry-After"):
+                response["Retry-After"] = str(quota["retry_after"])
+        return response
+
+
+class ReplicaRoutingMiddleware(DualModeMiddleware):
+    """
+    Lets safe-method requests read from replicas (core.routers). After a
+    write, the tenant and user stick to the primary for
+    DATABASE_REPLICA_STICKY_SECONDS so they always read their own writes.
+    Must come after TenantMiddleware.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.cache = caches[getattr(settings, "DATABASE_STICKY_CACHE_ALIAS", "default")]
+        self.sticky_seconds = getattr(settings, "DATABASE_REPLICA_STICKY_SECONDS", 5)
+
+    @staticmethod
+    def _token_user_id(request):
+        claims = get_token_claims(request)
+        return claims.get(api_settings.USER_ID_CLAIM) if claims else None
+
+    def _sticky_keys(self, request, user_id):
+        keys = []
+        org = getattr(request, "organization", None)
+        if org:
+            keys.append(f"tenantx:db-pin:org:{org.pk}")
+        if user_id is not None:
+            keys.append(f"tenantx:db-pin:user:{user_id}")
+        return keys
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        if not getattr(settings, "DATABASE_REPLICAS", None):
+            return self.get_response(request)
+
+        user_id = self._token_user_id(request)
+        if user_id is None and request.user.is_authenticated:
+            user_id = request.user.pk
+        keys = self._sticky_keys(request, user_id)
+        safe = request.method in SAFE_METHODS
+        pinned = bool(keys and self.cache.get_many(keys))
+        token = begin_routing(use_replicas=safe and not pinned)
+        try:
+            return self.get_response(request)
+        finally:
+            state = end_routing(token)
+            if state["wrote"] or not safe:
+                self.cache.set_many({key: 1 for key in keys}, self.sticky_seconds)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "DATABASE_REPLICAS", None):
+            return await self.get_response(request)
+
+        user_id = self._token_user_id(request)
+        if user_id is None:
+            user = await request.auser()
+            user_id = user.pk if user.is_authenticated else None
+        keys = self._sticky_keys(request, user_id)
+        safe = request.method in SAFE_METHODS
+        pinned = bool(keys and await self.cache.aget_many(keys))
+        token = begin_routing(use_replicas=safe and not pinned)
+        try:
+            return await self.get_response(request)
+        finally:
+            state = end_routing(token)
+            if state["wrote"] or not safe:
+                await self.cache.aset_many({key: 1 for key in keys}, self.sticky_seconds)
+
+
+def _brotli_padding(max_random_bytes):
+    """
+    Ends a flushed (so byte-aligned) brotli stream in place of finish(): a
+    metadata meta-block of 1 to max_random_bytes (at most 256) skipped bytes,
+    then the empty last meta-block.
+    """
+    size = 1 + secrets.randbelow(max_random_bytes)
+    # ISLAST=0, MNIBBLES=0 (metadata), reserved bit, MSKIPBYTES=1, MSKIPLEN-1
+    header = (3 << 1) | (1 << 4) | ((size - 1) << 6)
+    return header.to_bytes(2, "little") + bytes(size) + b"\x03"  # ISLAST=1, ISLASTEMPTY=1
+
+
+class CompressionMiddleware(DualModeMiddleware):
+    """
+    Brotli (when the brotli package is installed) or gzip compression for
+    responses of at least COMPRESSION_MIN_SIZE bytes, including streamed
+    ones. Like GZipMiddleware, it should sit near the top of MIDDLEWARE.
+
+    Against BREACH, responses marked Cache-Control: no-store (the ones
+    carrying tokens, see add_never_cache_headers) are never compressed,
+    and output gets random-length padding: a gzip header field as in
+    GZipMiddleware, a brotli metadata block (_brotli_padding).
+    """
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, "COMPRESSION_MIN_SIZE", 1024)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if response.has_header("Content-Encoding"):
+            return response
+        if "no-store" in response.get("Cache-Control", ""):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accept = request.headers.get("Accept-Encoding", "")
+        if brotli is not None and _accepts_br.search(accept):
+            encoding = "br"
+        elif _accepts_gzip.search(accept):
+            encoding = "gzip"
+        else:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = self._async_stream(response.streaming_content, encoding)
+            elif encoding == "br":
+                response.streaming_content = self._brotli_stream(response.streaming_content, self.max_random_bytes)
+            else:
+                response.streaming_content = compress_sequence(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes
+                )
+            del response["Content-Length"]
+        else:
+            if len(response.content) < self.min_size:
+                return response
+            if encoding == "br":
+                compressor = brotli.Compressor()
+                compressed = (
+                    compressor.process(response.content) + compressor.flush()
+                    + _brotli_padding(self.max_random_bytes)
+                )
+            else:
+                compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response["Content-Length"] = str(len(compressed))
+
+        # The compressed body isn't byte-identical any more
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+        response["Content-Encoding"] = encoding
+        return response
+
+    @staticmethod
+    def _brotli_stream(chunks, max_random_bytes):
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            data = compressor.process(chunk)
+            if data:
+                yield data
+            yield compressor.flush()
+        yield compressor.flush() + _brotli_padding(max_random_bytes)
+
+    async def _async_stream(self, chunks, encoding):
+        if encoding == "br":
+            compressor = brotli.Compressor()
+            async for chunk in chunks:
+                yield compressor.process(chunk) + compressor.flush()
+            yield compressor.flush() + _brotli_padding(self.max_random_bytes)
+        else:
+            # As compress_sequence(), flushing after every chunk
+            buffer = StreamingBuffer()
+            filename = b"a" * secrets.randbelow(self.max_random_bytes)
+            with GzipFile(filename=filename, mode="wb", compresslevel=6, fileobj=buffer, mtime=0) as zfile:
+                async for chunk in chunks:
+                    zfile.write(chunk)
+                    zfile.flush(zlib.Z_SYNC_FLUSH)
+                    yield buffer.read()
+            yield buffer.read()
+
+
+class RequestMetricsMiddleware(DualModeMiddleware):
+    """
+    Records wall time, query count, DB time and render time for every
+    request into the core.metrics histograms, labelled by URL name, method,
+    organization and status. Requests running more than REQUEST_QUERY_BUDGET
+    queries are logged with their SQL. Should be first in MIDDLEWARE.
+    """
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.query_budget = getattr(settings, "REQUEST_QUERY_BUDGET", 50)
+        self.tag_organization = getattr(settings, "METRICS_TAG_ORGANIZATION", False)
+
+    @staticmethod
+    def _watch_queries(recorder):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        return stack
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        start = time.perf_counter()
+        recorder = metrics.QueryRecorder()
+        stack = self._watch_queries(recorder)
+        token = recorder.activate()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+        finally:
+            recorder.deactivate(token)
+
+        self._finish(stack, request, response, recorder, start)
+        return response
+
+    async def __acall__(self, request):
+        start = time.perf_counter()
+        recorder = metrics.QueryRecorder()
+        # Connections are per thread: hook the ones of the thread that runs
+        # this request's ORM calls (one thread per request under ASGIHandler)
+        token = recorder.activate()
+        stack = await sync_to_async(self._watch_queries)(recorder)
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            stack.close()
+            raise
+        finally:
+            recorder.deactivate(token)
+
+        self._finish(stack, request, response, recorder, start)
+        return response
+
+    def _finish(self, stack, request, response, recorder, start):
+        def finish():
+            stack.close()
+            self._record(request, response, recorder, start)
+
+        if response.streaming:
+            # Streamed bodies run their queries while being sent; the server
+            # closes the response even when the client left before the body
+            response._resource_closers.append(finish)
+        else:
+            finish()
+
+    def _labels(self, request, response):
+        match = getattr(request, "resolver_match", None)
+        view = (match.view_name if match else None) or "<unresolved>"
+        org = getattr(request, "organization", None) if self.tag_organization else None
+        return (view, request.method, org.slug if org else "", str(response.status_code))
+
+    def _record(self, request, response, recorder, start):
+        elapsed = time.perf_counter() - start
+        labels = self._labels(request, response)
+        metrics.REQUEST_DURATION.observe(labels, elapsed)
+        metrics.REQUEST_DB_QUERIES.observe(labels, recorder.count)
+        metrics.REQUEST_DB_DURATION.observe(labels, recorder.duration)
+        metrics.REQUEST_SERIALIZATION_DURATION.observe(labels, getattr(request, "_serialization_seconds", 0.0))
+
+        if self.query_budget and recorder.count > self.query_budget:
+            logger.warning(
+                "%s %s (%s) ran %d queries, budget %d, %.1fms in DB:\n%s",
+                request.method, request.path, labels[0], recorder.count, self.query_budget,
+                recorder.duration * 1000,
+                "\n".join(f"[{alias}] {duration * 1000:.2f}ms {sql}" for alias, duration, sql in recorder.statements),
+            )
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in production profiling (core.profiling): a PROFILE_SAMPLE_RATE
+    fraction of requests runs under cProfile, and any request still running
+    after PROFILE_SLOW_THRESHOLD_MS is stack-sampled. Profiles are tagged
+    with view, organization and timing. Removed from the stack unless one
+    is configured; when enabled it is sync-only (both profilers work per
+    thread), so ASGI requests run in a thread while profiling is on.
+    """
+    def __init__(self, get_response):
+        if not (profiling.PROFILE_SAMPLE_RATE or profiling.PROFILE_SLOW_THRESHOLD_MS):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        sampler = profiling.get_slow_request_sampler()
+        thread_id = threading.get_ident()
+        start = time.perf_counter()
+        if sampler is not None:
+            sampler.track(thread_id, start)
+        profiler = profiling.start_cprofile()
+        response = None
+        try:
+            response = self.get_response(request)
+            return response
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            samples = sampler.untrack(thread_id) if sampler is not None else None
+            if profiler is not None or samples:
+                # Never let a profile fail the request it describes
+                try:
+                    meta = self._meta(request, response, time.perf_counter() - start)
+                    if profiler is not None:
+                        profiling.save_profile("cprofile", meta, profiler=profiler)
+                    if samples:
+                        profiling.save_profile("stack", meta, samples=samples)
+                except Exception:
+                    logger.exception("Could not store request profile")
+
+    @staticmethod
+    def _meta(request, response, elapsed):
+        match = getattr(request, "resolver_match", None)
+        org = getattr(request, "organization", None)
+        return {
+            "view": match.view_name if match else None,
+            "method": request.method,
+            "path": request.path,
+            "organization": org.slug if org else None,
+            "status": response.status_code if response is not None else None,
+            "duration_ms": round(elapsed * 1000, 3),
+        }
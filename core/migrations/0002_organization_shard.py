@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='shard',
+            field=models.CharField(default='default', max_length=64),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_organization_shard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('deleting', 'Deleting')], default='active', max_length=20),
+        ),
+    ]
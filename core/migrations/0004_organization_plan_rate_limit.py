@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_organization_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='organization',
+            name='plan',
+            field=models.CharField(choices=[('free', 'Free'), ('pro', 'Pro'), ('enterprise', 'Enterprise')], default='free', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='organization',
+            name='rate_limit',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+    ]
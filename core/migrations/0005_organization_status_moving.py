@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_organization_plan_rate_limit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organization',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('deleting', 'Deleting'), ('moving', 'Moving')], default='active', max_length=20),
+        ),
+    ]
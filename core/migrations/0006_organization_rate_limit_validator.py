@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:40
+
+import core.throttling
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_organization_status_moving'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='organization',
+            name='rate_limit',
+            field=models.CharField(blank=True, default='', max_length=20, validators=[core.throttling.validate_rate]),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_organization_rate_limit_validator'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletionProgress',
+            fields=[
+                ('organization_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('state', models.CharField(max_length=20)),
+                ('requested_by', models.BigIntegerField(blank=True, null=True)),
+                ('deleted', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
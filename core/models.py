@@ -1,18 +1,131 @@
+import uuid
+
+from django.apps import apps
 from django.db import models
 from django.conf import settings
+from .context import UNSET, get_current_organization
+from .throttling import validate_rate
 
 class Organization(models.Model):
+    STATUS_CHOICES = (
+        ("active", "Active"),
+        ("deleting", "Deleting"),  # hidden from tenancy while core.deletion purges it
+        ("moving", "Moving"),  # read-only while move_tenant_shard copies it
+    )
+    PLAN_CHOICES = (
+        ("free", "Free"),
+        ("pro", "Pro"),
+        ("enterprise", "Enterprise"),
+    )
     name = models.CharField(max_length=150, unique=True)
     slug = models.SlugField(unique=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Database alias holding this tenant's BaseTenantModel rows (core.routers)
+    shard = models.CharField(max_length=64, default="default")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="active")
+    # Request rates come from settings.TENANT_PLAN_RATES[plan] (core.throttling);
+    # rate_limit, e.g. "3000/min", overrides the plan's default rate
+    plan = models.CharField(max_length=20, choices=PLAN_CHOICES, default="free")
+    rate_limit = models.CharField(max_length=20, blank=True, default="", validators=[validate_rate])
 
     def __str__(self):
         return self.name
 
+class DeletionProgress(models.Model):
+    """Progress of a core.deletion purge, readable by every process; outlives the organization."""
+    organization_id = models.BigIntegerField(primary_key=True)  # no FK: the organization goes first
+    state = models.CharField(max_length=20)
+    requested_by = models.BigIntegerField(null=True, blank=True)
+    deleted = models.JSONField(default=dict)  # model label -> rows deleted so far
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def as_dict(self):
+        return {
+            "state": self.state,
+            "requested_by": self.requested_by,
+            "deleted": self.deleted,
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+class TenantExport(models.Model):
+    """A background data export (core.export), fetchable by id once written."""
+    STATE_CHOICES = (
+        ("queued", "Queued"),
+        ("running", "Running"),
+        ("done", "Done"),
+        ("failed", "Failed"),
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="exports")
+    format = models.CharField(max_length=10)
+    state = models.CharField(max_length=20, choices=STATE_CHOICES, default="queued")
+    requested_by = models.BigIntegerField(null=True, blank=True)
+    path = models.CharField(max_length=500, blank=True, default="")
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def as_dict(self):
+        return {
+            "id": str(self.id),
+            "format": self.format,
+            "state": self.state,
+            "created_at": self.created_at.isoformat(),
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+class TenantQuerySet(models.QuerySet):
+    def for_organization(self, org):
+        return self.filter(organization=org)
+
+class TenantManager(models.Manager.from_queryset(TenantQuerySet)):
+    """
+    Scopes every query to the organization TenantMiddleware made active.
+    Requests without a resolved organization see nothing; code running
+    outside a request (commands, workers) is unscoped.
+    """
+    def get_queryset(self):
+        qs = super().get_queryset()
+        org = get_current_organization()
+        if org is UNSET:
+            return qs
+        if org is None:
+            return qs.none()
+        return qs.filter(organization=org)
+
 class BaseTenantModel(models.Model):
-    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, related_name="%(class)s_items")
+    # No DB constraint: tenant rows may live on a shard without the organizations table
+    organization = models.ForeignKey(
+        Organization, on_delete=models.CASCADE, related_name="%(class)s_items", db_constraint=False
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TenantManager()
+    all_objects = models.Manager()  # explicit cross-tenant access
+
     class Meta:
-        abstract = True
\ No newline at end of file
+        abstract = True
+        # Subclasses declaring their own Meta must inherit this one to keep these
+        indexes = [
+            models.Index(fields=["organization", "created_at", "id"], name="%(class)s_org_created_idx"),
+            models.Index(fields=["organization", "updated_at", "id"], name="%(class)s_org_updated_idx"),
+        ]
+
+
+def tenant_models():
+    """Concrete BaseTenantModel subclasses, parents before the models referencing them."""
+    pending = [m for m in apps.get_models() if issubclass(m, BaseTenantModel)]
+    ordered = []
+    while pending:
+        for model in pending:
+            deps = {
+                f.related_model for f in model._meta.concrete_fields
+                if f.is_relation and f.related_model in pending and f.related_model is not model
+            }
+            if not deps:
+                ordered.append(model)
+                pending.remove(model)
+                break
+        else:
+            raise ValueError("Circular references between tenant models")
+    return ordered
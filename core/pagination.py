@@ -0,0 +1,78 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def get_page_size(request, default=DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE):
+    try:
+        size = int(request.query_params.get("limit", default))
+    except (TypeError, ValueError):
+        return default
+    return max(1, min(size, maximum))
+
+
+def encode_cursor(values):
+    raw = json.dumps([v.isoformat() if hasattr(v, "isoformat") else v for v in values])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor, model, ordering):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if len(values) != len(ordering):
+            raise InvalidCursor(cursor)
+        return [
+            model._meta.get_field(name).to_python(value)
+            for name, value in zip(ordering, values)
+        ]
+    except (ValueError, TypeError, LookupError, ValidationError) as exc:
+        raise InvalidCursor(cursor) from exc
+
+
+def _seek(queryset, ordering, cursor):
+    first, second = ordering
+    if cursor:
+        a, b = decode_cursor(cursor, queryset.model, ordering)
+        queryset = queryset.filter(Q(**{f"{first}__gt": a}) | Q(**{first: a, f"{second}__gt": b}))
+    return queryset.order_by(first, second)
+
+
+def _page(rows, ordering, limit):
+    if len(rows) <= limit:
+        return rows, None
+
+    first, second = ordering
+    rows = rows[:limit]
+    last = rows[-1]
+    if isinstance(last, dict):
+        values = [last[first], last[second]]
+    else:
+        values = [getattr(last, first), getattr(last, second)]
+    return rows, encode_cursor(values)
+
+
+def keyset_paginate(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """
+    Keyset (seek) pagination over a two-column ascending `ordering`, e.g.
+    ("joined_at", "id"). Each page is a range scan after the last row of the
+    previous one instead of an OFFSET, so deep pages cost the same as the
+    first. Works on model and .values() querysets; returns (rows, next_cursor).
+    """
+    rows = list(_seek(queryset, ordering, cursor)[:limit + 1])
+    return _page(rows, ordering, limit)
+
+
+async def akeyset_paginate(queryset, ordering, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """keyset_paginate() for async code."""
+    rows = [row async for row in _seek(queryset, ordering, cursor)[:limit + 1]]
+    return _page(rows, ordering, limit)
@@ -1,4 +1,5 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS
+from .tenancy import get_membership_role
 
 class IsInOrganization(BasePermission):
     def has_permission(self, request, view):
@@ -10,8 +11,15 @@ class HasRole(BasePermission):
     def has_permission(self, request, view):
         if not (request.user and request.user.is_authenticated and request.organization):
             return False
-        roles = set(r.role for r in request.user.memberships.filter(organization=request.organization))
-        return bool(self.required_roles and roles.intersection(self.required_roles))
+        role = get_membership_role(request.user, request.organization, request)
+        return bool(self.required_roles and role in self.required_roles)
+
+class IsMember(HasRole):
+    """Any role in the request's organization."""
+    def has_permission(self, request, view):
+        if not (request.user and request.user.is_authenticated and request.organization):
+            return False
+        return bool(get_membership_role(request.user, request.organization, request))
 
 class IsAdmin(HasRole):
     required_roles = {"admin"}
@@ -0,0 +1,175 @@
+import cProfile
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+# Fraction of requests to run under cProfile (0 = off)
+PROFILE_SAMPLE_RATE = getattr(settings, "PROFILE_SAMPLE_RATE", 0.0)
+# Requests still running after this many ms get stack-sampled (0 = off)
+PROFILE_SLOW_THRESHOLD_MS = getattr(settings, "PROFILE_SLOW_THRESHOLD_MS", 0)
+PROFILE_STACK_INTERVAL = getattr(settings, "PROFILE_STACK_INTERVAL", 0.01)
+PROFILE_MAX_FILES = getattr(settings, "PROFILE_MAX_FILES", 200)
+PROFILE_MAX_AGE = getattr(settings, "PROFILE_MAX_AGE", 7 * 24 * 3600)
+
+PROFILE_ID_RE = re.compile(r"^[0-9]{14}-[0-9a-f]{8}$")
+PROFILE_SUFFIXES = {"cprofile": ".prof", "stack": ".folded"}
+
+
+def profile_dir():
+    return Path(getattr(settings, "PROFILE_DIR", settings.BASE_DIR / "profiles"))
+
+
+def _collapse(frame):
+    # Root-first "file:function" frames, the folded format flame graph tools read
+    stack = []
+    while frame is not None:
+        stack.append(f"{frame.f_code.co_filename}:{frame.f_code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SlowRequestSampler(threading.Thread):
+    """
+    Watchdog thread: once a tracked request has run for `threshold` seconds,
+    samples its thread's stack every `interval` seconds until it finishes.
+    Tracking a request is a dict insert, so fast requests cost nothing more.
+    """
+
+    def __init__(self, threshold, interval):
+        super().__init__(name="tenantx-slow-request-sampler", daemon=True)
+        self.threshold = threshold
+        self.interval = interval
+        self._active = {}  # thread id -> (started, Counter of collapsed stacks)
+        self._lock = threading.Lock()
+
+    def track(self, thread_id, started):
+        with self._lock:
+            self._active[thread_id] = (started, Counter())
+
+    def untrack(self, thread_id):
+        """The request's samples, copied: the sampler may still be holding the Counter."""
+        with self._lock:
+            _, samples = self._active.pop(thread_id, (None, None))
+            return Counter(samples) if samples is not None else None
+
+    def run(self):
+        while True:
+            now = time.perf_counter()
+            with self._lock:
+                slow = [(tid, samples) for tid, (started, samples) in self._active.items()
+                        if now - started >= self.threshold]
+                # Sleep until the next tracked request could turn slow
+                starts = [started for started, _ in self._active.values() if now - started < self.threshold]
+            if slow:
+                frames = sys._current_frames()
+                stacks = [(thread_id, samples, _collapse(frames[thread_id]))
+                          for thread_id, samples in slow if thread_id in frames]
+                with self._lock:
+                    for thread_id, samples, stack in stacks:
+                        # Skip requests that finished while their stack was collapsed
+                        if self._active.get(thread_id, (None, None))[1] is samples:
+                            samples[stack] += 1
+                delay = self.interval
+            elif starts:
+                delay = max(min(starts) + self.threshold - now, self.interval)
+            else:
+                delay = self.threshold
+            time.sleep(delay)
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_slow_request_sampler():
+    """The process's sampler thread, started on first use (and again after a fork)."""
+    global _sampler
+    if not PROFILE_SLOW_THRESHOLD_MS:
+        return None
+    if _sampler is None or not _sampler.is_alive():
+        with _sampler_lock:
+            if _sampler is None or not _sampler.is_alive():
+                _sampler = SlowRequestSampler(PROFILE_SLOW_THRESHOLD_MS / 1000, PROFILE_STACK_INTERVAL)
+                _sampler.start()
+    return _sampler
+
+
+def start_cprofile():
+    """A running cProfile.Profile for a sampled request, or None."""
+    if not PROFILE_SAMPLE_RATE or random.random() >= PROFILE_SAMPLE_RATE:
+        return None
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:  # another profiler is already active
+        return None
+    return profiler
+
+
+def save_profile(kind, meta, profiler=None, samples=None):
+    """Write a cProfile dump or folded stack samples plus a JSON sidecar; returns the id."""
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    profile_id = f"{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+    path = directory / f"{profile_id}{PROFILE_SUFFIXES[kind]}"
+    if kind == "cprofile":
+        profiler.dump_stats(path)
+    else:
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()))
+    meta = {**meta, "id": profile_id, "kind": kind, "created_at": timezone.now().isoformat()}
+    (directory / f"{profile_id}.json").write_text(json.dumps(meta))
+    prune_profiles()
+    return profile_id
+
+
+def list_profiles():
+    """Metadata of stored profiles, newest first."""
+    directory = profile_dir()
+    if not directory.is_dir():
+        return []
+    profiles = []
+    for meta_path in sorted(directory.glob("*.json"), reverse=True):
+        try:
+            profiles.append(json.loads(meta_path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return profiles
+
+
+def profile_path(profile_id):
+    """Path of a stored profile's data file, or None."""
+    if not PROFILE_ID_RE.match(profile_id):
+        return None
+    for suffix in PROFILE_SUFFIXES.values():
+        path = profile_dir() / f"{profile_id}{suffix}"
+        if path.is_file():
+            return path
+    return None
+
+
+def prune_profiles():
+    """Keep at most PROFILE_MAX_FILES profiles, none older than PROFILE_MAX_AGE."""
+    directory = profile_dir()
+    metas = sorted(directory.glob("*.json"), reverse=True)
+    cutoff = time.time() - PROFILE_MAX_AGE
+    for index, meta_path in enumerate(metas):
+        try:
+            expired = index >= PROFILE_MAX_FILES or meta_path.stat().st_mtime < cutoff
+        except OSError:
+            continue
+        if expired:
+            for path in directory.glob(f"{meta_path.stem}.*"):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
@@ -0,0 +1,80 @@
+import json
+import time
+
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils import encoders
+
+from .metrics import add_serialization_time
+
+try:
+    import orjson
+except ImportError:  # optional; falls back to the stdlib encoder
+    orjson = None
+
+_drf_default = encoders.JSONEncoder().default
+
+if orjson is not None:
+    # Dates go through DRF's encoder so output matches JSONRenderer's
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data):
+    """Compact JSON bytes, as DRF's JSONRenderer would produce them."""
+    if orjson is not None:
+        try:
+            ret = orjson.dumps(data, default=_drf_default, option=_ORJSON_OPTIONS)
+        except TypeError:  # e.g. integers beyond 64 bits
+            pass
+        else:
+            # Keep the output a strict JavaScript subset, like JSONRenderer
+            if b"\xe2\x80\xa8" in ret or b"\xe2\x80\xa9" in ret:
+                ret = ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+            return ret
+    ret = json.dumps(
+        data, cls=encoders.JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":")
+    )
+    return ret.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer using orjson when installed; indented output uses DRF's path."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        start = time.perf_counter()
+        try:
+            if self.get_indent(accepted_media_type, renderer_context) is not None:
+                return super().render(data, accepted_media_type, renderer_context)
+            return dumps(data)
+        finally:
+            add_serialization_time(renderer_context.get("request"), time.perf_counter() - start)
+
+
+class StreamingJSONListResponse(StreamingHttpResponse):
+    """
+    Streams a JSON array from an iterator of rows, encoding `chunk_size`
+    rows at a time, so memory stays flat however many rows there are.
+    `serialize_rows` turns a list of rows into JSON-ready items.
+    """
+
+    def __init__(self, rows, serialize_rows=list, chunk_size=1000, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(self._encode(rows, serialize_rows, chunk_size), **kwargs)
+
+    @staticmethod
+    def _encode(rows, serialize_rows, chunk_size):
+        yield b"["
+        first = True
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_size:
+                yield (b"" if first else b",") + dumps(serialize_rows(chunk))[1:-1]
+                first = False
+                chunk = []
+        if chunk:
+            yield (b"" if first else b",") + dumps(serialize_rows(chunk))[1:-1]
+        yield b"]"
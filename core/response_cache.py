@@ -0,0 +1,150 @@
+import asyncio
+import functools
+import hashlib
+import time
+import uuid
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from .tenancy import aget_membership_role, get_membership_role
+from .versioning import aget_versions, get_versions
+
+
+def _cache():
+    return caches[getattr(settings, "RESPONSE_CACHE_ALIAS", "default")]
+
+
+def _cache_key(request, keys, role):
+    org = getattr(request, "organization", None)
+    raw = repr((keys, org and org.pk, role, request.get_full_path()))
+    return "tenantx:response:" + hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _release(cache, lock_key, token):
+    # Only our own lock: it may have expired and been taken by another request
+    if cache.get(lock_key) == token:
+        cache.delete(lock_key)
+
+
+async def _arelease(cache, lock_key, token):
+    if await cache.aget(lock_key) == token:
+        await cache.adelete(lock_key)
+
+
+def cached_response(version_keys):
+    """
+    Cache an APIView GET handler's response data per organization, role and
+    query string. `version_keys(request)` (as for conditional_get) returns the
+    (resource, scope) pairs the data depends on, or None to skip. Entries
+    record those versions and only count as fresh while they still match,
+    so a bump is a generational eviction without scanning keys.
+
+    Fresh entries are served for RESPONSE_CACHE_TTL seconds. After that, or
+    once a write bumped a version, a single request recomputes (single-flight)
+    while others get the stale entry, for up to RESPONSE_CACHE_STALE_TTL
+    seconds more; on a cold miss they wait briefly rather than stampede.
+
+    Async handlers (core.async_views.AsyncAPIView) get the same behaviour
+    through the cache's async API.
+    """
+    def decorator(method):
+        if iscoroutinefunction(method):
+            return _async_cached(method, version_keys)
+
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            keys = version_keys(request)
+            if not keys:
+                return method(self, request, *args, **kwargs)
+
+            cache = _cache()
+            ttl = settings.RESPONSE_CACHE_TTL
+            stale_ttl = settings.RESPONSE_CACHE_STALE_TTL
+            org = getattr(request, "organization", None)
+            role = get_membership_role(request.user, org, request)
+            versions = get_versions(keys)
+            # Keyed without the versions, so the entry outlives a bump as the stale copy
+            key = _cache_key(request, keys, role)
+            lock_key = key + ":lock"
+            token = uuid.uuid4().hex
+            locked = False
+
+            entry = cache.get(key)
+            if entry is None:
+                # Cold miss: let one request compute, briefly wait on it
+                deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+                while not (locked := cache.add(lock_key, token, settings.RESPONSE_CACHE_LOCK_TIMEOUT)):
+                    if time.monotonic() >= deadline:
+                        break  # compute without the lock
+                    time.sleep(0.05)
+                    entry = cache.get(key)
+                    if entry is not None:
+                        return Response(entry["data"])
+            elif entry["versions"] == versions and time.time() < entry["fresh_until"]:
+                return Response(entry["data"])
+            elif not (locked := cache.add(lock_key, token, settings.RESPONSE_CACHE_LOCK_TIMEOUT)):
+                # Someone else is revalidating; serve stale meanwhile
+                return Response(entry["data"])
+
+            try:
+                response = method(self, request, *args, **kwargs)
+                # Streamed responses have no .data to keep
+                if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                    entry = {"data": response.data, "versions": versions, "fresh_until": time.time() + ttl}
+                    cache.set(key, entry, ttl + stale_ttl)
+                return response
+            finally:
+                if locked:
+                    _release(cache, lock_key, token)
+        return wrapper
+    return decorator
+
+
+def _async_cached(method, version_keys):
+    @functools.wraps(method)
+    async def wrapper(self, request, *args, **kwargs):
+        keys = version_keys(request)
+        if not keys:
+            return await method(self, request, *args, **kwargs)
+
+        cache = _cache()
+        ttl = settings.RESPONSE_CACHE_TTL
+        stale_ttl = settings.RESPONSE_CACHE_STALE_TTL
+        org = getattr(request, "organization", None)
+        role = await aget_membership_role(request.user, org, request)
+        versions = await aget_versions(keys)
+        key = _cache_key(request, keys, role)
+        lock_key = key + ":lock"
+        token = uuid.uuid4().hex
+        locked = False
+
+        entry = await cache.aget(key)
+        if entry is None:
+            deadline = time.monotonic() + settings.RESPONSE_CACHE_LOCK_WAIT
+            while not (locked := await cache.aadd(lock_key, token, settings.RESPONSE_CACHE_LOCK_TIMEOUT)):
+                if time.monotonic() >= deadline:
+                    break
+                await asyncio.sleep(0.05)
+                entry = await cache.aget(key)
+                if entry is not None:
+                    return Response(entry["data"])
+        elif entry["versions"] == versions and time.time() < entry["fresh_until"]:
+            return Response(entry["data"])
+        elif not (locked := await cache.aadd(lock_key, token, settings.RESPONSE_CACHE_LOCK_TIMEOUT)):
+            return Response(entry["data"])
+
+        try:
+            response = await method(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                entry = {"data": response.data, "versions": versions, "fresh_until": time.time() + ttl}
+                await cache.aset(key, entry, ttl + stale_ttl)
+            return response
+        finally:
+            if locked:
+                await _arelease(cache, lock_key, token)
+    return wrapper
@@ -0,0 +1,127 @@
+import random
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .context import UNSET, get_current_organization
+from .models import BaseTenantModel, Organization
+
+# Per-request routing state, set by ReplicaRoutingMiddleware. Outside a
+# request (commands, workers) everything goes to the primary.
+_routing_state = ContextVar("db_routing_state", default=None)
+
+
+def begin_routing(use_replicas):
+    return _routing_state.set({"use_replicas": use_replicas, "wrote": False})
+
+
+def end_routing(token):
+    state = _routing_state.get()
+    _routing_state.reset(token)
+    return state
+
+
+def replica_aliases():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+def shard_aliases():
+    return getattr(settings, "DATABASE_SHARDS", [DEFAULT_DB_ALIAS])
+
+
+def is_tenant_model(model):
+    return issubclass(model, BaseTenantModel)
+
+
+class TenantShardRouter:
+    """
+    Sends BaseTenantModel queries to the shard of their organization:
+    the instance's organization when the query has one, otherwise the
+    organization TenantMiddleware made active. Tenants on "default" and
+    global models fall through to the next router.
+    """
+
+    def _shard_for(self, model, hints):
+        if not is_tenant_model(model):
+            return None
+        instance = hints.get("instance")
+        if isinstance(instance, Organization):
+            org = instance
+        elif instance is not None and getattr(instance, "organization_id", None):
+            from .tenancy import get_org_by_id
+            org = get_org_by_id(instance.organization_id)
+        else:
+            org = get_current_organization()
+            if org is UNSET:
+                org = None
+        if org is None or org.shard == DEFAULT_DB_ALIAS or org.shard not in shard_aliases():
+            return None
+        return org.shard
+
+    def db_for_read(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenant rows point at organizations/users on the control database
+        dbs = set(shard_aliases())
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == DEFAULT_DB_ALIAS or db not in shard_aliases():
+            return None
+        model = hints.get("model")
+        if model is None and model_name:
+            try:
+                model = apps.get_model(app_label, model_name)
+            except LookupError:
+                return False
+        # Historical models lose their abstract bases, so check the live model
+        if model is not None:
+            try:
+                model = apps.get_model(model._meta.app_label, model._meta.model_name)
+            except LookupError:
+                return False
+            return is_tenant_model(model)
+        return False
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends reads to a random replica and writes to the primary. Reads only
+    use replicas during safe-method requests that aren't pinned to the
+    primary, and never once the request has written or inside a transaction.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _routing_state.get()
+        replicas = replica_aliases()
+        if not (replicas and state and state["use_replicas"]) or state["wrote"]:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _routing_state.get()
+        if state is not None:
+            state["wrote"] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        dbs = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in dbs and obj2._state.db in dbs:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary
+        if db in replica_aliases():
+            return False
+        return None
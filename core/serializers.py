@@ -0,0 +1,106 @@
+import functools
+
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+class FastReadSerializer:
+    """
+    Read-only fast path for a ModelSerializer's list output. Field
+    introspection happens once; rows come from .values() so no model
+    instances or per-object serializers are built, and values go through
+    the original fields' to_representation (with ISO datetimes inlined),
+    so the output matches the serializer's.
+
+        fast = FastReadSerializer.for_serializer(ProjectSerializer)
+        data = fast.serialize(Project.objects.filter(organization=org))
+
+    Supports plain model fields, primary-key relations and nested
+    ModelSerializers; `prefix` reads the fields through a relation
+    (e.g. "organization__").
+    """
+
+    def __init__(self, serializer_class, fields=None, prefix=""):
+        self.serializer_class = serializer_class
+        self._fields = []  # (output key, values() lookup, field or nested FastReadSerializer)
+        for name, field in serializer_class().fields.items():
+            if field.write_only or (fields is not None and name not in fields):
+                continue
+            if field.source == "*" or "." in field.source:
+                raise ValueError(f"{serializer_class.__name__}.{name}: unsupported source {field.source!r}")
+            lookup = prefix + field.source
+            if isinstance(field, serializers.BaseSerializer):
+                field = FastReadSerializer(type(field), prefix=lookup + "__")
+            self._fields.append((name, lookup, field))
+
+    @classmethod
+    @functools.lru_cache(maxsize=None)
+    def for_serializer(cls, serializer_class, fields=None, prefix=""):
+        """Shared instance per (serializer, fields tuple, prefix)."""
+        return cls(serializer_class, fields=fields, prefix=prefix)
+
+    @property
+    def columns(self):
+        """Lookups to pass to .values()."""
+        columns = []
+        for _, lookup, field in self._fields:
+            if isinstance(field, FastReadSerializer):
+                columns.extend(field.columns)
+            else:
+                columns.append(lookup)
+        return columns
+
+    def _plan(self):
+        # Per-call conversion plan; resolves the active timezone once
+        plan = []
+        for name, lookup, field in self._fields:
+            if isinstance(field, FastReadSerializer):
+                plan.append((name, None, field._plan()))
+            elif isinstance(field, serializers.PrimaryKeyRelatedField):
+                plan.append((name, lookup, None))  # .values() already yields the pk
+            elif isinstance(field, serializers.DateTimeField):
+                plan.append((name, lookup, _datetime_converter(field)))
+            else:
+                plan.append((name, lookup, field.to_representation))
+        return plan
+
+    @staticmethod
+    def _convert(plan, row):
+        data = {}
+        for name, lookup, convert in plan:
+            if lookup is None:
+                nested = FastReadSerializer._convert(convert, row)
+                # A null relation reads as all-None columns
+                data[name] = None if all(v is None for v in nested.values()) else nested
+                continue
+            value = row[lookup]
+            data[name] = value if value is None or convert is None else convert(value)
+        return data
+
+    def to_representation(self, row):
+        return self._convert(self._plan(), row)
+
+    def serialize_rows(self, rows):
+        plan = self._plan()
+        return [self._convert(plan, row) for row in rows]
+
+    def serialize(self, queryset):
+        return self.serialize_rows(queryset.values(*self.columns))
+
+
+def _datetime_converter(field):
+    """DateTimeField.to_representation with the timezone lookup hoisted out."""
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or not timezone.is_aware(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+    return convert
@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Organization
+from .tenancy import invalidate_org
+from .versioning import bump_versions
+
+
+@receiver(pre_save, sender=Organization)
+def remember_previous_slug(sender, instance, **kwargs):
+    # Renames must also evict the old slug from the tenant cache
+    instance._previous_slug = None
+    if instance.pk:
+        instance._previous_slug = (
+            Organization.objects.filter(pk=instance.pk).values_list("slug", flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Organization)
+@receiver(post_delete, sender=Organization)
+def invalidate_tenant_cache(sender, instance, using, **kwargs):
+    invalidate_org(instance, getattr(instance, "_previous_slug", None))
+    # Membership listings embed organization details
+    bump_versions(("organizations", "all"), using=using)
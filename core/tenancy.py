@@ -1,29 +1,365 @@
+import time
 from urllib.parse import urlparse
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
 from accounts.models import Membership
+from core.cache import LRUCache
 from core.models import Organization
+from core.tokens import ORG_ID_CLAIM, get_claimed_role, get_token_claims
 
 ORG_HEADER = "X-Org"  # fallback if you aren't using subdomains
 
-def get_org_from_request(request):
+# Paths that never need a tenant (static assets, API docs, metrics)
+TENANT_EXEMPT_PATHS = getattr(settings, "TENANT_EXEMPT_PATHS", ("/static/", "/swagger", "/redoc/", "/metrics"))
+
+# slug -> Organization (or False for unknown slugs), per process. Saves
+# and deletes evict entries in the process that made them (invalidate_org)
+# and bump a generation in a shared cache; other processes drop their whole
+# LRU when they see it change, checking at most every
+# TENANT_CACHE_CHECK_INTERVAL seconds. Entries otherwise expire after
+# TENANT_CACHE_TTL (TENANT_CACHE_NEGATIVE_TTL for unknown slugs).
+TENANT_CACHE_TTL = getattr(settings, "TENANT_CACHE_TTL", 300)
+TENANT_CACHE_NEGATIVE_TTL = getattr(settings, "TENANT_CACHE_NEGATIVE_TTL", 30)
+TENANT_CACHE_CHECK_INTERVAL = getattr(settings, "TENANT_CACHE_CHECK_INTERVAL", 1)
+_org_cache = LRUCache(
+    maxsize=getattr(settings, "TENANT_CACHE_MAXSIZE", 1024),
+    ttl=TENANT_CACHE_TTL,
+)
+
+_NOT_FOUND = False
+
+# Organizations tenancy resolves. Moving ones stay readable from their
+# current shard; TenantMiddleware refuses writes to them
+RESOLVABLE_STATUSES = ("active", "moving")
+
+_GENERATION_KEY = "tenantx:org:generation"
+_generation = {"value": None, "checked": float("-inf")}
+
+
+def _generation_cache():
+    return caches[getattr(settings, "TENANT_CACHE_GENERATION_ALIAS", "default")]
+
+
+def _sync_generation(value):
+    if value != _generation["value"]:
+        if _generation["value"] is not None:
+            _org_cache.clear()
+        _generation["value"] = value
+
+
+def _check_generation():
+    """Drop this process's LRU if another process invalidated an organization."""
+    now = time.monotonic()
+    if now - _generation["checked"] >= TENANT_CACHE_CHECK_INTERVAL:
+        _generation["checked"] = now
+        _sync_generation(_generation_cache().get(_GENERATION_KEY, 0))
+
+
+async def _acheck_generation():
+    now = time.monotonic()
+    if now - _generation["checked"] >= TENANT_CACHE_CHECK_INTERVAL:
+        _generation["checked"] = now
+        _sync_generation(await _generation_cache().aget(_GENERATION_KEY, 0))
+
+
+def _shared_cache():
+    # Optional cross-process layer, e.g. TENANT_CACHE_ALIAS = "default"
+    alias = getattr(settings, "TENANT_CACHE_ALIAS", None)
+    return caches[alias] if alias else None
+
+
+def _shared_key(slug):
+    return f"tenantx:org:slug:{slug}"
+
+
+def _cache_org(slug, org):
+    ttl = TENANT_CACHE_TTL if org else TENANT_CACHE_NEGATIVE_TTL
+    value = org or _NOT_FOUND
+    _org_cache.set(slug, value, ttl=ttl)
+    return value, ttl
+
+
+def get_org_by_slug(slug):
+    """
+    Resolve an organization by slug through the local LRU, then the shared
+    cache, then the database. Unknown slugs are cached too (for a shorter
+    time) so bogus subdomains don't hit the database on every request.
+    """
+    _check_generation()
+    org = _org_cache.get(slug)
+    if org is not None:
+        return org or None
+
+    shared = _shared_cache()
+    if shared is not None:
+        org = shared.get(_shared_key(slug))
+        if org is not None:
+            _cache_org(slug, org)
+            return org or None
+
+    org = Organization.objects.filter(slug=slug, status__in=RESOLVABLE_STATUSES).first()
+    value, ttl = _cache_org(slug, org)
+    if shared is not None:
+        shared.set(_shared_key(slug), value, ttl)
+    return org
+
+
+async def aget_org_by_slug(slug):
+    """get_org_by_slug() for async code; local cache hits never leave the event loop."""
+    await _acheck_generation()
+    org = _org_cache.get(slug)
+    if org is not None:
+        return org or None
+
+    shared = _shared_cache()
+    if shared is not None:
+        org = await shared.aget(_shared_key(slug))
+        if org is not None:
+            _cache_org(slug, org)
+            return org or None
+
+    org = await Organization.objects.filter(slug=slug, status__in=RESOLVABLE_STATUSES).afirst()
+    value, ttl = _cache_org(slug, org)
+    if shared is not None:
+        await shared.aset(_shared_key(slug), value, ttl)
+    return org
+
+
+def get_org_by_id(org_id):
+    """Cached Organization by primary key (used by the shard router and token claims)."""
+    _check_generation()
+    key = f"#{org_id}"
+    org = _org_cache.get(key)
+    if org is None:
+        org = Organization.objects.filter(pk=org_id).first()
+        if org is None:
+            return None
+        _org_cache.set(key, org)
+    return org
+
+
+async def aget_org_by_id(org_id):
+    """get_org_by_id() for async code."""
+    await _acheck_generation()
+    key = f"#{org_id}"
+    org = _org_cache.get(key)
+    if org is None:
+        org = await Organization.objects.filter(pk=org_id).afirst()
+        if org is None:
+            return None
+        _org_cache.set(key, org)
+    return org
+
+
+def invalidate_org(org, *slugs):
+    """
+    Forget cached lookups for `org` (plus any former slugs) in this process
+    and the shared cache, and bump the generation so other processes drop
+    their LRUs too.
+    """
+    _org_cache.delete_where(lambda value: value and value.pk == org.pk)
+    keys = {org.slug, *slugs} - {None}
+    for slug in keys:
+        _org_cache.delete(slug)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete_many([_shared_key(slug) for slug in keys])
+    generation = time.time_ns()
+    _generation_cache().set(_GENERATION_KEY, generation, None)
+    _generation["value"] = generation
+
+
+def clear_tenant_cache():
+    _org_cache.clear()
+    _generation.update(value=None, checked=float("-inf"))
+
+
+# (user, org) -> role, shared across processes for a short while and
+# invalidated by bumping a per-user version whenever a membership changes
+MEMBERSHIP_CACHE_TTL = getattr(settings, "MEMBERSHIP_CACHE_TTL", 60)
+# Local memory is per process, so other processes never see the version
+# bumps: there a role change only shows once the entry expires
+MEMBERSHIP_LOCAL_CACHE_TTL = getattr(settings, "MEMBERSHIP_LOCAL_CACHE_TTL", 2)
+
+
+def _membership_cache():
+    return caches[getattr(settings, "MEMBERSHIP_CACHE_ALIAS", "default")]
+
+
+def _membership_ttl(cache):
+    if isinstance(cache, LocMemCache):
+        return min(MEMBERSHIP_CACHE_TTL, MEMBERSHIP_LOCAL_CACHE_TTL)
+    return MEMBERSHIP_CACHE_TTL
+
+
+def _membership_version_key(user_id):
+    return f"tenantx:membership:version:{user_id}"
+
+
+def bump_membership_versions(*user_ids, using=None):
+    """Invalidate the users' cached roles once the transaction on `using` commits."""
+    def bump():
+        now = time.time_ns()
+        _membership_cache().set_many({_membership_version_key(user_id): now for user_id in user_ids}, None)
+    if user_ids:
+        transaction.on_commit(bump, using=using)
+
+
+_UNKNOWN = object()
+
+
+def _membership_key(user_id, org_id, version):
+    return f"tenantx:membership:{user_id}:{org_id}:v{version}"
+
+
+def _request_roles(request, user, org):
+    """The request's role memo, seeded from the token claims when they cover (user, org)."""
+    request = getattr(request, "_request", request)  # DRF Request -> HttpRequest
+    memo = request.__dict__.setdefault("_membership_roles", {})
+    if (user.pk, org.pk) not in memo:
+        # Tenant-scoped JWTs carry the role as a signed claim
+        role = get_claimed_role(request, user, org)
+        if role:
+            memo[(user.pk, org.pk)] = role
+    return memo
+
+
+def get_membership_role(user, org, request=None):
+    """
+    Return `user`'s role in `org`, or None if they aren't a member.
+    Memoized on `request` (when given) and in the shared cache, so repeated
+    permission checks for the same (user, org) cost at most one query.
+    """
+    if not (user and user.is_authenticated and org):
+        return None
+
+    memo = None
+    if request is not None:
+        memo = _request_roles(request, user, org)
+        role = memo.get((user.pk, org.pk), _UNKNOWN)
+        if role is not _UNKNOWN:
+            return role
+
+    cache = _membership_cache()
+    version = cache.get(_membership_version_key(user.pk), 1)
+    key = _membership_key(user.pk, org.pk, version)
+    role = cache.get(key)
+    if role is None:
+        role = (
+            Membership.objects.filter(user_id=user.pk, organization_id=org.pk)
+            .values_list("role", flat=True)
+            .first()
+        ) or ""
+        cache.set(key, role, _membership_ttl(cache))
+
+    role = role or None
+    if memo is not None:
+        memo[(user.pk, org.pk)] = role
+    return role
+
+
+async def aget_membership_role(user, org, request=None):
+    """get_membership_role() for async code."""
+    if not (user and user.is_authenticated and org):
+        return None
+
+    memo = None
+    if request is not None:
+        memo = _request_roles(request, user, org)
+        role = memo.get((user.pk, org.pk), _UNKNOWN)
+        if role is not _UNKNOWN:
+            return role
+
+    cache = _membership_cache()
+    version = await cache.aget(_membership_version_key(user.pk), 1)
+    key = _membership_key(user.pk, org.pk, version)
+    role = await cache.aget(key)
+    if role is None:
+        role = await (
+            Membership.objects.filter(user_id=user.pk, organization_id=org.pk)
+            .values_list("role", flat=True)
+            .afirst()
+        ) or ""
+        await cache.aset(key, role, _membership_ttl(cache))
+
+    role = role or None
+    if memo is not None:
+        memo[(user.pk, org.pk)] = role
+    return role
+
+
+def _candidate_slugs(request):
+    """Slugs the request names its organization by, in order of precedence."""
     # 1) Try subdomain: tenant.example.com
     host = request.get_host().split(':')[0]
     parts = host.split('.')
     if len(parts) >= 2:  # naive: <sub>.<domain>.<tld>
-        sub = parts[0]
-        try:
-            return Organization.objects.get(slug=sub)
-        except Organization.DoesNotExist:
-            pass
-    
+        yield parts[0]
+
     # 2) Fallback header
     slug = request.headers.get(ORG_HEADER)
     if slug:
-        try:
-            return Organization.objects.get(slug=slug)
-        except Organization.DoesNotExist:
-            pass
-    # 3) Fallback: if authenticated, use primary membership org
+        yield slug
+
+
+def _claimed_org_id(request):
+    """
+    The org id a tenant-scoped JWT was issued for. Claims name the org by
+    id, not slug, so tokens keep working across renames.
+    """
+    claims = get_token_claims(request)
+    return claims.get(ORG_ID_CLAIM) if claims else None
+
+
+def _resolvable(org):
+    return org if org is not None and org.status in RESOLVABLE_STATUSES else None
+
+
+def _primary_memberships(user):
+    return Membership.objects.filter(user=user, organization__status__in=RESOLVABLE_STATUSES).select_related('organization')
+
+
+def get_org_from_request(request):
+    if request.path.startswith(TENANT_EXEMPT_PATHS):
+        return None
+
+    for slug in _candidate_slugs(request):
+        org = get_org_by_slug(slug)
+        if org:
+            return org
+
+    # 3) Tenant-scoped JWT: the org is a signed claim of the access token.
+    # If it's gone or being deleted, resolve nothing rather than guess another
+    org_id = _claimed_org_id(request)
+    if org_id is not None:
+        return _resolvable(get_org_by_id(org_id))
+
+    # 4) Fallback: if authenticated, use primary membership org
     if request.user and request.user.is_authenticated:
-        m = Membership.objects.filter(user=request.user).select_related('organization').first()
+        m = _primary_memberships(request.user).first()
         return m.organization if m else None
-    return None
\ No newline at end of file
+    return None
+
+
+async def aget_org_from_request(request):
+    """get_org_from_request() for async middleware, using async cache and ORM calls."""
+    if request.path.startswith(TENANT_EXEMPT_PATHS):
+        return None
+
+    for slug in _candidate_slugs(request):
+        org = await aget_org_by_slug(slug)
+        if org:
+            return org
+
+    org_id = _claimed_org_id(request)
+    if org_id is not None:
+        return _resolvable(await aget_org_by_id(org_id))
+
+    if hasattr(request, "auser"):
+        user = await request.auser()
+        if user.is_authenticated:
+            m = await _primary_memberships(user).afirst()
+            return m.organization if m else None
+    return None
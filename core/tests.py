@@ -1,3 +1,975 @@
-from django.test import TestCase
+import datetime
+import decimal
+import gzip
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+import warnings
+from io import BytesIO, StringIO, TextIOWrapper
+from types import SimpleNamespace
+from unittest import mock, skipIf
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from celery import current_app
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+from django.utils.cache import add_never_cache_headers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+
+from accounts.models import Membership, User
+from core import metrics
+from core.cache import LRUCache
+from core.deletion import mark_for_deletion, purge_organization
+from core.export import export_dir, run_export, write_export
+from core.context import reset_current_organization, set_current_organization
+from core.middleware import (
+    CompressionMiddleware, ReplicaRoutingMiddleware, RequestMetricsMiddleware, TenantMiddleware, brotli,
+)
+from core.profiling import SlowRequestSampler
+from core.renderers import FastJSONRenderer
+from core.response_cache import cached_response
+from core.routers import begin_routing, end_routing
+from core.versioning import bump_versions
+from core.models import Organization, TenantExport
+from core import tenancy
+from core.tenancy import (
+    aget_membership_role, aget_org_from_request, clear_tenant_cache, get_membership_role, get_org_by_id,
+    get_org_by_slug, get_org_from_request,
+)
+from core.tokens import tenant_token_for
+from core.throttling import limiter, tenant_rate
+from projects.models import DeletedProject, Project, ProjectMember
+from worker.tasks import delete_organization
+
+
+class TenantRateThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Throttled", slug="throttled", rate_limit="3/min")
+        cls.user = User.objects.create_user("tina", "tina@example.com", "pw")
+        Membership.objects.create(organization=cls.org, user=cls.user, role="admin")
+
+    def setUp(self):
+        self.reset()
+        self.addCleanup(self.reset)  # pks are reused by other test cases' organizations
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def reset():
+        caches["default"].clear()
+        limiter._leases.clear()
+        clear_tenant_cache()
+
+    def test_limits_organization_and_reports_quota(self):
+        remaining = []
+        for _ in range(3):
+            response = self.client.get("/api/accounts/me/", HTTP_X_ORG="throttled")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response["X-RateLimit-Limit"], "3")
+            remaining.append(response["X-RateLimit-Remaining"])
+        self.assertEqual(remaining, ["2", "1", "0"])
+
+        response = self.client.get("/api/accounts/me/", HTTP_X_ORG="throttled")
+        self.assertEqual(response.status_code, 429)
+        self.assertGreaterEqual(int(response["Retry-After"]), 1)
+
+    def test_plan_rates_without_override(self):
+        Organization.objects.filter(pk=self.org.pk).update(rate_limit="")
+        with self.settings(TENANT_PLAN_RATES={"free": {"default": "2/min"}}):
+            statuses = [self.client.get("/api/accounts/me/", HTTP_X_ORG="throttled").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_scope_denials_leave_the_default_bucket_alone(self):
+        with self.settings(TENANT_PLAN_RATES={"free": {"projects": "1/min"}}):
+            path = f"/api/projects/organizations/{self.org.pk}/projects/"
+            data = {"name": "p", "organization": self.org.pk}
+            statuses = [self.client.post(path, data, HTTP_X_ORG="throttled").status_code for _ in range(3)]
+            self.assertEqual(statuses, [201, 429, 429])
+            statuses = [self.client.get("/api/accounts/me/", HTTP_X_ORG="throttled").status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+
+    def test_outsiders_do_not_spend_the_organization_quota(self):
+        outsider = User.objects.create_user("olga", "olga@example.com", "pw")
+        stranger = APIClient()
+        stranger.force_authenticate(outsider)
+        anonymous = APIClient()
+        for _ in range(5):
+            anonymous.post("/api/accounts/login/", {"username": "tina", "password": "x"}, HTTP_X_ORG="throttled")
+            stranger.get("/api/accounts/me/", HTTP_X_ORG="throttled")
+        self.assertEqual(self.client.get("/api/accounts/me/", HTTP_X_ORG="throttled").status_code, 200)
+
+    @override_settings(TENANT_ANON_RATE="2/min", TENANT_USER_RATE="3/min")
+    def test_outsiders_are_limited_per_ip_or_user(self):
+        def login(client, **extra):
+            data = {"username": "x", "password": "x"}
+            return client.post("/api/accounts/login/", data, HTTP_X_ORG="throttled", **extra).status_code
+
+        anonymous = APIClient()
+        statuses = [login(anonymous) for _ in range(2)]
+        # Without an organization too
+        statuses.append(anonymous.post("/api/accounts/signup/", {}).status_code)
+        self.assertEqual(statuses, [401, 401, 429])
+        self.assertEqual(login(anonymous, REMOTE_ADDR="10.0.0.9"), 401)
+
+        stranger = APIClient()
+        stranger.force_authenticate(User.objects.create_user("olga", "olga@example.com", "pw"))
+        statuses = [stranger.get("/api/accounts/me/").status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
+
+    def test_rate_limit_validation(self):
+        for rate in ["3000", "10/week", "ten/min", "/min"]:
+            with self.subTest(rate=rate), self.assertRaises(ValidationError):
+                Organization(name="X", slug="x", rate_limit=rate).full_clean()
+        Organization(name="X", slug="x", rate_limit="3000/hour").full_clean()
+
+        # Invalid overrides that got saved anyway fall back to the plan's rate
+        self.org.rate_limit = "10/week"
+        with self.settings(TENANT_PLAN_RATES={"free": {"default": "5/min"}}):
+            self.assertEqual(tenant_rate(self.org), (5, 60))
+
+
+class OpenAPISchemaTests(TestCase):
+    def test_committed_schema_matches_code(self):
+        # Fails when views or serializers change without `manage.py generate_openapi_schema`
+        call_command("generate_openapi_schema", "--check", stdout=StringIO(), stderr=StringIO())
+
+    def test_served_with_etag(self):
+        response = self.client.get("/swagger.json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["swagger"], "2.0")
+
+        cached = self.client.get("/swagger.json", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(cached.status_code, 304)
+
+        yaml = self.client.get("/swagger.yaml")
+        self.assertTrue(yaml.content.startswith(b"swagger: '2.0'"))
+
+
+class BenchmarkCommandTests(TestCase):
+    def generate(self):
+        out = StringIO()
+        call_command(
+            "generate_tenant_data", "--orgs", "2", "--users", "6", "--projects", "5", "--batch-size", "2",
+            "--prefix", "smoke", stdout=out,
+        )
+        return json.loads(out.getvalue())
+
+    def test_generate_tenant_data(self):
+        summary = self.generate()
+        self.assertEqual((summary["organizations"], summary["users"], summary["projects"]), (2, 6, 5))
+        self.assertEqual(Project.all_objects.filter(organization__slug__startswith="smoke-org-").count(), 5)
+        self.assertTrue(Membership.objects.filter(user__username=summary["largest_org"]["admin"], role="admin").exists())
+        with self.assertRaisesMessage(CommandError, "already exists"):
+            self.generate()
+
+    def test_bench_api_rolls_back_and_restores_eager_tasks(self):
+        slug = self.generate()["largest_org"]["slug"]
+        projects = Project.all_objects.count()
+        out = StringIO()
+        # Not "invite": eager Celery tasks still take a producer, i.e. a broker connection
+        scenarios = "tenant_resolution,login,project_list,project_create,member_list,memberships"
+        call_command(
+            "bench_api", "--org", slug, "--requests", "2", "--warmup", "0", "--scenarios", scenarios, stdout=out,
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(",".join(report["scenarios"]), scenarios)
+        self.assertEqual({name: result["errors"] for name, result in report["scenarios"].items() if result["errors"]}, {})
+        self.assertEqual(Project.all_objects.count(), projects)
+        self.assertFalse(current_app.conf.task_always_eager)
+
+
+SHARD = "move_test_shard"
+
+
+def _reload_connections():
+    # connections reads DATABASES once; make it pick up an override
+    connections.__dict__.pop("settings", None)
+    connections._settings = None
+
+
+@override_settings(DATABASE_SHARDS=["default", SHARD])
+class MoveTenantShardTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # A second, in-memory shard that exists for this class only
+        shard_settings = override_settings(DATABASES={
+            **settings.DATABASES, SHARD: {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+        })
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")  # "Overriding setting DATABASES can lead to unexpected behavior"
+            shard_settings.enable()
+        _reload_connections()
+        cls.addClassCleanup(cls._drop_shard, shard_settings)
+        with override_settings(DATABASE_SHARDS=["default", SHARD]):
+            call_command("migrate", database=SHARD, verbosity=0)
+        # Declared here, not on the class, so the runner doesn't set it up or check it
+        cls.databases = {"default", SHARD}
+        super().setUpClass()
+
+    @classmethod
+    def _drop_shard(cls, shard_settings):
+        connections[SHARD].close()
+        del connections[SHARD]
+        shard_settings.disable()
+        _reload_connections()
+
+    def setUp(self):
+        clear_tenant_cache()
+        self.org = Organization.objects.create(name="Mover", slug="mover")
+        self.other = Organization.objects.create(name="Resident", slug="resident", shard=SHARD)
+        self.user = User.objects.create_user("mo", "mo@example.com", "pw")
+        self.projects = [Project.all_objects.create(organization=self.org, name=f"p{i}") for i in range(3)]
+        for project in self.projects:
+            ProjectMember.all_objects.create(organization=self.org, project=project, user=self.user)
+
+    def move(self):
+        call_command("move_tenant_shard", "mover", SHARD, "--drain-seconds", "0", "--batch-size", "2", stdout=StringIO())
+
+    def test_moves_rows_and_keeps_pks(self):
+        Project.all_objects.using(SHARD).create(pk=1000, organization=self.other, name="theirs")
+        self.move()
+
+        self.org.refresh_from_db()
+        self.assertEqual((self.org.shard, self.org.status), (SHARD, "active"))
+        self.assertEqual(
+            sorted(Project.all_objects.using(SHARD).filter(organization=self.org).values_list("pk", flat=True)),
+            [p.pk for p in self.projects],
+        )
+        self.assertEqual(ProjectMember.all_objects.using(SHARD).filter(organization=self.org).count(), 3)
+        self.assertFalse(Project.all_objects.using("default").filter(organization=self.org).exists())
+        self.assertTrue(Project.all_objects.using(SHARD).filter(pk=1000, organization=self.other).exists())
+        # Moved, not deleted: no tombstones for incremental syncs
+        self.assertFalse(DeletedProject.all_objects.using("default").exists())
+        self.assertFalse(DeletedProject.all_objects.using(SHARD).exists())
+
+    def test_overlapping_pks_abort_without_losing_data(self):
+        # The target's own sequence already handed out the second project's pk
+        Project.all_objects.using(SHARD).create(pk=self.projects[1].pk, organization=self.other, name="theirs")
+        with self.assertRaisesMessage(CommandError, "are taken on"):
+            self.move()
+
+        self.org.refresh_from_db()
+        self.assertEqual((self.org.shard, self.org.status), ("default", "active"))
+        self.assertEqual(Project.all_objects.using("default").filter(organization=self.org).count(), 3)
+        self.assertEqual(ProjectMember.all_objects.using("default").filter(organization=self.org).count(), 3)
+        self.assertFalse(Project.all_objects.using(SHARD).filter(organization=self.org).exists())
+        self.assertEqual(Project.all_objects.using(SHARD).get(pk=self.projects[1].pk).name, "theirs")
+
+    def test_stays_read_only_until_every_process_uses_the_new_shard(self):
+        drains = []
+
+        def sleep(seconds):
+            org = Organization.objects.get(pk=self.org.pk)
+            drains.append((org.shard, org.status))
+
+        with mock.patch("core.management.commands.move_tenant_shard.time.sleep", side_effect=sleep):
+            call_command("move_tenant_shard", "mover", SHARD, "--drain-seconds", "1", stdout=StringIO(), stderr=StringIO())
+        self.assertEqual(drains, [("default", "moving"), (SHARD, "moving")])
+
+    def test_moving_org_is_readable_but_refuses_writes(self):
+        self.org.status = "moving"
+        self.org.save()
+        middleware = TenantMiddleware(lambda request: HttpResponse(request.organization.slug))
+        factory = RequestFactory(headers={"X-Org": "mover"})
+
+        response = middleware(factory.get("/api/projects/"))
+        self.assertEqual((response.status_code, response.content), (200, b"mover"))
+        response = middleware(factory.post("/api/projects/"))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "60")
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        metrics.REQUEST_DURATION.clear()
+        self.addCleanup(metrics.REQUEST_DURATION.clear)
+
+    def test_scrapes_need_the_token_or_an_internal_ip(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        with override_settings(INTERNAL_IPS=["127.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, 200)
+        with override_settings(METRICS_TOKEN="s3cret", INTERNAL_IPS=["127.0.0.1"]):
+            self.assertEqual(self.client.get("/metrics").status_code, 403)
+            response = self.client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+            self.assertEqual(response.status_code, 200)
+
+    def test_unread_streaming_response_is_recorded_on_close(self):
+        middleware = RequestMetricsMiddleware(lambda request: StreamingHttpResponse(iter([b"never read"])))
+        response = middleware(RequestFactory().get("/stream"))
+        self.assertTrue(all(connection.execute_wrappers for connection in connections.all()))
+        response.close()
+        self.assertFalse(any(connection.execute_wrappers for connection in connections.all()))
+        self.assertIn('view="<unresolved>"', "\n".join(metrics.REQUEST_DURATION.collect()))
+
+
+class SlowRequestSamplerTests(TestCase):
+    def test_samples_slow_requests_until_untracked(self):
+        sampler = SlowRequestSampler(threshold=0.01, interval=0.005)
+        sampler.start()
+        sampler.track(threading.get_ident(), time.perf_counter())
+        time.sleep(0.1)
+        samples = sampler.untrack(threading.get_ident())
+        self.assertTrue(any("test_samples_slow_requests_until_untracked" in stack for stack in samples))
+
+        taken = sum(samples.values())
+        time.sleep(0.05)
+        self.assertEqual(sum(samples.values()), taken)
+        self.assertIsNone(sampler.untrack(threading.get_ident()))
+
+
+class ResponseCacheLockTests(TestCase):
+    class View:
+        calls = 0
+
+        @cached_response(lambda request: [("things", "all")])
+        def get(self, request):
+            type(self).calls += 1
+            return Response({"n": type(self).calls})
+
+    def setUp(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        self.request = RequestFactory().get("/things")
+        self.request.user = AnonymousUser()
+        self.View.calls = 0
+        patcher = mock.patch("core.response_cache._cache_key", return_value="tenantx:response:test")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @override_settings(RESPONSE_CACHE_LOCK_WAIT=0.1)
+    def test_waiter_leaves_another_requests_lock_alone(self):
+        caches["default"].add("tenantx:response:test:lock", "other", 60)
+        self.assertEqual(self.View().get(self.request).data, {"n": 1})
+        self.assertEqual(caches["default"].get("tenantx:response:test:lock"), "other")
+
+    def test_releases_its_own_lock(self):
+        self.assertEqual(self.View().get(self.request).data, {"n": 1})
+        self.assertIsNone(caches["default"].get("tenantx:response:test:lock"))
+        self.assertIsNotNone(caches["default"].get("tenantx:response:test"))
+
+    def bump(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_versions(("things", "all"))
+
+    def test_write_serves_stale_while_one_request_revalidates(self):
+        self.assertEqual(self.View().get(self.request).data, {"n": 1})
+        self.bump()
+        caches["default"].add("tenantx:response:test:lock", "other", 60)
+        self.assertEqual(self.View().get(self.request).data, {"n": 1})
+        caches["default"].delete("tenantx:response:test:lock")
+        self.assertEqual(self.View().get(self.request).data, {"n": 2})
+        self.assertEqual(self.View().get(self.request).data, {"n": 2})
+
+
+class FastJSONRendererTests(TestCase):
+    def test_matches_drf_json_renderer(self):
+        data = {
+            "when": datetime.datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=datetime.timezone.utc),
+            "day": datetime.date(2024, 5, 1),
+            "price": decimal.Decimal("1.10"),
+            "id": uuid.UUID(int=1),
+            "text": "Ünïcode   ✓",
+            "big": 2 ** 70,
+            "nested": [{"a": None, "b": True}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class CompressionMiddlewareTests(TestCase):
+    body = b'{"results": [' + b",".join(b'{"id": %d}' % i for i in range(200)) + b"]}"
+
+    def compress(self, response, accept="gzip"):
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(RequestFactory().get("/", headers={"Accept-Encoding": accept}))
+
+    def test_gzip(self):
+        response = self.compress(HttpResponse(self.body, headers={"ETag": '"v1"'}))
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], 'W/"v1"')
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_gzip_length_is_randomized(self):
+        lengths = {len(self.compress(HttpResponse(self.body)).content) for _ in range(20)}
+        self.assertGreater(len(lengths), 1)
+
+    def test_skips_small_unaccepted_and_no_store_responses(self):
+        self.assertFalse(self.compress(HttpResponse(b"{}")).has_header("Content-Encoding"))
+        self.assertFalse(self.compress(HttpResponse(self.body), accept="identity").has_header("Content-Encoding"))
+        secret = HttpResponse(self.body)
+        add_never_cache_headers(secret)
+        self.assertFalse(self.compress(secret).has_header("Content-Encoding"))
+
+    def test_streamed_responses(self):
+        chunks = [self.body[i:i + 100] for i in range(0, len(self.body), 100)]
+        response = self.compress(StreamingHttpResponse(iter(chunks)))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), self.body)
+
+        async def achunks():
+            for chunk in chunks:
+                yield chunk
+
+        async def read(response):
+            return b"".join([chunk async for chunk in response.streaming_content])
+
+        response = self.compress(StreamingHttpResponse(achunks()))
+        self.assertEqual(gzip.decompress(async_to_sync(read)(response)), self.body)
+
+    @skipIf(brotli is None, "brotli is not installed")
+    def test_brotli_is_padded_too(self):
+        responses = [self.compress(HttpResponse(self.body), accept="br") for _ in range(20)]
+        self.assertEqual(responses[0]["Content-Encoding"], "br")
+        self.assertEqual(brotli.decompress(responses[0].content), self.body)
+        self.assertGreater(len({len(response.content) for response in responses}), 1)
+
+        chunks = [self.body[i:i + 100] for i in range(0, len(self.body), 100)]
+        response = self.compress(StreamingHttpResponse(iter(chunks)), accept="br")
+        self.assertEqual(brotli.decompress(b"".join(response.streaming_content)), self.body)
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_token_responses_are_not_compressed(self):
+        response = self.client.post(
+            "/api/accounts/signup/",
+            {"org_name": "Acme", "username": "wile", "email": "wile@example.com", "password": "pw"},
+            content_type="application/json", headers={"Accept-Encoding": "gzip"},
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+
+@override_settings(DELETION_DRAIN_SECONDS=0)
+class OrganizationDeletionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Doomed", slug="doomed")
+        cls.admin = User.objects.create_user("ada", "ada@example.com", "pw")
+        cls.other = User.objects.create_user("eve", "eve@example.com", "pw")
+        Membership.objects.create(organization=cls.org, user=cls.admin, role="admin")
+        for i in range(3):
+            project = Project.all_objects.create(organization=cls.org, name=f"p{i}")
+            ProjectMember.all_objects.create(organization=cls.org, project=project, user=cls.admin)
+
+    def setUp(self):
+        caches["default"].clear()
+        clear_tenant_cache()
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def test_progress_is_shared_through_the_database(self):
+        with mock.patch("core.views.delete_organization.delay", return_value=mock.Mock(id="task-1")) as delay:
+            response = self.client.delete("/api/tenant/", {"confirm": "doomed"}, format="json", HTTP_X_ORG="doomed")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()["progress"]["state"], "pending")
+        delay.assert_called_once_with(self.org.pk)
+
+        # As the worker would, with nothing in common with this process but the database
+        caches["default"].clear()
+        progress = purge_organization(self.org.pk, batch_size=2)
+        self.assertEqual(progress["state"], "done")
+        self.assertEqual(progress["deleted"], {
+            "projects.projectmember": 3, "projects.project": 3, "accounts.membership": 1,
+        })
+        self.assertFalse(Organization.objects.filter(pk=self.org.pk).exists())
+        self.assertFalse(Project.all_objects.exists())
+
+        caches["default"].clear()
+        response = self.client.get(f"/api/tenant/deletions/{self.org.pk}/")
+        self.assertEqual(response.json()["state"], "done")
+        self.client.force_authenticate(self.other)
+        self.assertEqual(self.client.get(f"/api/tenant/deletions/{self.org.pk}/").status_code, 404)
+
+    def test_purge_needs_the_deleting_flag(self):
+        self.assertIsNone(purge_organization(self.org.pk))
+        self.assertEqual(Project.all_objects.count(), 3)
+
+    @override_settings(DELETION_DRAIN_SECONDS=300)
+    def test_purge_waits_for_tenant_caches_to_drain(self):
+        mark_for_deletion(self.org)
+        self.assertEqual(purge_organization(self.org.pk)["state"], "pending")
+        self.assertEqual(Project.all_objects.count(), 3)
+
+        with mock.patch.object(delete_organization, "apply_async") as retry:
+            delete_organization(self.org.pk)
+        (args,), options = retry.call_args
+        self.assertEqual(args, (self.org.pk,))
+        self.assertTrue(295 <= options["countdown"] <= 300)
+        self.assertEqual(Project.all_objects.count(), 3)
+
+        later = timezone.now() + datetime.timedelta(seconds=301)
+        with mock.patch("core.deletion.timezone.now", return_value=later):
+            self.assertEqual(purge_organization(self.org.pk)["state"], "done")
+        self.assertFalse(Project.all_objects.exists())
+
+
+# Routing only picks aliases; these tests never connect to them
+REPLICAS = ["replica_a", "replica_b"]
+
+
+@override_settings(
+    DATABASE_REPLICAS=REPLICAS, DATABASE_REPLICA_STICKY_SECONDS=60,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "replica-tests"}},
+)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        caches["default"].clear()
+        self.factory = RequestFactory()
+
+    def test_router_outside_requests_uses_the_primary(self):
+        self.assertEqual(User.objects.all().db, DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_write(User), DEFAULT_DB_ALIAS)
+
+    def test_router_reads_from_replicas_until_a_write(self):
+        token = begin_routing(use_replicas=True)
+        try:
+            reads = {User.objects.all().db for _ in range(50)}
+            self.assertEqual(reads, set(REPLICAS))
+            self.assertEqual(router.db_for_write(User), DEFAULT_DB_ALIAS)
+            self.assertEqual(User.objects.all().db, DEFAULT_DB_ALIAS)
+        finally:
+            self.assertTrue(end_routing(token)["wrote"])
+
+    def test_router_ignores_replicas_when_not_allowed(self):
+        token = begin_routing(use_replicas=False)
+        try:
+            self.assertEqual(User.objects.all().db, DEFAULT_DB_ALIAS)
+        finally:
+            end_routing(token)
+
+    def request(self, method, user_id, org_id=None):
+        request = getattr(self.factory, method)("/")
+        request.user = SimpleNamespace(is_authenticated=True, pk=user_id)
+        request.organization = SimpleNamespace(pk=org_id) if org_id else None
+        return request
+
+    def middleware(self, write=False):
+        """A ReplicaRoutingMiddleware whose view records where its reads go."""
+        seen = []
+
+        def view(request):
+            if write:
+                router.db_for_write(User)
+            seen.append(User.objects.all().db)
+            return HttpResponse()
+        return ReplicaRoutingMiddleware(view), seen
+
+    def test_reads_go_to_replicas_and_writes_pin_the_user(self):
+        middleware, seen = self.middleware()
+        middleware(self.request("get", 1))
+        self.assertIn(seen.pop(), REPLICAS)
+
+        middleware(self.request("post", 1))
+        self.assertEqual(seen.pop(), DEFAULT_DB_ALIAS)
+
+        # Read-your-writes: the same user reads from the primary until the pin expires
+        middleware(self.request("get", 1))
+        self.assertEqual(seen.pop(), DEFAULT_DB_ALIAS)
+        middleware(self.request("get", 2))
+        self.assertIn(seen.pop(), REPLICAS)
+
+        caches["default"].clear()
+        middleware(self.request("get", 1))
+        self.assertIn(seen.pop(), REPLICAS)
+
+    def test_writes_pin_the_organization_for_its_other_users(self):
+        middleware, seen = self.middleware()
+        middleware(self.request("post", 1, org_id=7))
+        middleware(self.request("get", 2, org_id=7))
+        middleware(self.request("get", 3, org_id=8))
+        self.assertEqual(seen[1], DEFAULT_DB_ALIAS)
+        self.assertIn(seen[2], REPLICAS)
+
+    def test_writes_during_a_safe_request_pin_the_user(self):
+        middleware, seen = self.middleware(write=True)
+        middleware(self.request("get", 1))
+        self.assertEqual(seen.pop(), DEFAULT_DB_ALIAS)
+        self.assertTrue(caches["default"].get("tenantx:db-pin:user:1"))
+
+    def test_async_requests_are_pinned_after_a_write(self):
+        seen = []
+
+        async def view(request):
+            seen.append(User.objects.all().db)
+            return HttpResponse()
+        middleware = ReplicaRoutingMiddleware(view)
+
+        def request(method):
+            request = getattr(self.factory, method)("/")
+            request.organization = None
+
+            async def auser():
+                return SimpleNamespace(is_authenticated=True, pk=1)
+            request.auser = auser
+            return request
+
+        async_to_sync(middleware)(request("post"))
+        async_to_sync(middleware)(request("get"))
+        self.assertEqual(seen, [DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS])
+        caches["default"].clear()
+        async_to_sync(middleware)(request("get"))
+        self.assertIn(seen[-1], REPLICAS)
+
+
+class MembershipRoleCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Roles", slug="roles")
+        cls.user = User.objects.create_user("rory", "rory@example.com", "pw")
+        cls.membership = Membership.objects.create(organization=cls.org, user=cls.user, role="employee")
+
+    def setUp(self):
+        caches["default"].clear()
+
+    def test_cache_hits_skip_the_database(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_membership_role(self.user, self.org), "employee")
+        with self.assertNumQueries(0):
+            self.assertEqual(get_membership_role(self.user, self.org), "employee")
+            self.assertEqual(async_to_sync(aget_membership_role)(self.user, self.org), "employee")
+
+    def test_non_members_are_cached_too(self):
+        other = Organization.objects.create(name="Elsewhere", slug="elsewhere")
+        self.assertIsNone(get_membership_role(self.user, other))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_membership_role(self.user, other))
+
+    def test_role_change_invalidates_on_commit(self):
+        get_membership_role(self.user, self.org)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.role = "manager"
+            self.membership.save()
+        self.assertEqual(get_membership_role(self.user, self.org), "manager")
+
+    def test_delete_invalidates_on_commit(self):
+        get_membership_role(self.user, self.org)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.membership.delete()
+        self.assertIsNone(async_to_sync(aget_membership_role)(self.user, self.org))
+
+    def test_local_memory_caches_only_briefly(self):
+        with mock.patch.object(tenancy, "MEMBERSHIP_CACHE_TTL", 60), \
+                mock.patch.object(tenancy, "MEMBERSHIP_LOCAL_CACHE_TTL", 2):
+            with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}):
+                self.assertEqual(tenancy._membership_ttl(caches["default"]), 2)
+            with self.settings(CACHES={"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}):
+                self.assertEqual(tenancy._membership_ttl(caches["default"]), 60)
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(maxsize=2)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.get("a")
+        cache.set("c", 3)
+        self.assertEqual((cache.get("a"), cache.get("b"), cache.get("c")), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_entries_expire(self):
+        cache = LRUCache(ttl=10)
+        with mock.patch("core.cache.time.monotonic", return_value=100):
+            cache.set("a", 1)
+            cache.set("b", 2, ttl=1)
+        with mock.patch("core.cache.time.monotonic", return_value=105):
+            self.assertEqual((cache.get("a"), cache.get("b", "gone")), (1, "gone"))
+        with mock.patch("core.cache.time.monotonic", return_value=110):
+            self.assertIsNone(cache.get("a"))
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_where(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        cache.set("b", 2)
+        cache.delete_where(lambda value: value == 2)
+        self.assertEqual((cache.get("a"), cache.get("b")), (1, None))
+
+
+class TenantCacheTests(TestCase):
+    def setUp(self):
+        clear_tenant_cache()
+        self.addCleanup(clear_tenant_cache)
+
+    def test_lookups_are_cached(self):
+        org = Organization.objects.create(name="Cached", slug="cached")
+        self.assertEqual(get_org_by_slug("cached"), org)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_org_by_slug("cached"), org)
+
+    def test_unknown_slugs_are_cached_briefly(self):
+        self.assertIsNone(get_org_by_slug("nobody"))
+        with self.assertNumQueries(0):
+            self.assertIsNone(get_org_by_slug("nobody"))
+        expired = time.monotonic() + tenancy.TENANT_CACHE_NEGATIVE_TTL + 1
+        with mock.patch("core.cache.time.monotonic", return_value=expired), self.assertNumQueries(1):
+            self.assertIsNone(get_org_by_slug("nobody"))
+
+    def test_creating_an_org_evicts_its_negative_entry(self):
+        self.assertIsNone(get_org_by_slug("newcomer"))
+        org = Organization.objects.create(name="Newcomer", slug="newcomer")
+        self.assertEqual(get_org_by_slug("newcomer"), org)
+
+    def test_rename_evicts_the_old_slug(self):
+        org = Organization.objects.create(name="Renamed", slug="before")
+        self.assertEqual(get_org_by_slug("before"), org)
+        org.slug = "after"
+        org.save()
+        self.assertIsNone(get_org_by_slug("before"))
+        self.assertEqual(get_org_by_slug("after").slug, "after")
+
+    def test_deactivation_evicts_the_org(self):
+        org = Organization.objects.create(name="Leaving", slug="leaving")
+        get_org_by_slug("leaving")
+        org.status = "deleting"
+        org.save()
+        self.assertIsNone(get_org_by_slug("leaving"))
+
+    @override_settings(TENANT_CACHE_ALIAS="default")
+    def test_rename_evicts_the_shared_cache(self):
+        caches["default"].clear()
+        org = Organization.objects.create(name="Shared", slug="shared-before")
+        get_org_by_slug("shared-before")
+        clear_tenant_cache()  # as if another process, which only has the shared entry
+        org.slug = "shared-after"
+        org.save()
+        self.assertIsNone(get_org_by_slug("shared-before"))
+
+    def test_invalidations_from_other_processes_clear_the_cache(self):
+        org = Organization.objects.create(name="Flipped", slug="flipped")
+        self.assertEqual(get_org_by_id(org.pk).shard, "default")
+        # Another process moves it; only the generation it bumps reaches this one
+        Organization.objects.filter(pk=org.pk).update(shard="elsewhere")
+        caches["default"].set(tenancy._GENERATION_KEY, time.time_ns(), None)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_org_by_id(org.pk).shard, "default")
+        later = time.monotonic() + tenancy.TENANT_CACHE_CHECK_INTERVAL
+        with mock.patch("core.tenancy.time.monotonic", return_value=later):
+            self.assertEqual(get_org_by_id(org.pk).shard, "elsewhere")
+
+
+class TenantManagerTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Scoped", slug="scoped")
+        cls.other = Organization.objects.create(name="Other", slug="other")
+        cls.mine = Project.objects.create(organization=cls.org, name="mine")
+        cls.theirs = Project.objects.create(organization=cls.other, name="theirs")
+
+    def scoped(self, org):
+        token = set_current_organization(org)
+        self.addCleanup(reset_current_organization, token)
+
+    def test_unscoped_outside_requests(self):
+        self.assertEqual(set(Project.objects.all()), {self.mine, self.theirs})
+
+    def test_scoped_to_the_current_organization(self):
+        self.scoped(self.org)
+        self.assertEqual(list(Project.objects.all()), [self.mine])
+        self.assertFalse(Project.objects.filter(pk=self.theirs.pk).exists())
+        self.assertEqual(Project.objects.count(), 1)
+
+    def test_nothing_without_a_current_organization(self):
+        self.scoped(None)
+        with self.assertNumQueries(0):
+            self.assertEqual(list(Project.objects.all()), [])
+        self.assertFalse(Project.objects.filter(name="mine").exists())
+
+    def test_all_objects_bypasses_scoping(self):
+        self.scoped(self.org)
+        self.assertEqual(set(Project.all_objects.all()), {self.mine, self.theirs})
+        self.scoped(None)
+        self.assertEqual(Project.all_objects.get(pk=self.theirs.pk), self.theirs)
+
+    def test_middleware_scopes_the_request(self):
+        clear_tenant_cache()
+        self.addCleanup(clear_tenant_cache)
+        seen = []
+
+        def view(request):
+            seen.append(list(Project.objects.values_list("name", flat=True)))
+            return HttpResponse()
+        middleware = TenantMiddleware(view)
+        factory = RequestFactory()
+        for slug in ("scoped", "unknown"):
+            request = factory.get("/api/projects/", HTTP_X_ORG=slug)
+            request.user = AnonymousUser()
+            middleware(request)
+        self.assertEqual(seen, [["mine"], []])
+        self.assertEqual(Project.objects.count(), 2)  # reset after the request
+
+
+class TenantExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Exported", slug="exported")
+        cls.other = Organization.objects.create(name="Unrelated", slug="unrelated")
+        cls.user = User.objects.create_user("erin", "erin@example.com", "pw")
+        Membership.objects.create(organization=cls.org, user=cls.user, role="admin")
+        cls.project = Project.objects.create(organization=cls.org, name="Apollo")
+        Project.objects.create(organization=cls.other, name="Hidden")
+
+    def setUp(self):
+        caches["default"].clear()
+        clear_tenant_cache()
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(self.settings(EXPORT_ROOT=root.name))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @staticmethod
+    def read_ndjson(path):
+        with gzip.open(path) as fh:
+            return [json.loads(line) for line in fh]
+
+    def test_write_export_ndjson(self):
+        path = write_export(self.org)
+        self.assertTrue(path.startswith(str(export_dir(self.org.pk))))
+        rows = self.read_ndjson(path)
+        projects = [row for row in rows if row["_table"] == "projects.project"]
+        self.assertEqual([p["name"] for p in projects], ["Apollo"])
+        users = [row for row in rows if row["_table"] == "accounts.user"]
+        self.assertEqual([u["username"] for u in users], ["erin"])
+        self.assertNotIn("password", users[0])
+        self.assertEqual(os.listdir(export_dir(self.org.pk)), [os.path.basename(path)])  # no .part left
+
+    def test_write_export_csv(self):
+        path = write_export(self.org, "csv", os.path.join(export_dir(self.org.pk).parent, "out.csv.gz"))
+        with gzip.open(path, "rt") as fh:
+            lines = fh.read().splitlines()
+        self.assertTrue(lines[0].startswith("_table,id,"))
+        self.assertTrue(any(line.startswith("projects.project,") and "Apollo" in line for line in lines))
+        self.assertFalse(any("Hidden" in line for line in lines))
+
+    def test_failed_write_leaves_no_file(self):
+        export = TenantExport.objects.create(organization=self.org, format="ndjson")
+        with mock.patch("core.export.iter_export", side_effect=RuntimeError("boom")):
+            with self.assertRaises(RuntimeError):
+                run_export(export.pk)
+        export.refresh_from_db()
+        self.assertEqual(export.state, "failed")
+        self.assertEqual(os.listdir(export_dir(self.org.pk)), [])
+
+    @mock.patch("core.views.export_tenant_data.delay", return_value=mock.Mock(id="task-1"))
+    def test_queue_poll_and_download(self, delay):
+        response = self.client.post("/api/tenant/export/?as=ndjson", HTTP_X_ORG="exported")
+        self.assertEqual(response.status_code, 202)
+        export_id = response.data["export_id"]
+        delay.assert_called_once_with(self.org.id, "ndjson", export_id=export_id)
+        status_url = response.data["status_url"]
+        self.assertEqual(status_url, f"/api/tenant/export/{export_id}/")
+
+        response = self.client.get(status_url, HTTP_X_ORG="exported")
+        self.assertEqual((response.data["state"], "download_url" in response.data), ("queued", False))
+        self.assertEqual(self.client.get(f"{status_url}download/", HTTP_X_ORG="exported").status_code, 404)
+
+        run_export(export_id)  # what the worker does
+        response = self.client.get(status_url, HTTP_X_ORG="exported")
+        self.assertEqual(response.data["state"], "done")
+        response = self.client.get(response.data["download_url"], HTTP_X_ORG="exported")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertIn(".ndjson.gz", response["Content-Disposition"])
+        rows = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        self.assertIn("Apollo", [row.get("name") for row in rows])
+
+    def test_exports_are_private_to_their_organization(self):
+        export = TenantExport.objects.create(organization=self.other, format="ndjson")
+        run_export(export.pk)
+        Membership.objects.create(organization=self.other, user=self.user, role="employee")
+        for url in (f"/api/tenant/export/{export.pk}/", f"/api/tenant/export/{export.pk}/download/"):
+            self.assertEqual(self.client.get(url, HTTP_X_ORG="exported").status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_X_ORG="unrelated").status_code, 403)
+
+    @override_settings(DELETION_DRAIN_SECONDS=0)
+    def test_deleting_the_organization_removes_its_exports(self):
+        export = TenantExport.objects.create(organization=self.org, format="ndjson")
+        run_export(export.pk)
+        mark_for_deletion(self.org)
+        purge_organization(self.org.pk)
+        self.assertFalse(export_dir(self.org.pk).exists())
+        self.assertFalse(TenantExport.objects.filter(pk=export.pk).exists())
+
+    def test_command_streams_to_stdout(self):
+        stdout = TextIOWrapper(BytesIO())
+        with mock.patch.object(sys, "stdout", stdout):
+            call_command("export_tenant", "exported", stderr=StringIO())
+        lines = stdout.buffer.getvalue().splitlines()
+        self.assertIn("Apollo", [json.loads(line).get("name") for line in lines])
+
+    def test_command_writes_a_file(self):
+        path = os.path.join(export_dir(self.org.pk).parent, "cmd.ndjson.gz")
+        stderr = StringIO()
+        call_command("export_tenant", "exported", "--output", path, stderr=stderr)
+        self.assertIn(path, stderr.getvalue())
+        self.assertIn("Apollo", [row.get("name") for row in self.read_ndjson(path)])
+
+    @mock.patch("core.management.commands.export_tenant.export_tenant_data.delay", return_value=mock.Mock(id="task-2"))
+    def test_command_queues_a_fetchable_export(self, delay):
+        stderr = StringIO()
+        call_command("export_tenant", "exported", "--format", "csv", "--async", stderr=stderr)
+        export = TenantExport.objects.get(organization=self.org)
+        self.assertEqual((export.format, export.state), ("csv", "queued"))
+        delay.assert_called_once_with(self.org.id, "csv", export_id=str(export.pk))
+        self.assertIn(str(export.pk), stderr.getvalue())
+
+    def test_command_unknown_org(self):
+        with self.assertRaises(CommandError):
+            call_command("export_tenant", "nobody")
+
+
+class TokenTenantResolutionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Claimed", slug="claimed")
+        cls.primary = Organization.objects.create(name="Primary", slug="primary")
+        cls.user = User.objects.create_user("tom", "tom@example.com", "pw")
+        Membership.objects.create(organization=cls.primary, user=cls.user, role="admin")
+        Membership.objects.create(organization=cls.org, user=cls.user, role="employee")
+
+    def setUp(self):
+        clear_tenant_cache()
+        self.addCleanup(clear_tenant_cache)
+        self.token = str(tenant_token_for(self.user, self.org, "employee").access_token)
+
+    def request(self, **headers):
+        request = RequestFactory().get("/api/accounts/me/", HTTP_AUTHORIZATION=f"Bearer {self.token}", **headers)
+        request.user = self.user
+        return request
+
+    def resolve(self, **headers):
+        return get_org_from_request(self.request(**headers)), async_to_sync(aget_org_from_request)(self.request(**headers))
+
+    def test_resolves_the_claimed_org_by_id(self):
+        self.assertEqual(self.resolve(), (self.org, self.org))
+
+    def test_survives_a_rename(self):
+        self.org.slug = "claimed-renamed"
+        self.org.save()
+        org, aorg = self.resolve()
+        self.assertEqual((org.pk, aorg.pk), (self.org.pk, self.org.pk))
+        self.assertEqual(org.slug, "claimed-renamed")
+
+    def test_fails_closed_when_the_claimed_org_is_gone(self):
+        Organization.objects.filter(pk=self.org.pk).update(status="deleting")
+        self.assertEqual(self.resolve(), (None, None))  # not the primary membership's org
+        self.org.delete()
+        clear_tenant_cache()
+        self.assertEqual(self.resolve(), (None, None))
+
+    def test_explicit_org_takes_precedence(self):
+        self.assertEqual(self.resolve(HTTP_X_ORG="primary"), (self.primary, self.primary))
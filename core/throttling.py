@@ -0,0 +1,262 @@
+import math
+import operator
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.throttling import BaseThrottle
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """'600/min' -> (600, 60); None means unlimited. ValueError when malformed."""
+    if not rate:
+        return None
+    num, _, period = rate.partition("/")
+    if not num.isdigit() or period[:1] not in DURATIONS:
+        raise ValueError(f"Invalid rate {rate!r}")
+    return int(num), DURATIONS[period[0]]
+
+
+def validate_rate(value):
+    try:
+        parse_rate(value)
+    except ValueError:
+        raise ValidationError('Enter a rate such as "600/min" (per s, m, h or d).')
+
+
+def tenant_rate(org, scope="default"):
+    """
+    The organization's rate for `scope` from TENANT_PLAN_RATES, e.g.
+    {"free": {"default": "1200/min", "invites": "60/min"}}. An organization's
+    own rate_limit overrides its plan's default scope.
+    """
+    if scope == "default" and org.rate_limit:
+        try:
+            return parse_rate(org.rate_limit)
+        except ValueError:
+            pass  # saved without validation (e.g. update()): use the plan's rate
+    rates = getattr(settings, "TENANT_PLAN_RATES", {}).get(org.plan) or {}
+    return parse_rate(rates.get(scope))
+
+
+class RateLimiter:
+    """
+    Shared-cache rate limiting with a lock-free in-process fast path.
+
+    Counts live in the shared cache as per-window counters bumped with
+    atomic incr; a request is allowed while the sliding-window estimate
+    (previous window weighted by its remaining overlap, plus the current
+    one) stays within the limit, which behaves like a token bucket that
+    refills at limit/period. Each process leases a few tokens at a time
+    and hands them out from a range iterator (next() is atomic under the
+    GIL), so most requests never touch the cache; denials are remembered
+    until their Retry-After too. Tokens leased but unused when a window
+    rolls over are lost, bounded by lease size x processes.
+    """
+
+    def __init__(self):
+        # key -> (window, token iterator, remaining after the lease, denied until)
+        self._leases = {}
+
+    def _cache(self):
+        return caches[getattr(settings, "TENANT_THROTTLE_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def _lease_size(limit):
+        return max(1, min(getattr(settings, "TENANT_THROTTLE_LEASE", 10), limit // 20))
+
+    def _from_lease(self, key, window, now):
+        """The outcome decided locally, or None when the shared cache must be asked."""
+        lease = self._leases.get(key)
+        if lease is None or lease[0] != window:
+            return None
+        if next(lease[1], None) is not None:
+            return True, lease[2] + operator.length_hint(lease[1]), 0
+        if now < lease[3]:
+            # Denied recently: don't hit the cache again until Retry-After has passed
+            return False, 0, math.ceil(lease[3] - now)
+        return None
+
+    def _store(self, key, lease):
+        if len(self._leases) >= getattr(settings, "TENANT_THROTTLE_MAX_KEYS", 10000):
+            current = lease[0]
+            for stale in [k for k, v in list(self._leases.items()) if v[0] != current]:
+                self._leases.pop(stale, None)
+        self._leases[key] = lease
+
+    @staticmethod
+    def _incr(cache, key, amount, timeout):
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            if cache.add(key, amount, timeout):
+                return amount
+            return cache.incr(key, amount)
+
+    def _grant(self, key, window, limit, period, now, previous, current, lease):
+        """(allowed, remaining, retry_after) once the shared counters were bumped by `lease`."""
+        overlap = 1 - (now - window * period) / period
+        used = previous * overlap + current
+        granted = min(lease, math.floor(limit - (used - lease)))
+        if granted <= 0:
+            if previous and current - lease < limit:
+                # Wait for the previous window's weight to decay far enough
+                needed = 1 - (limit - (current - lease) - 1) / previous
+                retry_after = max(needed * period - (now - window * period), 1)
+            else:
+                retry_after = (window + 1) * period - now
+            self._store(key, (window, iter(()), 0, now + retry_after))
+            return False, 0, math.ceil(retry_after), lease
+        self._store(key, (window, iter(range(granted - 1)), max(0, math.floor(limit - used)), 0))
+        return True, max(0, math.floor(limit - used)) + granted - 1, 0, lease - granted
+
+    def consume(self, key, limit, period):
+        """(allowed, remaining, retry_after seconds) for one request against `key`."""
+        now = time.time()
+        window = int(now // period)
+        local = self._from_lease(key, window, now)
+        if local is not None:
+            return local
+
+        cache = self._cache()
+        lease = self._lease_size(limit)
+        current = self._incr(cache, f"{key}:{window}", lease, period * 2)
+        previous = cache.get(f"{key}:{window - 1}", 0)
+        allowed, remaining, retry_after, refund = self._grant(
+            key, window, limit, period, now, previous, current, lease
+        )
+        if refund:
+            cache.decr(f"{key}:{window}", refund)
+        return allowed, remaining, retry_after
+
+    def refund(self, key, period):
+        """Give back a token consume() granted, e.g. when another bucket denied the request."""
+        try:
+            self._cache().decr(f"{key}:{int(time.time() // period)}")
+        except ValueError:  # the window rolled over in between
+            pass
+
+    async def arefund(self, key, period):
+        """refund() for async code."""
+        try:
+            await self._cache().adecr(f"{key}:{int(time.time() // period)}")
+        except ValueError:
+            pass
+
+    async def aconsume(self, key, limit, period):
+        """consume() for async code."""
+        now = time.time()
+        window = int(now // period)
+        local = self._from_lease(key, window, now)
+        if local is not None:
+            return local
+
+        cache = self._cache()
+        lease = self._lease_size(limit)
+        try:
+            current = await cache.aincr(f"{key}:{window}", lease)
+        except ValueError:
+            if await cache.aadd(f"{key}:{window}", lease, period * 2):
+                current = lease
+            else:
+                current = await cache.aincr(f"{key}:{window}", lease)
+        previous = await cache.aget(f"{key}:{window - 1}", 0)
+        allowed, remaining, retry_after, refund = self._grant(
+            key, window, limit, period, now, previous, current, lease
+        )
+        if refund:
+            await cache.adecr(f"{key}:{window}", refund)
+        return allowed, remaining, retry_after
+
+
+limiter = RateLimiter()
+
+
+class TenantRateThrottle(BaseThrottle):
+    """
+    Limits each organization to its plan's rate (tenant_rate). Writes to
+    views setting `throttle_scope` (e.g. "invites") also draw from that
+    scope's bucket, which is checked first; a request denied by a later
+    bucket gets its earlier tokens back. Only members of the resolved
+    organization spend its quota: other authenticated requests are limited
+    per user (TENANT_USER_RATE) and anonymous ones per client IP
+    (TENANT_ANON_RATE), so naming an organization can't lock it out. The
+    outcome is left on the request for RateLimitHeadersMiddleware.
+    """
+    per_user = False
+
+    def _buckets(self, request, view, org, is_member):
+        user = request.user
+        authenticated = bool(user and user.is_authenticated)
+        if not is_member:
+            if authenticated:
+                rate = parse_rate(getattr(settings, "TENANT_USER_RATE", None))
+                return [(f"tenantx:rl:user:{user.pk}", rate)] if rate else []
+            rate = parse_rate(getattr(settings, "TENANT_ANON_RATE", None))
+            return [(f"tenantx:rl:ip:{self.get_ident(request)}", rate)] if rate else []
+
+        base = f"tenantx:rl:{org.pk}"
+        if self.per_user and authenticated:
+            base += f":u{user.pk}"
+        buckets = [(base, tenant_rate(org))]
+        scope = getattr(view, "throttle_scope", None)
+        if scope and request.method not in SAFE_METHODS:
+            buckets.insert(0, (f"{base}:{scope}", tenant_rate(org, scope)))
+        return [(key, rate) for key, rate in buckets if rate]
+
+    def get_buckets(self, request, view):
+        from .tenancy import get_membership_role
+        org = getattr(request, "organization", None)
+        is_member = bool(org and get_membership_role(request.user, org, request))
+        return self._buckets(request, view, org, is_member)
+
+    async def aget_buckets(self, request, view):
+        from .tenancy import aget_membership_role
+        org = getattr(request, "organization", None)
+        is_member = bool(org and await aget_membership_role(request.user, org, request))
+        return self._buckets(request, view, org, is_member)
+
+    def _record(self, request, results):
+        self.retry_after = max((retry for _, _, _, retry in results), default=0)
+        allowed_all = all(allowed for allowed, _, _, _ in results)
+        # Report the tightest bucket
+        limit, remaining = min(((limit, remaining) for _, limit, remaining, _ in results), key=lambda r: r[1])
+        http_request = getattr(request, "_request", request)
+        http_request._rate_limit = {"limit": limit, "remaining": remaining, "retry_after": self.retry_after}
+        return allowed_all
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request, view)
+        results = []
+        for i, (key, (limit, period)) in enumerate(buckets):
+            allowed, remaining, retry_after = limiter.consume(key, limit, period)
+            results.append((allowed, limit, remaining, retry_after))
+            if not allowed:
+                for granted_key, (_, granted_period) in buckets[:i]:
+                    limiter.refund(granted_key, granted_period)
+                break
+        return self._record(request, results) if results else True
+
+    async def aallow_request(self, request, view):
+        buckets = await self.aget_buckets(request, view)
+        results = []
+        for i, (key, (limit, period)) in enumerate(buckets):
+            allowed, remaining, retry_after = await limiter.aconsume(key, limit, period)
+            results.append((allowed, limit, remaining, retry_after))
+            if not allowed:
+                for granted_key, (_, granted_period) in buckets[:i]:
+                    await limiter.arefund(granted_key, granted_period)
+                break
+        return self._record(request, results) if results else True
+
+    def wait(self):
+        return getattr(self, "retry_after", None) or None
+
+
+class TenantUserRateThrottle(TenantRateThrottle):
+    """Same plan rates, but a separate bucket per user within each organization."""
+    per_user = True
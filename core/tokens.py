@@ -0,0 +1,93 @@
+from django.conf import settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+ORG_ID_CLAIM = "org_id"
+ORG_SLUG_CLAIM = "org_slug"
+ROLE_CLAIM = "role"
+
+
+def tenant_scoped_tokens_enabled():
+    return getattr(settings, "TENANT_SCOPED_TOKENS", True)
+
+
+class TenantRefreshToken(RefreshToken):
+    """
+    A refresh token whose access tokens carry the user's current role.
+    The role isn't stored on the refresh token itself: it's read from the
+    membership each time an access token is minted, so a refresh (or a
+    rotated refresh token) never hands out a role the user has lost.
+    """
+    no_copy_claims = (*RefreshToken.no_copy_claims, ROLE_CLAIM)
+    role = None  # known role for the first access token, saving a query
+
+    @property
+    def access_token(self):
+        access = super().access_token
+        if ORG_ID_CLAIM in self.payload:
+            role = self.role
+            if role is None:
+                from accounts.models import Membership
+                role = (
+                    Membership.objects.filter(
+                        user_id=self.payload.get(api_settings.USER_ID_CLAIM),
+                        organization_id=self.payload[ORG_ID_CLAIM],
+                        organization__status__in=("active", "moving"),
+                    )
+                    .values_list("role", flat=True)
+                    .first()
+                )
+                if role is None:
+                    raise TokenError("User is no longer a member of this organization")
+            access[ROLE_CLAIM] = role
+        return access
+
+
+def tenant_token_for(user, org=None, role=None):
+    """
+    Issue a refresh token for `user`. In tenant-scoped mode the org id and
+    slug are added as signed claims, and access tokens also get the role,
+    so authenticated requests can skip tenant and membership lookups. Role
+    changes take effect when the access token is next refreshed.
+    """
+    refresh = TenantRefreshToken.for_user(user)
+    if org is not None and tenant_scoped_tokens_enabled():
+        refresh[ORG_ID_CLAIM] = org.pk
+        refresh[ORG_SLUG_CLAIM] = org.slug
+        refresh.role = role
+    return refresh
+
+
+def get_token_claims(request):
+    """
+    Validated claims of the request's bearer access token, or None.
+    Runs before DRF authentication (e.g. from TenantMiddleware) and is
+    memoized on the request.
+    """
+    request = getattr(request, "_request", request)
+    if "_token_claims" in request.__dict__:
+        return request._token_claims
+
+    claims = None
+    if tenant_scoped_tokens_enabled():
+        parts = request.headers.get("Authorization", "").split()
+        if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+            try:
+                claims = AccessToken(parts[1]).payload
+            except TokenError:
+                claims = None
+    request._token_claims = claims
+    return claims
+
+
+def get_claimed_role(request, user, org):
+    """Role from the token claims if they were issued for this user and org."""
+    claims = get_token_claims(request)
+    if not claims or ORG_ID_CLAIM not in claims:
+        return None
+    if claims[ORG_ID_CLAIM] != org.pk:
+        return None
+    if str(claims.get(api_settings.USER_ID_CLAIM)) != str(getattr(user, api_settings.USER_ID_FIELD)):
+        return None
+    return claims.get(ROLE_CLAIM)
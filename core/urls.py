@@ -0,0 +1,15 @@
+from django.urls import path
+from .views import (
+    ProfileDownloadView, ProfileListView, TenantDeletionProgressView, TenantDeletionView, TenantExportDownloadView,
+    TenantExportStatusView, TenantExportView,
+)
+
+urlpatterns = [
+    path("", TenantDeletionView.as_view(), name="tenant-delete"),
+    path("deletions/<int:org_id>/", TenantDeletionProgressView.as_view(), name="tenant-deletion-progress"),
+    path("export/", TenantExportView.as_view(), name="tenant-export"),
+    path("export/<uuid:export_id>/", TenantExportStatusView.as_view(), name="tenant-export-status"),
+    path("export/<uuid:export_id>/download/", TenantExportDownloadView.as_view(), name="tenant-export-download"),
+    path("profiles/", ProfileListView.as_view(), name="profile-list"),
+    path("profiles/<str:profile_id>/", ProfileDownloadView.as_view(), name="profile-download"),
+]
@@ -0,0 +1,140 @@
+import functools
+import hashlib
+import time
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import patch_vary_headers
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from rest_framework import status
+from rest_framework.response import Response
+
+# Per-scope resource versions, e.g. ("projects", "org:42"). A version is the
+# time (ns) of the last write, so it doubles as Last-Modified. Must live in
+# a cache shared by every web process.
+
+
+def _cache():
+    return caches[getattr(settings, "RESOURCE_VERSION_CACHE_ALIAS", "default")]
+
+
+def _key(resource, scope):
+    return f"tenantx:version:{resource}:{scope}"
+
+
+def get_versions(keys):
+    """Current versions for [(resource, scope), ...]; unknown ones start now."""
+    cache = _cache()
+    cache_keys = [_key(resource, scope) for resource, scope in keys]
+    found = cache.get_many(cache_keys)
+    versions = []
+    for cache_key in cache_keys:
+        if cache_key not in found:
+            cache.add(cache_key, time.time_ns(), None)
+            found[cache_key] = cache.get(cache_key)
+        versions.append(found[cache_key])
+    return versions
+
+
+async def aget_versions(keys):
+    """get_versions() for async code."""
+    cache = _cache()
+    cache_keys = [_key(resource, scope) for resource, scope in keys]
+    found = await cache.aget_many(cache_keys)
+    versions = []
+    for cache_key in cache_keys:
+        if cache_key not in found:
+            await cache.aadd(cache_key, time.time_ns(), None)
+            found[cache_key] = await cache.aget(cache_key)
+        versions.append(found[cache_key])
+    return versions
+
+
+def bump_versions(*keys, using=None):
+    """
+    Mark resources as changed, e.g. bump_versions(("projects", f"org:{org_id}")),
+    once the current transaction on `using` commits. Bumping any earlier
+    would let a reader cache the old rows under the new version.
+    """
+    def bump():
+        now = time.time_ns()
+        _cache().set_many({_key(resource, scope): now for resource, scope in keys}, None)
+    transaction.on_commit(bump, using=using)
+
+
+def _validators(request, keys, versions):
+    digest = hashlib.sha1(
+        repr((keys, versions, request.get_full_path())).encode()
+    ).hexdigest()
+    # Last-Modified has whole seconds: round up, and leave it out while later
+    # writes in the same second could still share it (the ETag still applies)
+    last_modified = -(-max(versions) // 1_000_000_000)
+    if last_modified > time.time():
+        last_modified = None
+    return f'W/"{digest}"', last_modified
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match:
+        return etag in parse_etags(if_none_match) or if_none_match.strip() == "*"
+    if last_modified is None:
+        return False
+    since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+    return since is not None and last_modified <= since
+
+
+def _add_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
+    response["Cache-Control"] = "private, no-cache"
+    patch_vary_headers(response, ["Authorization", "X-Org"])
+    return response
+
+
+def conditional_get(version_keys):
+    """
+    ETag/Last-Modified support for an APIView GET handler (sync, or async on
+    core.async_views.AsyncAPIView). `version_keys(request)` returns the
+    (resource, scope) pairs the response depends on, or None to skip. A
+    matching If-None-Match/If-Modified-Since gets a 304 without the handler
+    running.
+    """
+    def decorator(method):
+        if iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(self, request, *args, **kwargs):
+                keys = version_keys(request)
+                if not keys:
+                    return await method(self, request, *args, **kwargs)
+
+                etag, last_modified = _validators(request, keys, await aget_versions(keys))
+                if _not_modified(request, etag, last_modified):
+                    response = Response(status=status.HTTP_304_NOT_MODIFIED)
+                else:
+                    response = await method(self, request, *args, **kwargs)
+                    if response.status_code != status.HTTP_200_OK:
+                        return response
+                return _add_validators(response, etag, last_modified)
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            keys = version_keys(request)
+            if not keys:
+                return method(self, request, *args, **kwargs)
+
+            etag, last_modified = _validators(request, keys, get_versions(keys))
+            if _not_modified(request, etag, last_modified):
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            return _add_validators(response, etag, last_modified)
+        return wrapper
+    return decorator
@@ -1,3 +1,155 @@
-from django.shortcuts import render
+from django.http import FileResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
 
-# Create your views here.
+from rest_framework import permissions
+
+from worker.tasks import delete_organization, export_tenant_data
+from .deletion import get_deletion_progress, mark_for_deletion
+from .export import EXPORT_FORMATS, iter_export
+from .models import TenantExport
+from .permissions import IsAdmin
+from .profiling import list_profiles, profile_path
+
+EXPORT_CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+# ---------------------------
+# Tenant Data Export
+# ---------------------------
+class TenantExportView(APIView):
+    permission_classes = [IsAdmin]
+
+    def _export_format(self, request):
+        # Not ?format=, which DRF reserves for renderer selection
+        export_format = request.query_params.get("as", "ndjson")
+        return export_format if export_format in EXPORT_FORMATS else None
+
+    def get(self, request):
+        """Stream the organization's data as NDJSON (default) or CSV (?as=csv)."""
+        org = request.organization
+        export_format = self._export_format(request)
+        if not export_format:
+            return Response({"error": f"'as' must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+        filename = f"{org.slug}-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+        response = StreamingHttpResponse(iter_export(org, export_format), content_type=EXPORT_CONTENT_TYPES[export_format])
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    def post(self, request):
+        """Queue a background export; poll its status_url, then fetch the download_url."""
+        org = request.organization
+        export_format = self._export_format(request)
+        if not export_format:
+            return Response({"error": f"'as' must be one of {', '.join(EXPORT_FORMATS)}"}, status=400)
+
+        export = TenantExport.objects.create(organization=org, format=export_format, requested_by=request.user.pk)
+        result = export_tenant_data.delay(org.id, export_format, export_id=str(export.pk))
+        return Response(
+            {
+                "task_id": result.id,
+                "export_id": str(export.pk),
+                "status_url": reverse("tenant-export-status", args=[export.pk]),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class TenantExportStatusView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, export_id):
+        """State of a queued export; `download_url` appears once it's done."""
+        export = TenantExport.objects.filter(pk=export_id, organization=request.organization).first()
+        if export is None:
+            return Response({"error": "Export not found"}, status=404)
+        data = export.as_dict()
+        if export.state == "done":
+            data["download_url"] = reverse("tenant-export-download", args=[export.pk])
+        return Response(data)
+
+
+class TenantExportDownloadView(APIView):
+    permission_classes = [IsAdmin]
+
+    def get(self, request, export_id):
+        """The finished export as a gzip file."""
+        export = TenantExport.objects.filter(
+            pk=export_id, organization=request.organization, state="done"
+        ).first()
+        if export is None:
+            return Response({"error": "Export not found or not finished"}, status=404)
+        try:
+            fh = open(export.path, "rb")
+        except FileNotFoundError:
+            return Response({"error": "Export file is no longer available"}, status=410)
+        filename = f"{request.organization.slug}-{export.created_at:%Y%m%d%H%M%S}.{export.format}.gz"
+        response = FileResponse(fh, as_attachment=True, filename=filename)
+        add_never_cache_headers(response)  # tenant data: never cached
+        return response
+
+
+# ---------------------------
+# Tenant Deletion
+# ---------------------------
+class TenantDeletionView(APIView):
+    permission_classes = [IsAdmin]
+
+    def delete(self, request):
+        """
+        Delete the current organization in the background. The body must
+        confirm the slug: {"confirm": "<org slug>"}.
+        """
+        org = request.organization
+        if request.data.get("confirm") != org.slug:
+            return Response({"error": "Set 'confirm' to the organization's slug"}, status=400)
+
+        mark_for_deletion(org, requested_by=request.user.pk)
+        result = delete_organization.delay(org.id)
+        return Response(
+            {"task_id": result.id, "org_id": org.id, "progress": get_deletion_progress(org.id)},
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class TenantDeletionProgressView(APIView):
+    # The organization no longer resolves as a tenant once deletion starts
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, org_id):
+        progress = get_deletion_progress(org_id)
+        if not progress or not (request.user.is_staff or progress.get("requested_by") == request.user.pk):
+            return Response({"error": "No deletion in progress for this organization"}, status=404)
+        return Response(progress)
+
+
+# ---------------------------
+# Request Profiles (staff only)
+# ---------------------------
+class ProfileListView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        """Stored request profiles, newest first; filter with ?view= or ?organization=."""
+        profiles = list_profiles()
+        for field in ("view", "organization"):
+            value = request.query_params.get(field)
+            if value:
+                profiles = [p for p in profiles if p.get(field) == value]
+        return Response(profiles)
+
+
+class ProfileDownloadView(APIView):
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, profile_id):
+        """The raw profile: a pstats dump (.prof) or folded stack samples (.folded)."""
+        path = profile_path(profile_id)
+        if path is None:
+            return Response({"error": "Profile not found"}, status=404)
+        return FileResponse(open(path, "rb"), as_attachment=True, filename=path.name)
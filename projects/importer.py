@@ -0,0 +1,203 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.models import Membership
+from core.versioning import bump_versions
+from .models import Project, ProjectMember
+
+IMPORT_BATCH_SIZE = getattr(settings, "IMPORT_BATCH_SIZE", 1000)
+
+User = get_user_model()
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class TenantImporter:
+    """
+    Bulk import of projects and project members into one organization.
+
+    Rows are validated a batch at a time, references are resolved with one
+    set-based query per batch, and each batch is inserted and committed on
+    its own: COPY on PostgreSQL, bulk_create elsewhere. Invalid rows are
+    reported and skipped. The report's "committed" offsets can be passed
+    back as `resume` to continue after a failure.
+
+    Project rows: {"name"}. Member rows: {"project" (name) or "project_id",
+    "user" (username or email) or "user_id", "role"}.
+    """
+
+    def __init__(self, org, batch_size=IMPORT_BATCH_SIZE):
+        self.org = org
+        self.db = org.shard
+        self.batch_size = batch_size
+        self.errors = []
+        self.created = {"projects": 0, "members": 0}
+        self.committed = {"projects": 0, "members": 0}
+
+    def run(self, projects=(), members=(), resume=None):
+        resume = resume or {}
+        try:
+            self._run_batches("projects", projects, resume.get("projects", 0), self._import_projects)
+            self._run_batches("members", members, resume.get("members", 0), self._import_members)
+        finally:
+            # Bulk inserts skip signals
+            if any(self.created.values()):
+                bump_versions(
+                    ("projects", f"org:{self.org.pk}"),
+                    ("project-members", f"org:{self.org.pk}"),
+                )
+        return {"created": self.created, "committed": self.committed, "errors": self.errors}
+
+    def _run_batches(self, kind, rows, start, import_batch):
+        self.committed[kind] = start
+        for offset in range(start, len(rows), self.batch_size):
+            batch = list(enumerate(rows[offset:offset + self.batch_size], start=offset))
+            with transaction.atomic(using=self.db):
+                self.created[kind] += import_batch(batch)
+            self.committed[kind] = offset + len(batch)
+
+    def _error(self, kind, row, errors):
+        self.errors.append({"table": kind, "row": row, "errors": errors})
+
+    def _import_projects(self, batch):
+        name_length = Project._meta.get_field("name").max_length
+        now = timezone.now()
+        values = []
+        for i, row in batch:
+            name = row.get("name") if isinstance(row, dict) else None
+            if not isinstance(name, str) or not name.strip():
+                self._error("projects", i, {"name": ["This field is required."]})
+            elif len(name) > name_length:
+                self._error("projects", i, {"name": [f"Ensure this field has no more than {name_length} characters."]})
+            else:
+                values.append((self.org.pk, name, now, now))
+        self._insert(Project, ["organization_id", "name", "created_at", "updated_at"], values)
+        return len(values)
+
+    def _import_members(self, batch):
+        rows = [(i, row) for i, row in batch if isinstance(row, dict)]
+        for i, row in batch:
+            if not isinstance(row, dict):
+                self._error("members", i, {"non_field_errors": ["Expected an object."]})
+
+        # Resolve project and user references for the whole batch at once
+        names = {row["project"] for _, row in rows if isinstance(row.get("project"), str)}
+        project_ids = {row["project_id"] for _, row in rows if _is_id(row.get("project_id"))}
+        known_projects, projects_by_name = set(), {}
+        for pk, name in (
+            Project.all_objects.using(self.db)
+            .filter(Q(name__in=names) | Q(pk__in=project_ids), organization=self.org)
+            .values_list("pk", "name")
+        ):
+            known_projects.add(pk)
+            projects_by_name.setdefault(name, set()).add(pk)
+
+        logins = {row["user"] for _, row in rows if isinstance(row.get("user"), str)}
+        user_ids = {row["user_id"] for _, row in rows if _is_id(row.get("user_id"))}
+        users = {}
+        for pk, username, email in (
+            User.objects.filter(Q(username__in=logins) | Q(email__in=logins) | Q(pk__in=user_ids))
+            .values_list("pk", "username", "email")
+        ):
+            users[("id", pk)] = {pk}
+            users.setdefault(("login", username), set()).add(pk)
+            if email:
+                users.setdefault(("login", email), set()).add(pk)
+        members = set(
+            Membership.objects.filter(organization=self.org, user_id__in={pk for v in users.values() for pk in v})
+            .values_list("user_id", flat=True)
+        )
+
+        role_length = ProjectMember._meta.get_field("role").max_length
+        now = timezone.now()
+        values = []
+        for i, row in rows:
+            errors = {}
+            # Client-supplied values: check their types before using them as keys
+            project = None
+            if "project_id" in row:
+                if not _is_id(row["project_id"]):
+                    errors["project_id"] = ["A valid integer is required."]
+                elif row["project_id"] in known_projects:
+                    project = row["project_id"]
+            elif not isinstance(row.get("project"), str):
+                errors["project"] = ["Not a valid string." if "project" in row else "This field is required."]
+            else:
+                matches = projects_by_name.get(row["project"], set())
+                project = next(iter(matches)) if len(matches) == 1 else None
+                if len(matches) > 1:
+                    errors["project"] = ["More than one project has this name; use project_id."]
+            if project is None and "project_id" not in errors:
+                errors.setdefault("project", ["Unknown project."])
+
+            if "user_id" in row:
+                key = ("id", row["user_id"]) if _is_id(row["user_id"]) else None
+                if key is None:
+                    errors["user_id"] = ["A valid integer is required."]
+            elif isinstance(row.get("user"), str):
+                key = ("login", row["user"])
+            else:
+                key = None
+                errors["user"] = ["Not a valid string." if "user" in row else "This field is required."]
+            if key is not None:
+                matches = users.get(key, set())
+                user = next(iter(matches)) if len(matches) == 1 else None
+                if user is None:
+                    errors["user"] = ["Unknown user." if not matches else "More than one user matches; use user_id."]
+                elif user not in members:
+                    errors["user"] = ["User is not a member of this organization."]
+
+            role = row.get("role", "")
+            if not isinstance(role, str):
+                errors["role"] = ["Not a valid string."]
+            elif len(role) > role_length:
+                errors["role"] = [f"Ensure this field has no more than {role_length} characters."]
+
+            if errors:
+                self._error("members", i, errors)
+            else:
+                values.append((self.org.pk, project, user, role, now, now))
+
+        columns = ["organization_id", "project_id", "user_id", "role", "created_at", "updated_at"]
+        return self._insert(ProjectMember, columns, values, ignore_conflicts=True)
+
+    def _insert(self, model, columns, values, ignore_conflicts=False):
+        """Insert value tuples; returns how many rows were written."""
+        if not values:
+            return 0
+        connection = connections[self.db]
+        if connection.vendor == "postgresql":
+            return self._copy(connection, model, columns, values, ignore_conflicts)
+        objs = [model(**dict(zip(columns, row))) for row in values]
+        if not ignore_conflicts:
+            model.all_objects.using(self.db).bulk_create(objs, batch_size=self.batch_size)
+            return len(objs)
+        before = model.all_objects.using(self.db).filter(organization=self.org).count()
+        model.all_objects.using(self.db).bulk_create(objs, batch_size=self.batch_size, ignore_conflicts=True)
+        return model.all_objects.using(self.db).filter(organization=self.org).count() - before
+
+    def _copy(self, connection, model, columns, values, ignore_conflicts):
+        table = connection.ops.quote_name(model._meta.db_table)
+        cols = ", ".join(connection.ops.quote_name(c) for c in columns)
+        with connection.cursor() as cursor:
+            if not ignore_conflicts:
+                with cursor.cursor.copy(f"COPY {table} ({cols}) FROM STDIN") as copy:
+                    for row in values:
+                        copy.write_row(row)
+                return len(values)
+            # COPY can't skip duplicates: stage, then INSERT ... ON CONFLICT DO NOTHING
+            cursor.execute(
+                f"CREATE TEMP TABLE import_staging ON COMMIT DROP AS SELECT {cols} FROM {table} WITH NO DATA"
+            )
+            with cursor.cursor.copy(f"COPY import_staging ({cols}) FROM STDIN") as copy:
+                for row in values:
+                    copy.write_row(row)
+            cursor.execute(
+                f"INSERT INTO {table} ({cols}) SELECT {cols} FROM import_staging ON CONFLICT DO NOTHING"
+            )
+            return cursor.rowcount
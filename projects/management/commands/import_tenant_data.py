@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Organization
+from projects.importer import IMPORT_BATCH_SIZE, TenantImporter
+
+
+class Command(BaseCommand):
+    help = (
+        'Bulk import {"projects": [...], "members": [...]} from a JSON file into '
+        "an organization. Re-run with the reported --resume-* offsets after a failure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("slug")
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--resume-projects", type=int, default=0)
+        parser.add_argument("--resume-members", type=int, default=0)
+
+    def handle(self, slug, path, batch_size, resume_projects, resume_members, **options):
+        try:
+            org = Organization.objects.get(slug=slug)
+        except Organization.DoesNotExist:
+            raise CommandError(f"No organization with slug {slug!r}")
+        with open(path) as fh:
+            data = json.load(fh)
+
+        importer = TenantImporter(org, batch_size=batch_size)
+        try:
+            report = importer.run(
+                data.get("projects", []), data.get("members", []),
+                resume={"projects": resume_projects, "members": resume_members},
+            )
+        except Exception:
+            committed = importer.committed
+            self.stderr.write(
+                f"Import failed; resume with --resume-projects {committed['projects']} "
+                f"--resume-members {committed['members']}"
+            )
+            raise
+        self.stdout.write(json.dumps(report, indent=2))
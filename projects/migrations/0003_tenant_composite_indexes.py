@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+        ('projects', '0002_projectmember'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['organization', 'created_at', 'id'], name='project_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='project',
+            index=models.Index(fields=['organization', 'updated_at', 'id'], name='project_org_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectmember',
+            index=models.Index(fields=['organization', 'created_at', 'id'], name='projectmember_org_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='projectmember',
+            index=models.Index(fields=['organization', 'updated_at', 'id'], name='projectmember_org_updated_idx'),
+        ),
+    ]
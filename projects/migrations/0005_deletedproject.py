@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_tenantexport'),
+        ('projects', '0004_tenant_fk_without_db_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeletedProject',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project_id', models.BigIntegerField()),
+                ('organization', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='%(class)s_items', to='core.organization')),
+            ],
+            options={
+                'abstract': False,
+                'indexes': [models.Index(fields=['organization', 'created_at', 'id'], name='deletedproject_org_created_idx'), models.Index(fields=['organization', 'updated_at', 'id'], name='deletedproject_org_updated_idx')],
+            },
+        ),
+    ]
@@ -7,6 +7,11 @@ class Project(BaseTenantModel):
     name = models.CharField(max_length=255)
 
 
+class DeletedProject(BaseTenantModel):
+    """Tombstone for incremental sync: created_at is when project_id was deleted."""
+    project_id = models.BigIntegerField()
+
+
 class ProjectMember(BaseTenantModel):
     project = models.ForeignKey(
         Project,
@@ -16,11 +21,12 @@ class ProjectMember(BaseTenantModel):
     user = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='project_memberships'
+        related_name='project_memberships',
+        db_constraint=False,  # users live on the control database
     )
     role = models.CharField(max_length=100, blank=True)
 
-    class Meta:
+    class Meta(BaseTenantModel.Meta):
         unique_together = ('organization', 'project', 'user')
 
     def __str__(self):
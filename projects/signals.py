@@ -0,0 +1,24 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from core.versioning import bump_versions
+from .models import DeletedProject, Project, ProjectMember
+
+
+@receiver(post_save, sender=Project)
+@receiver(post_delete, sender=Project)
+def bump_project_version(sender, instance, using, **kwargs):
+    bump_versions(("projects", f"org:{instance.organization_id}"), using=using)
+
+
+@receiver(post_delete, sender=Project)
+def record_deleted_project(sender, instance, using, **kwargs):
+    # Reported to ?updated_since= syncs; the tenant purge and shard moves
+    # delete without signals, so they leave no tombstones
+    DeletedProject.all_objects.using(using).create(organization_id=instance.organization_id, project_id=instance.pk)
+
+
+@receiver(post_save, sender=ProjectMember)
+@receiver(post_delete, sender=ProjectMember)
+def bump_project_member_version(sender, instance, using, **kwargs):
+    bump_versions(("project-members", f"org:{instance.organization_id}"), using=using)
@@ -1,3 +1,245 @@
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import DatabaseError
 from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Membership, User
+from core.models import Organization
+from core.permissions import IsManagerOrAdmin
+from core.serializers import FastReadSerializer
+from core.tokens import tenant_token_for
+from .importer import TenantImporter
+from .models import DeletedProject, Project, ProjectMember
+from .serializers import ProjectMemberSerializer, ProjectSerializer
+from .views import AsyncProjectListView
+
+
+class FastReadSerializerParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.user = User.objects.create_user("bob", "bob@example.com", "pw")
+        for name in ["Alpha", "Ünïcode ✓", "", "x" * 255]:
+            project = Project.objects.create(organization=cls.org, name=name)
+            ProjectMember.objects.create(organization=cls.org, project=project, user=cls.user, role=name[:100])
+
+    def assertParity(self, serializer_class, queryset, **kwargs):
+        queryset = queryset.order_by("id")
+        expected = serializer_class(queryset, many=True).data
+        if "fields" in kwargs:
+            expected = [{k: row[k] for k in row if k in kwargs["fields"]} for row in expected]
+        actual = FastReadSerializer(serializer_class, **kwargs).serialize(queryset)
+        self.assertEqual(actual, [dict(row) for row in expected])
+
+    def test_project_serializer(self):
+        self.assertParity(ProjectSerializer, Project.objects.all())
+
+    def test_project_serializer_sparse_fields(self):
+        self.assertParity(ProjectSerializer, Project.objects.all(), fields=("id", "updated_at"))
+
+    def test_project_member_serializer(self):
+        self.assertParity(ProjectMemberSerializer, ProjectMember.objects.all())
+
+    def test_project_list_endpoint_matches_serializer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(
+            f"/api/projects/organizations/{self.org.id}/projects/", {"limit": 100}, HTTP_X_ORG="acme"
+        )
+        expected = ProjectSerializer(Project.objects.order_by("created_at", "id"), many=True).data
+        self.assertEqual(response.json()["results"], [dict(row) for row in expected])
+
+
+class AsyncProjectListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.user = User.objects.create_user("bob", "bob@example.com", "pw")
+        Project.objects.bulk_create([Project(organization=cls.org, name=f"p{i}") for i in range(5)])
+        token = tenant_token_for(cls.user, cls.org, "admin").access_token
+        cls.headers = {"Authorization": f"Bearer {token}"}
+
+    async def test_matches_sync_view(self):
+        path = f"organizations/{self.org.id}/projects/?limit=3"
+        expected = await sync_to_async(self.client.get)(f"/api/projects/{path}", headers=self.headers)
+        response = await self.async_client.get(f"/api/projects/async/{path}", headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(len(response.json()["results"]), 3)
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.get(f"/api/projects/async/organizations/{self.org.id}/projects/")
+        self.assertEqual(response.status_code, 401)
+
+    async def test_rejects_unusable_tokens(self):
+        no_user = AccessToken()
+        for authorization in [f"Bearer {no_user}", "Bearer not-a-jwt", "Bearer two parts"]:
+            with self.subTest(authorization=authorization):
+                response = await self.async_client.get(
+                    f"/api/projects/async/organizations/{self.org.id}/projects/",
+                    headers={"Authorization": authorization},
+                )
+                self.assertEqual(response.status_code, 401)
+
+    async def test_checks_permission_classes(self):
+        path = f"/api/projects/async/organizations/{self.org.id}/projects/"
+        with mock.patch.object(AsyncProjectListView, "permission_classes", [IsManagerOrAdmin]):
+            for role, expected in [("employee", 403), ("manager", 200)]:
+                token = tenant_token_for(self.user, self.org, role).access_token
+                response = await self.async_client.get(path, headers={"Authorization": f"Bearer {token}"})
+                self.assertEqual(response.status_code, expected)
+
+
+class ProjectListVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.user = User.objects.create_user("bob", "bob@example.com", "pw")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.path = f"/api/projects/organizations/{self.org.id}/projects/"
+
+    def get(self, **headers):
+        return self.client.get(self.path, HTTP_X_ORG="acme", **headers)
+
+    def test_etag_changes_only_after_commit(self):
+        etag = self.get()["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Project.objects.create(organization=self.org, name="New")
+            # Uncommitted: a reader must not see a new version yet
+            self.assertEqual(self.get()["ETag"], etag)
+        response = self.get(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ProjectListParameterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.user = User.objects.create_user("bob", "bob@example.com", "pw")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def get(self, **params):
+        return self.client.get(
+            f"/api/projects/organizations/{self.org.id}/projects/", params, HTTP_X_ORG="acme"
+        )
+
+    def test_invalid_cursors(self):
+        for cursor in ["!!!", "bm90IGpzb24", "WyJ4Il0", "WyJ4IiwgMV0=", "eyJhIjogMX0"]:
+            with self.subTest(cursor=cursor):
+                response = self.get(cursor=cursor)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid cursor"})
+
+    def test_invalid_updated_since(self):
+        for value in ["yesterday", "2024-13-01T00:00:00", "2024-02-30T00:00:00"]:
+            with self.subTest(updated_since=value):
+                response = self.get(updated_since=value)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {"error": "Invalid updated_since"})
+        self.assertEqual(self.get(updated_since="2024-01-01T00:00:00Z").status_code, 200)
+
+    def test_updated_since_reports_deletions(self):
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        since = timezone.now()
+        kept = [Project.objects.create(organization=self.org, name=f"kept {i}") for i in range(2)]
+        gone = Project.objects.create(organization=self.org, name="gone")
+        gone_pk = gone.pk
+        gone.delete()
+
+        first = self.get(updated_since=since.isoformat(), limit=1).json()
+        self.assertEqual(([p["id"] for p in first["results"]], first["deleted"]), ([kept[0].pk], [gone_pk]))
+        rest = self.get(updated_since=since.isoformat(), limit=1, cursor=first["next"]).json()
+        self.assertEqual([p["id"] for p in rest["results"]], [kept[1].pk])
+        self.assertNotIn("deleted", rest)
+        self.assertNotIn("deleted", self.get().json())
+
+        # Deleted before the sync point: the client already knew
+        self.assertEqual(self.get(updated_since=timezone.now().isoformat()).json()["deleted"], [])
+        self.assertEqual(DeletedProject.all_objects.get().project_id, gone_pk)
+
+
+class ProjectImportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.org = Organization.objects.create(name="Acme", slug="acme")
+        cls.user = User.objects.create_user("bob", "bob@example.com", "pw")
+        Membership.objects.create(user=cls.user, organization=cls.org, role="admin")
+
+    def setUp(self):
+        # Roles cached by earlier tests (same pks) are only invalidated on commit
+        caches["default"].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def post(self, data):
+        return self.client.post(
+            f"/api/projects/organizations/{self.org.id}/projects/import/", data, format="json", HTTP_X_ORG="acme"
+        )
+
+    def test_rejects_malformed_bodies(self):
+        for data in [[{"name": "a"}], {"projects": {}}, {"resume": {"projects": "abc"}},
+                     {"resume": {"projects": -1}}, {"resume": {"members": True}}]:
+            with self.subTest(data=data):
+                self.assertEqual(self.post(data).status_code, 400)
+
+    def test_imports_and_reports_invalid_rows(self):
+        max_length = Project._meta.get_field("name").max_length
+        response = self.post({"projects": [{"name": "Alpha"}, {"name": "x" * (max_length + 1)}, {}]})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["created"], {"projects": 1, "members": 0})
+        self.assertEqual([e["row"] for e in report["errors"]], [1, 2])
+        self.assertIn(str(max_length), report["errors"][0]["errors"]["name"][0])
+
+        resumed = self.post({"projects": [{"name": "Alpha"}, {"name": "Beta"}], "resume": {"projects": 1}})
+        self.assertEqual(resumed.json()["created"]["projects"], 1)
+        self.assertEqual(sorted(Project.objects.values_list("name", flat=True)), ["Alpha", "Beta"])
+
+    def test_member_references_of_the_wrong_type_are_row_errors(self):
+        Project.objects.create(organization=self.org, name="Alpha")
+        rows = [
+            {"project": ["Alpha"], "user": "bob"},
+            {"project_id": {"id": 1}, "user": "bob"},
+            {"project": "Alpha", "user": ["bob"]},
+            {"project": "Alpha", "user_id": "1"},
+            {"project_id": True, "user": "bob"},
+            {"project": "Alpha", "user": "bob", "role": "dev"},
+        ]
+        response = self.post({"members": rows})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual(report["created"]["members"], 1)
+        errors = {e["row"]: e["errors"] for e in report["errors"]}
+        self.assertEqual(errors[0], {"project": ["Not a valid string."]})
+        self.assertEqual(errors[1], {"project_id": ["A valid integer is required."]})
+        self.assertEqual(errors[2], {"user": ["Not a valid string."]})
+        self.assertEqual(errors[3], {"user_id": ["A valid integer is required."]})
+        self.assertIn("project_id", errors[4])
+        self.assertNotIn(5, errors)
+
+    def test_failed_batch_reports_committed_offsets(self):
+        with mock.patch.object(TenantImporter, "_import_members", side_effect=DatabaseError("boom")), \
+                self.assertLogs("projects.views", "ERROR"):
+            response = self.post({"projects": [{"name": "Alpha"}], "members": [{"project": "Alpha", "user": "bob"}]})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json()["committed"], {"projects": 1, "members": 0})
+        self.assertEqual(response.json()["created"]["projects"], 1)
 
-# Create your tests here.
+        resumed = self.post({
+            "projects": [{"name": "Alpha"}], "members": [{"project": "Alpha", "user": "bob"}],
+            "resume": response.json()["committed"],
+        })
+        self.assertEqual(resumed.json()["created"], {"projects": 0, "members": 1})
@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import ProjectCreateView
+from .views import AsyncProjectListView, ProjectCreateView, ProjectImportView
 
 urlpatterns = [
     path("organizations/<int:org_id>/projects/", ProjectCreateView.as_view(), name="create-project"),
+    path("organizations/<int:org_id>/projects/import/", ProjectImportView.as_view(), name="import-projects"),
+    # Native async variant for ASGI deployments
+    path("async/organizations/<int:org_id>/projects/", AsyncProjectListView.as_view(), name="project-list-async"),
 ]
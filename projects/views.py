@@ -1,20 +1,120 @@
+import logging
+
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from accounts.models import Membership
-from .models import Project, ProjectMember
+from django.conf import settings
+from django.db import DatabaseError
+from django.utils.dateparse import parse_datetime
+from core.permissions import IsManagerOrAdmin
+from core.async_views import AsyncAPIView
+from core.pagination import InvalidCursor, akeyset_paginate, get_page_size, keyset_paginate
+from core.response_cache import cached_response
+from core.renderers import StreamingJSONListResponse
+from core.serializers import FastReadSerializer
+from core.versioning import conditional_get
+from core.tenancy import get_membership_role
+from .models import DeletedProject, Project, ProjectMember
 from .serializers import ProjectSerializer, ProjectMemberSerializer
+from .importer import TenantImporter
+
+logger = logging.getLogger(__name__)
+
+STREAM_CHUNK_SIZE = 2000
+
+
+def _project_versions(request):
+    return request.organization and [("projects", f"org:{request.organization.pk}")]
+
+
+def _project_list_query(request):
+    """
+    ((fast serializer, values() queryset, ordering, updated_since datetime
+    or None), None) for a project list request, or (None, error Response)
+    for invalid parameters.
+    """
+    projects = Project.objects.filter(organization=request.organization)
+    ordering = ("created_at", "id")
+    since = None
+
+    updated_since = request.query_params.get("updated_since")
+    if updated_since:
+        try:
+            since = parse_datetime(updated_since)
+        except ValueError:  # well formatted but out of range, e.g. month 13
+            since = None
+        if since is None:
+            return None, Response({"error": "Invalid updated_since"}, status=status.HTTP_400_BAD_REQUEST)
+        projects = projects.filter(updated_at__gte=since)
+        ordering = ("updated_at", "id")
+
+    fields = None
+    if request.query_params.get("fields"):
+        fields = [f.strip() for f in request.query_params["fields"].split(",") if f.strip()]
+        unknown = set(fields) - set(ProjectSerializer.Meta.fields)
+        if unknown:
+            return None, Response(
+                {"error": f"Unknown fields: {', '.join(sorted(unknown))}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    # Only the requested columns (plus the cursor's) are read
+    serializer = FastReadSerializer.for_serializer(
+        ProjectSerializer, fields=tuple(sorted(fields)) if fields else None
+    )
+    return (serializer, projects.values(*set(serializer.columns) | set(ordering)), ordering, since), None
+
+
+def _deleted_since(request, since):
+    """Ids of the organization's projects deleted since `since` (see DeletedProject)."""
+    return DeletedProject.objects.filter(
+        organization=request.organization, created_at__gte=since
+    ).order_by("created_at", "id").values_list("project_id", flat=True)
 
 class ProjectCreateView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    throttle_scope = "projects"
+
+    @conditional_get(_project_versions)
+    @cached_response(_project_versions)
+    def get(self, request, org_id=None):
+        """
+        List the organization's projects, cursor-paginated on (created_at, id).
+        ?fields=id,name     sparse fieldset, pushed down to the selected columns
+        ?updated_since=ts   incremental sync: rows changed since ts, ordered by (updated_at, id);
+                            the first page also lists the ids of projects deleted since ts
+        ?stream=1           every matching row as one streamed JSON array, no pagination
+                            (and no deletions: streamed syncs need a full resync to see them)
+        """
+        query, error = _project_list_query(request)
+        if error:
+            return error
+        serializer, projects, ordering, since = query
 
-    def get(self, request):
-        org=request.organization
-        projects=Project.objects.filter(organization=org)
-        serializer=ProjectSerializer(projects,many=True)
-        return Response(serializer.data,status=status.HTTP_200_OK)
+        if request.query_params.get("stream") in ("1", "true"):
+            # Pin the database now: routing state is gone once streaming starts
+            projects = projects.order_by(*ordering)
+            projects = projects.using(projects.db)
+            return StreamingJSONListResponse(
+                projects.iterator(chunk_size=STREAM_CHUNK_SIZE), serializer.serialize_rows, STREAM_CHUNK_SIZE
+            )
 
-    def post(self, request):
+        try:
+            page, next_cursor = keyset_paginate(
+                projects, ordering,
+                cursor=request.query_params.get("cursor"),
+                limit=get_page_size(request),
+            )
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.serialize_rows(page)
+        body = {"results": data, "next": next_cursor}
+        if since is not None and not request.query_params.get("cursor"):
+            body["deleted"] = list(_deleted_since(request, since))
+        return Response(body, status=status.HTTP_200_OK)
+
+    def post(self, request, org_id=None):
         """
         Create a project for the current organization.
         Organization is resolved via middleware (request.organization).
@@ -27,17 +127,15 @@ class ProjectCreateView(APIView):
             )
 
         # 1. Check membership
-        membership = Membership.objects.filter(
-            user=request.user, organization=org
-        ).first()
-        if not membership:
+        role = get_membership_role(request.user, org, request)
+        if not role:
             return Response(
                 {"error": "You are not a member of this organization"},
                 status=status.HTTP_403_FORBIDDEN
             )
 
         # 2. Only admins and managers can create
-        if membership.role not in ["admin", "manager"]:
+        if role not in ["admin", "manager"]:
             return Response(
                 {"error": "Not allowed"},
                 status=status.HTTP_403_FORBIDDEN
@@ -54,6 +152,31 @@ class ProjectCreateView(APIView):
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class AsyncProjectListView(AsyncAPIView):
+    @conditional_get(_project_versions)
+    @cached_response(_project_versions)
+    async def get(self, request, org_id=None):
+        """ProjectCreateView.get for ASGI deployments, without ?stream=1."""
+        query, error = _project_list_query(request)
+        if error:
+            return error
+        serializer, projects, ordering, since = query
+
+        try:
+            page, next_cursor = await akeyset_paginate(
+                projects, ordering,
+                cursor=request.query_params.get("cursor"),
+                limit=get_page_size(request),
+            )
+        except InvalidCursor:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.serialize_rows(page)
+        body = {"results": data, "next": next_cursor}
+        if since is not None and not request.query_params.get("cursor"):
+            body["deleted"] = [pk async for pk in _deleted_since(request, since)]
+        return Response(body, status=status.HTTP_200_OK)
+
 class AssignMemberView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
@@ -62,4 +185,54 @@ class AssignMemberView(APIView):
         if serializer.is_valid():
             serializer.save(organization=request.organization)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+class ProjectImportView(APIView):
+    permission_classes = [IsManagerOrAdmin]
+
+    def post(self, request, org_id=None):
+        """
+        Bulk import {"projects": [...], "members": [...]} into the current
+        organization (see projects.importer.TenantImporter). Pass the
+        returned "committed" offsets back as "resume" to continue a partial import.
+        """
+        if not isinstance(request.data, dict):
+            return Response({"error": "Expected an object"}, status=status.HTTP_400_BAD_REQUEST)
+        projects = request.data.get("projects", [])
+        members = request.data.get("members", [])
+        resume = request.data.get("resume") or {}
+        if not isinstance(projects, list) or not isinstance(members, list) or not isinstance(resume, dict):
+            return Response(
+                {"error": "'projects' and 'members' must be lists, 'resume' an object"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not all(
+            isinstance(offset, int) and not isinstance(offset, bool) and offset >= 0
+            for offset in resume.values()
+        ):
+            return Response(
+                {"error": "'resume' offsets must be non-negative integers"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(projects) + len(members) > settings.IMPORT_MAX_ROWS:
+            return Response(
+                {"error": f"At most {settings.IMPORT_MAX_ROWS} rows per request"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        importer = TenantImporter(request.organization)
+        try:
+            report = importer.run(projects, members, resume)
+        except DatabaseError:
+            logger.exception("Import into %s failed", request.organization.slug)
+            # Earlier batches are committed: say where to resume from
+            return Response(
+                {
+                    "error": "Import failed; retry with 'resume' set to 'committed'",
+                    "created": importer.created,
+                    "committed": importer.committed,
+                    "errors": importer.errors,
+                },
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            )
+        return Response(report, status=status.HTTP_200_OK)
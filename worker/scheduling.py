@@ -0,0 +1,139 @@
+import inspect
+import logging
+
+from celery import Task
+from celery.exceptions import Ignore
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+def _header(request, name):
+    # Worker requests expose custom headers as attributes; eager ones only in .headers
+    value = getattr(request, name, None)
+    if value is None:
+        value = (request.headers or {}).get(name)
+    return value
+
+
+def task_org_id(request):
+    """The organization a task message was sent for, if any."""
+    return _header(request, "org_id")
+
+
+def tenant_concurrency(org_id, lane):
+    """The organization's cap on concurrently running `lane` tasks; None means unlimited."""
+    from core.tenancy import get_org_by_id
+
+    org = get_org_by_id(org_id)
+    if org is None:
+        return None
+    caps = getattr(settings, "TENANT_PLAN_TASK_CONCURRENCY", {}).get(org.plan) or {}
+    return caps.get(lane)
+
+
+class TenantSlots:
+    """Running-task counts per (organization, lane), shared by every worker through the cache."""
+
+    def _cache(self):
+        return caches[getattr(settings, "TASK_SLOT_CACHE_ALIAS", "default")]
+
+    @staticmethod
+    def _key(org_id, lane):
+        return f"tenantx:task-slots:{org_id}:{lane}"
+
+    def running(self, org_id, lane):
+        return self._cache().get(self._key(org_id, lane), 0)
+
+    def acquire(self, org_id, lane, cap):
+        cache, key = self._cache(), self._key(org_id, lane)
+        # The TTL bounds how long slots of a killed worker stay taken; it
+        # restarts with every acquire so a busy tenant's count never expires
+        ttl = getattr(settings, "TASK_SLOT_TTL", 3600)
+        try:
+            running = cache.incr(key)
+        except ValueError:
+            running = 1 if cache.add(key, 1, ttl) else cache.incr(key)
+        else:
+            cache.touch(key, ttl)
+        if running > cap:
+            cache.decr(key)
+            return False
+        return True
+
+    def release(self, org_id, lane):
+        try:
+            self._cache().decr(self._key(org_id, lane))
+        except ValueError:  # expired while the task ran
+            pass
+
+
+slots = TenantSlots()
+
+
+class TenantTask(Task):
+    """
+    Base for tasks run on behalf of an organization.
+
+    Messages carry the organization's id in an `org_id` header (from the
+    task's org_id argument, or the org_id= option of apply_async) and go to
+    the task's lane queue. A worker runs one only while the organization is
+    under its plan's concurrency cap for the lane; otherwise the message is
+    sent back to the end of the lane, so a tenant's burst interleaves with
+    everyone else's work instead of occupying every worker. The caps act
+    as weights: a tenant gets at most its cap's share of a busy lane's
+    workers. Deferred messages wait out their backoff as a countdown, never
+    in a worker, and always respect the cap (a warning is logged every
+    TASK_DEFER_WARN_EVERY deferrals). Eager runs are inline and never deferred.
+    """
+    lane = "bulk"
+
+    def _org_id_argument(self, args, kwargs):
+        try:
+            bound = inspect.signature(self.run).bind_partial(*(args or ()), **(kwargs or {}))
+        except TypeError:
+            return None
+        return bound.arguments.get("org_id")
+
+    def apply_async(self, args=None, kwargs=None, org_id=None, **options):
+        if org_id is None:
+            org_id = self._org_id_argument(args, kwargs)
+        if org_id is not None:
+            options["headers"] = {**(options.get("headers") or {}), "org_id": org_id}
+        options.setdefault("queue", self.lane)
+        return super().apply_async(args, kwargs, **options)
+
+    def __call__(self, *args, **kwargs):
+        org_id = task_org_id(self.request)
+        cap = None if org_id is None or self.request.is_eager else tenant_concurrency(org_id, self.lane)
+        if cap is None:
+            return super().__call__(*args, **kwargs)
+        if not slots.acquire(org_id, self.lane, cap):
+            self.defer(args, kwargs, org_id, _header(self.request, "deferrals") or 0)
+            raise Ignore()
+        try:
+            return super().__call__(*args, **kwargs)
+        finally:
+            slots.release(org_id, self.lane)
+
+    def defer(self, args, kwargs, org_id, deferrals):
+        """Requeue this message on its lane after a backoff, keeping its task id."""
+        # A countdown rather than a sleep, so the worker moves straight on to
+        # other tenants' messages; the first retry goes to the back of the line
+        delay = min(0.05 * 2 ** deferrals, getattr(settings, "TASK_DEFER_MAX_DELAY", 5)) if deferrals else 0
+        if deferrals and deferrals % getattr(settings, "TASK_DEFER_WARN_EVERY", 100) == 0:
+            logger.warning(
+                "%s for organization %s deferred %d times: its %s slots stay taken",
+                self.name, org_id, deferrals, self.lane,
+            )
+        else:
+            logger.debug("Deferring %s for organization %s (%d)", self.name, org_id, deferrals)
+        delivery_info = self.request.delivery_info or {}
+        super().apply_async(
+            args, kwargs,
+            task_id=self.request.id,
+            queue=delivery_info.get("routing_key") or self.lane,
+            countdown=delay or None,
+            headers={"org_id": org_id, "deferrals": deferrals + 1},
+        )
@@ -1,9 +1,124 @@
 # tasks.py
+import logging
+import math
+import time
+
 from celery import shared_task
-from django.core.mail import send_mail
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection, send_mail
+
+from .scheduling import TenantTask
+
+logger = logging.getLogger(__name__)
+
+INVITE_FROM_EMAIL = "noreply@tenantx.com"
+
+
+def _invite_subject(org_name):
+    return f"You've been invited to join {org_name}"
+
+
+def _invite_body(reset_url):
+    return f"Hello, please set your password here: {reset_url}"
+
+
+class DomainRateLimiter:
+    """Spaces out sends to the same recipient domain to `per_second` messages/s."""
+
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self._next_at = {}
+
+    def wait(self, email):
+        if not self.interval:
+            return
+        domain = email.rpartition("@")[2].lower()
+        now = time.monotonic()
+        next_at = self._next_at.get(domain, now)
+        if next_at > now:
+            time.sleep(next_at - now)
+        self._next_at[domain] = max(next_at, now) + self.interval
+
+
+@shared_task(base=TenantTask, lane="interactive")
+def send_invite_email(email, reset_url, org_name, org_id=None):
+    send_mail(_invite_subject(org_name), _invite_body(reset_url), INVITE_FROM_EMAIL, [email])
+
+@shared_task(base=TenantTask)
+def send_invite_emails(invites, org_name, attempt=0, org_id=None):
+    """
+    Send a chunk of (email, reset_url) invites, reusing one SMTP session per
+    EMAIL_BATCH_SIZE messages instead of connecting once per email.
+    Recipients that fail are retried together, with backoff, in a new task.
+    """
+    batch_size = settings.EMAIL_BATCH_SIZE
+    limiter = DomainRateLimiter(settings.EMAIL_DOMAIN_RATE_LIMIT)
+    subject = _invite_subject(org_name)
+    failed = []
+
+    for start in range(0, len(invites), batch_size):
+        batch = invites[start:start + batch_size]
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception:
+            logger.exception("Could not open email connection")
+            failed.extend(batch)
+            continue
+        try:
+            for email, reset_url in batch:
+                limiter.wait(email)
+                message = EmailMessage(
+                    subject, _invite_body(reset_url), INVITE_FROM_EMAIL, [email], connection=connection
+                )
+                # One message per call so a bad recipient doesn't sink the batch
+                try:
+                    connection.send_messages([message])
+                except Exception:
+                    logger.warning("Invite email to %s failed", email, exc_info=True)
+                    failed.append((email, reset_url))
+        finally:
+            connection.close()
+
+    if failed:
+        if attempt < settings.EMAIL_MAX_RETRIES:
+            send_invite_emails.apply_async(
+                (failed, org_name),
+                {"attempt": attempt + 1, "org_id": org_id},
+                countdown=settings.EMAIL_RETRY_BACKOFF * 2 ** attempt,
+            )
+        else:
+            logger.error("Giving up on %d invite emails for %s", len(failed), org_name)
+    return len(invites) - len(failed)
+
+
+@shared_task(base=TenantTask)
+def export_tenant_data(org_id, export_format="ndjson", export_id=None):
+    """
+    Write an organization's data export to a gzip file; returns the file path.
+    With `export_id`, the file is the one that TenantExport's views serve.
+    """
+    from core.export import run_export, write_export
+    from core.models import Organization
+
+    if export_id is not None:
+        path = run_export(export_id)
+    else:
+        path = write_export(Organization.objects.get(pk=org_id), export_format)
+    logger.info("Exported organization %s to %s", org_id, path)
+    return path
+
+
+@shared_task(base=TenantTask)
+def delete_organization(org_id):
+    """Purge an organization marked as deleting; safe to re-run after a failure."""
+    from core.deletion import drain_remaining, get_deletion_progress, purge_organization
 
-@shared_task
-def send_invite_email(email, reset_url, org_name):
-    subject = f"You've been invited to join {org_name}"
-    message = f"Hello, please set your password here: {reset_url}"
-    send_mail(subject, message, "noreply@tenantx.com", [email])
+    remaining = drain_remaining(org_id)
+    if remaining:
+        # Other processes may still resolve the org: retry once their caches expired
+        delete_organization.apply_async((org_id,), countdown=math.ceil(remaining))
+        return get_deletion_progress(org_id)
+    progress = purge_organization(org_id)
+    logger.info("Organization %s deletion: %s", org_id, progress)
+    return progress
@@ -0,0 +1,249 @@
+import queue
+import smtplib
+import threading
+import time
+from collections import Counter
+from unittest import mock
+
+from celery import shared_task
+from celery.exceptions import Ignore
+from django.core import mail
+from django.core.cache import caches
+from django.core.mail.backends import locmem
+from django.test import TestCase, override_settings
+
+from core.models import Organization
+from core.tenancy import clear_tenant_cache
+from .scheduling import TenantTask, slots, tenant_concurrency
+from .tasks import DomainRateLimiter, delete_organization, send_invite_email, send_invite_emails
+
+
+class SlotRecorder:
+    """What the test task saw: start order, and peak concurrency per organization."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = []
+        self.running = Counter()
+        self.peak = Counter()
+        self.done = threading.Semaphore(0)
+
+    def __call__(self, org_id):
+        with self.lock:
+            self.started.append(org_id)
+            self.running[org_id] += 1
+            self.peak[org_id] = max(self.peak[org_id], self.running[org_id])
+        time.sleep(0.02)
+        with self.lock:
+            self.running[org_id] -= 1
+        self.done.release()
+
+
+recorder = None
+
+
+@shared_task(base=TenantTask)
+def hold_slot(org_id):
+    recorder(org_id)
+
+
+class TenantTaskSchedulingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.busy = Organization.objects.create(name="Busy", slug="busy")
+        cls.quiet = Organization.objects.create(name="Quiet", slug="quiet")
+
+    def setUp(self):
+        caches["default"].clear()
+        clear_tenant_cache()
+        self.addCleanup(caches["default"].clear)
+
+    def run_as_worker(self, task, org, *args):
+        """Run `task` the way a worker would for a message sent on behalf of `org`."""
+        task.push_request(id="task-1", headers={"org_id": org.pk}, delivery_info={"routing_key": task.lane})
+        try:
+            return task(*args)
+        finally:
+            task.pop_request()
+
+    def test_messages_carry_org_and_lane(self):
+        with mock.patch("celery.app.task.Task.apply_async") as send:
+            send_invite_email.delay("a@example.com", "https://reset", "Busy", org_id=self.busy.pk)
+            delete_organization.delay(self.quiet.pk)
+        (_, first), (_, second) = send.call_args_list
+        self.assertEqual((first["headers"], first["queue"]), ({"org_id": self.busy.pk}, "interactive"))
+        self.assertEqual((second["headers"], second["queue"]), ({"org_id": self.quiet.pk}, "bulk"))
+
+    def test_capped_tenant_is_deferred_while_others_run(self):
+        self.assertTrue(slots.acquire(self.busy.pk, "bulk", 1))  # free plan: one bulk task at a time
+
+        with mock.patch("celery.app.task.Task.apply_async") as requeue:
+            with self.assertRaises(Ignore):
+                self.run_as_worker(send_invite_emails, self.busy, [("a@busy.com", "https://reset")], "Busy")
+            self.run_as_worker(send_invite_emails, self.quiet, [("b@quiet.com", "https://reset")], "Quiet")
+
+        _, options = requeue.call_args
+        self.assertEqual(options["task_id"], "task-1")
+        self.assertEqual(options["headers"], {"org_id": self.busy.pk, "deferrals": 1})
+        self.assertIsNone(options["countdown"])  # straight to the back of the lane
+        self.assertEqual([m.to for m in mail.outbox], [["b@quiet.com"]])
+        self.assertEqual(slots.running(self.quiet.pk, "bulk"), 0)
+
+        slots.release(self.busy.pk, "bulk")
+        self.run_as_worker(send_invite_emails, self.busy, [("a@busy.com", "https://reset")], "Busy")
+        self.assertEqual(mail.outbox[-1].to, ["a@busy.com"])
+
+    def test_repeated_deferrals_back_off_without_sleeping_or_running_over_cap(self):
+        self.assertTrue(slots.acquire(self.busy.pk, "bulk", 1))
+        countdowns, slept = [], []
+        real_sleep, this_thread = time.sleep, threading.get_ident()
+
+        def sleep(seconds):
+            # Other tests' background threads (e.g. the slow-request sampler) keep sleeping
+            if threading.get_ident() != this_thread:
+                return real_sleep(seconds)
+            slept.append(seconds)
+
+        with mock.patch("celery.app.task.Task.apply_async") as requeue, \
+                mock.patch("time.sleep", side_effect=sleep), \
+                self.settings(TASK_DEFER_MAX_DELAY=2, TASK_DEFER_WARN_EVERY=100):
+            for deferrals in (1, 3, 6, 100):
+                send_invite_emails.push_request(
+                    id="task-1", headers={"org_id": self.busy.pk, "deferrals": deferrals},
+                    delivery_info={"routing_key": "bulk"},
+                )
+                try:
+                    with self.assertRaises(Ignore):
+                        if deferrals == 100:
+                            with self.assertLogs("worker.scheduling", "WARNING"):
+                                send_invite_emails([("a@busy.com", "https://reset")], "Busy")
+                        else:
+                            send_invite_emails([("a@busy.com", "https://reset")], "Busy")
+                finally:
+                    send_invite_emails.pop_request()
+                countdowns.append(requeue.call_args[1]["countdown"])
+        self.assertEqual(slept, [])
+        self.assertEqual(countdowns, [0.1, 0.4, 2, 2])
+        self.assertEqual(mail.outbox, [])
+
+    def test_eager_tasks_run_inline(self):
+        slots.acquire(self.busy.pk, "interactive", 1)
+        with self.settings(TENANT_PLAN_TASK_CONCURRENCY={"free": {"interactive": 1}}):
+            send_invite_email.apply(("a@busy.com", "https://reset", "Busy"), headers={"org_id": self.busy.pk})
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class TenantInterleavingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.busy = Organization.objects.create(name="Busy", slug="busy", plan="pro")
+        cls.quiet = Organization.objects.create(name="Quiet", slug="quiet")
+
+    def setUp(self):
+        caches["default"].clear()
+        clear_tenant_cache()
+        self.addCleanup(caches["default"].clear)
+
+    @mock.patch("celery.app.task.Task.apply_async")
+    def test_caps_weight_a_shared_lane(self, requeue):
+        global recorder
+        recorder = SlotRecorder()
+        lane = queue.Queue()
+        requeue.side_effect = lambda args, kwargs, **options: lane.put(options["headers"])
+
+        def worker():
+            while (headers := lane.get()) is not None:
+                hold_slot.push_request(id="task", headers=headers, delivery_info={"routing_key": "bulk"})
+                try:
+                    hold_slot(headers["org_id"])
+                except Ignore:
+                    pass
+                finally:
+                    hold_slot.pop_request()
+
+        # A burst from "busy" (pro: 2 bulk slots) is queued ahead of "quiet" (free: 1)
+        messages = [self.busy.pk] * 6 + [self.quiet.pk] * 3
+        with self.settings(TENANT_PLAN_TASK_CONCURRENCY={"pro": {"bulk": 2}, "free": {"bulk": 1}},
+                           TASK_DEFER_MAX_DELAY=0):
+            for org in (self.busy, self.quiet):
+                tenant_concurrency(org.pk, "bulk")  # cache the organizations for the worker threads
+            for org_id in messages:
+                lane.put({"org_id": org_id})
+            workers = [threading.Thread(target=worker) for _ in range(3)]
+            for thread in workers:
+                thread.start()
+            for _ in messages:
+                self.assertTrue(recorder.done.acquire(timeout=10))
+            for thread in workers:
+                lane.put(None)
+            for thread in workers:
+                thread.join()
+
+        self.assertEqual(Counter(recorder.started), Counter(messages))
+        self.assertEqual(recorder.peak, {self.busy.pk: 2, self.quiet.pk: 1})
+        # The third worker went to "quiet" instead of waiting behind the burst
+        self.assertIn(self.quiet.pk, recorder.started[:3])
+
+
+class FlakyBackend(locmem.EmailBackend):
+    """locmem backend that refuses recipients at fail.example.com and counts sessions."""
+    sessions = 0
+
+    def open(self):
+        FlakyBackend.sessions += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if any(to.endswith("@fail.example.com") for message in messages for to in message.to):
+            raise smtplib.SMTPRecipientsRefused({})
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="worker.tests.FlakyBackend", EMAIL_BATCH_SIZE=2, EMAIL_DOMAIN_RATE_LIMIT=0,
+    EMAIL_MAX_RETRIES=2, EMAIL_RETRY_BACKOFF=30,
+)
+class InviteEmailTests(TestCase):
+    def setUp(self):
+        FlakyBackend.sessions = 0
+
+    def test_one_session_per_batch(self):
+        invites = [(f"user{i}@example.com", f"https://reset/{i}") for i in range(5)]
+        self.assertEqual(send_invite_emails(invites, "Acme"), 5)
+        self.assertEqual(FlakyBackend.sessions, 3)
+        self.assertEqual([m.to for m in mail.outbox], [[email] for email, _ in invites])
+        self.assertEqual(mail.outbox[0].subject, "You've been invited to join Acme")
+
+    def test_failed_recipients_are_retried_together(self):
+        invites = [("a@fail.example.com", "r1"), ("b@example.com", "r2"), ("c@fail.example.com", "r3")]
+        with mock.patch.object(send_invite_emails, "apply_async") as retry:
+            self.assertEqual(send_invite_emails(invites, "Acme", attempt=1, org_id=7), 1)
+        retry.assert_called_once_with(
+            ([("a@fail.example.com", "r1"), ("c@fail.example.com", "r3")], "Acme"),
+            {"attempt": 2, "org_id": 7},
+            countdown=60,
+        )
+        self.assertEqual([m.to for m in mail.outbox], [["b@example.com"]])
+
+        with mock.patch.object(send_invite_emails, "apply_async") as retry:
+            send_invite_emails(invites[:1], "Acme", attempt=2)
+        retry.assert_not_called()
+
+
+class DomainRateLimiterTests(TestCase):
+    def test_paces_each_domain_separately(self):
+        clock = [100.0]
+        with mock.patch("worker.tasks.time.monotonic", side_effect=lambda: clock[0]), \
+                mock.patch("worker.tasks.time.sleep", side_effect=lambda seconds: clock.__setitem__(0, clock[0] + seconds)) as sleep:
+            limiter = DomainRateLimiter(per_second=2)
+            for email in ["a@x.com", "b@X.com", "c@y.com", "d@x.com"]:
+                limiter.wait(email)
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 0.5])
+        self.assertEqual(clock[0], 101.0)
+
+    def test_disabled_without_a_rate(self):
+        with mock.patch("worker.tasks.time.sleep") as sleep:
+            limiter = DomainRateLimiter(per_second=0)
+            for _ in range(3):
+                limiter.wait("a@x.com")
+        sleep.assert_not_called()